@@ -1,5 +1 @@
-# Import utility functions
-from app.utils.email_parser import parse_email
-from app.utils.email_classifier import classify_email
-from app.utils.store_email_to_db import store_email
-from app.utils.get_api_key import api_key
\ No newline at end of file
+# Package root: no eager imports, so attachment pool workers and scripts load only the modules they use
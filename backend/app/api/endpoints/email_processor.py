@@ -1,23 +1,118 @@
-from fastapi import APIRouter, UploadFile, File
+import asyncio
+import os
+import shutil
+import uuid
+from fastapi import APIRouter, UploadFile, File, HTTPException
+from app.core.config import settings
+from app.services.bulk_ingest_service import ARCHIVE_FORMATS
 from app.services.email_service import process_email, classify
+from app.services.job_service import QueueFullError, submit_job, get_job_status
+from app.utils.email_classifier import CLASSIFY_MODES
+from app.utils.llm_cache import llm_cache
+from app.utils.email_parser import email_limits
+from app.utils.llm_client import llm_client
+from app.utils.mime_stream import EmailTooLargeError
+from app.utils.prompt_budget import merge_for_prompt
 
 router = APIRouter(prefix="/email", tags=["Email Processing"])
 
+def check_upload_size(file: UploadFile):
+    max_bytes = email_limits()[0]
+    if max_bytes and file.size is not None and file.size > max_bytes:
+        raise HTTPException(status_code=413, detail=f"Email is larger than {settings.EMAIL_MAX_SIZE_MB:g} MB")
+
 @router.post("/process")
 async def process_email_file(file: UploadFile = File(...)):
-    result = await process_email(file)
+    check_upload_size(file)
+    try:
+        result = await process_email(file)
+    except EmailTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
     return {"message": "Email processed successfully", "data": result}
 
+def build_classify_request(selectedItems: dict) -> dict:
+    mode = selectedItems.get("mode") or "chain"
+    if mode not in CLASSIFY_MODES:
+        raise HTTPException(status_code=400, detail=f"mode must be one of {', '.join(CLASSIFY_MODES)}")
+    # Body first, then the attachment sections most relevant to it, within LLM_INPUT_MAX_TOKENS
+    merged_text = merge_for_prompt(selectedItems.get("body"), selectedItems.get("attachments") or [])
+    return {"text": merged_text, "email_id": selectedItems.get("email_id"), "category_type": selectedItems.get("category_type"),
+            "mode": mode}
+
 @router.post("/classify")
 async def classify_email_file(selectedItems: dict):
-    merged_text = ""
-    if "body" in selectedItems and selectedItems["body"] is not None:
-        merged_text += selectedItems["body"] + " "
-    if "attachments" in selectedItems:
-        for attachment in selectedItems["attachments"]:
-            extracted_text = attachment.get("extracted_text", "")
-            merged_text += extracted_text + " "
-    merged_text = merged_text.strip()    
-    result = await classify({"text": merged_text, "email_id": selectedItems.get("email_id"), "category_type": selectedItems.get("category_type")})
+    result = await classify(build_classify_request(selectedItems))
     return {"message": "Email classified successfully", "data": result}
 
+async def queue_job(job_type: str, payload: bytes = None, params: dict = None):
+    try:
+        job_id = await submit_job(job_type, payload, params)
+    except QueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    if job_id is None:
+        raise HTTPException(status_code=500, detail="Could not queue job")
+    return {"message": "Job queued", "data": {"job_id": job_id, "status": "QUEUED"}}
+
+def spool_upload(file: UploadFile) -> str:
+    """Copy an upload to BULK_UPLOAD_DIR in chunks so large uploads never sit in memory (or in the job table)."""
+    os.makedirs(settings.BULK_UPLOAD_DIR, exist_ok=True)
+    path = os.path.join(settings.BULK_UPLOAD_DIR, f"{uuid.uuid4().hex}.upload")
+    with open(path, "wb") as f:
+        shutil.copyfileobj(file.file, f, 1024 * 1024)
+    return path
+
+@router.post("/jobs/process", status_code=202)
+async def submit_process_job(file: UploadFile = File(...)):
+    check_upload_size(file)
+    # Spooled to disk like /bulk uploads: the job row holds the path, not the message
+    path = await asyncio.to_thread(spool_upload, file)
+    try:
+        return await queue_job("process", params={"path": path, "filename": file.filename})
+    except HTTPException:
+        os.remove(path)
+        raise
+
+@router.post("/jobs/classify", status_code=202)
+async def submit_classify_job(selectedItems: dict):
+    return await queue_job("classify", params=build_classify_request(selectedItems))
+
+@router.post("/bulk", status_code=202)
+async def submit_bulk_job(file: UploadFile = File(...), format: str = None):
+    if format is not None and format not in ARCHIVE_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(ARCHIVE_FORMATS)}")
+    path = await asyncio.to_thread(spool_upload, file)
+    try:
+        return await queue_job("bulk", params={"path": path, "filename": file.filename, "format": format})
+    except HTTPException:
+        os.remove(path)
+        raise
+
+@router.get("/jobs/{job_id}")
+async def get_job(job_id: int):
+    job = await get_job_status(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return {"message": "Job status", "data": job}
+
+
+@router.get("/llm-cache/stats")
+def llm_cache_stats():
+    # Counters are per worker process; the disk tier is shared
+    return {"message": "LLM cache statistics", "data": llm_cache.get_stats()}
+
+@router.get("/attachment-cache/stats")
+def attachment_cache_stats():
+    # Counters are per worker process; the cached texts are shared
+    from app.utils.attachment_cache import attachment_cache
+    return {"message": "Attachment cache statistics", "data": attachment_cache.get_stats()}
+
+@router.get("/llm-client/stats")
+def llm_client_stats():
+    # Per worker process: calls, retries, throttling, current concurrency limit and circuit state
+    return {"message": "LLM client statistics", "data": llm_client.get_stats()}
+
+@router.get("/dedup/stats")
+def dedup_stats():
+    # Per worker process: how many checks each cascade stage settled and how many LLM calls were made
+    from app.db.track_emails import get_dedup_stats
+    return {"message": "Duplicate detection statistics", "data": get_dedup_stats()}
@@ -6,6 +6,117 @@ load_dotenv()
 class Settings:
     PROJECT_NAME: str = "Email Processor API"
     ENVIRONMENT: str = os.getenv("ENVIRONMENT", "development")
+    # SQLite file (plain path or sqlite:/// URL, hackathon.db when unset) and per-process connection pool
     DATABASE_URL: str = os.getenv("DATABASE_URL")
+    DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", "8"))
+    DB_BUSY_TIMEOUT_MS: int = int(os.getenv("DB_BUSY_TIMEOUT_MS", "5000"))
+    DB_SYNCHRONOUS: str = os.getenv("DB_SYNCHRONOUS", "NORMAL")
+    DB_CACHE_SIZE_KB: int = int(os.getenv("DB_CACHE_SIZE_KB", "65536"))
+    DB_MMAP_SIZE_MB: int = int(os.getenv("DB_MMAP_SIZE_MB", "256"))
+    # Duplicate detection: "exact", "ivf" or "hnsw" (needs hnswlib), optional on-disk snapshot
+    VECTOR_INDEX_BACKEND: str = os.getenv("VECTOR_INDEX_BACKEND", "exact")
+    VECTOR_INDEX_PATH: str = os.getenv("VECTOR_INDEX_PATH")
+    # Duplicate detection cascade: exact hash -> MinHash/LSH -> embedding -> LLM for the ambiguous band.
+    # Only an exact hash match decides on its own by default: CANDIDATE scores go to the LLM. The MinHash and
+    # embedding DUPLICATE shortcuts (deciding without the LLM) are opt-in; the default above 1 disables them.
+    DEDUP_MINHASH_ENABLED: bool = os.getenv("DEDUP_MINHASH_ENABLED", "true").lower() == "true"
+    DEDUP_SHINGLE_SIZE: int = int(os.getenv("DEDUP_SHINGLE_SIZE", "3"))
+    DEDUP_MINHASH_PERMUTATIONS: int = int(os.getenv("DEDUP_MINHASH_PERMUTATIONS", "128"))
+    DEDUP_MINHASH_BANDS: int = int(os.getenv("DEDUP_MINHASH_BANDS", "32"))
+    DEDUP_MINHASH_CANDIDATE_THRESHOLD: float = float(os.getenv("DEDUP_MINHASH_CANDIDATE_THRESHOLD", "0.5"))
+    DEDUP_MINHASH_DUPLICATE_THRESHOLD: float = float(os.getenv("DEDUP_MINHASH_DUPLICATE_THRESHOLD", "1.01"))
+    DEDUP_EMBEDDING_CANDIDATE_THRESHOLD: float = float(os.getenv("DEDUP_EMBEDDING_CANDIDATE_THRESHOLD", "0.85"))
+    DEDUP_EMBEDDING_DUPLICATE_THRESHOLD: float = float(os.getenv("DEDUP_EMBEDDING_DUPLICATE_THRESHOLD", "1.01"))
+    DEDUP_LLM_THRESHOLD: float = float(os.getenv("DEDUP_LLM_THRESHOLD", "90"))
+    DEDUP_TOP_K: int = int(os.getenv("DEDUP_TOP_K", "10"))
+    # Defaults to DEDUP_TOP_K so every candidate of a check is scored in a single LLM call
+    DEDUP_LLM_MAX_CANDIDATES: int = int(os.getenv("DEDUP_LLM_MAX_CANDIDATES", os.getenv("DEDUP_TOP_K", "10")))
+    # EML parsing: rejected above EMAIL_MAX_SIZE_MB or EMAIL_MAX_ATTACHMENTS (0 = no limit); decoded payloads
+    # larger than EMAIL_SPOOL_MEMORY_MB are spooled to temporary files (in EMAIL_SPOOL_DIR, system default when unset)
+    EMAIL_MAX_SIZE_MB: float = float(os.getenv("EMAIL_MAX_SIZE_MB", "50"))
+    EMAIL_MAX_ATTACHMENTS: int = int(os.getenv("EMAIL_MAX_ATTACHMENTS", "20"))
+    EMAIL_SPOOL_MEMORY_MB: float = float(os.getenv("EMAIL_SPOOL_MEMORY_MB", "1"))
+    EMAIL_SPOOL_DIR: str = os.getenv("EMAIL_SPOOL_DIR")
+    # Threads per worker process for blocking parse / OCR / dedup work
+    PARSE_WORKERS: int = int(os.getenv("PARSE_WORKERS", "4"))
+    # Attachment text extraction process pool (per worker process)
+    ATTACHMENT_WORKERS: int = int(os.getenv("ATTACHMENT_WORKERS", str(min(4, os.cpu_count() or 1))))
+    # Seconds a task may run once a worker starts it (0 = no limit); an overrunning worker alone is replaced
+    ATTACHMENT_TIMEOUT_SECONDS: float = float(os.getenv("ATTACHMENT_TIMEOUT_SECONDS", "60"))
+    # Backstop on how long a request waits for one attachment task, queueing included (0 = no limit)
+    ATTACHMENT_WAIT_SECONDS: float = float(os.getenv("ATTACHMENT_WAIT_SECONDS", "600"))
+    ATTACHMENT_MEMORY_LIMIT_MB: int = int(os.getenv("ATTACHMENT_MEMORY_LIMIT_MB", "2048"))
+    PDF_PAGES_PER_TASK: int = int(os.getenv("PDF_PAGES_PER_TASK", "8"))
+    # OCR: PDF pages whose text layer has fewer than PDF_TEXT_MIN_CHARS letters or digits are rendered at
+    # OCR_PDF_DPI and OCR'd, at most OCR_MAX_PAGES pages (or image frames) per document (0 = no limit);
+    # images are downscaled to OCR_MAX_DIMENSION pixels on the long side (0 = full size) and binarized
+    PDF_TEXT_MIN_CHARS: int = int(os.getenv("PDF_TEXT_MIN_CHARS", "20"))
+    OCR_PDF_DPI: int = int(os.getenv("OCR_PDF_DPI", "200"))
+    OCR_MAX_PAGES: int = int(os.getenv("OCR_MAX_PAGES", "20"))
+    OCR_MAX_DIMENSION: int = int(os.getenv("OCR_MAX_DIMENSION", "2500"))
+    # Zip archives and attached emails: nesting depth, members and uncompressed bytes extracted per archive
+    ATTACHMENT_MAX_DEPTH: int = int(os.getenv("ATTACHMENT_MAX_DEPTH", "3"))
+    ATTACHMENT_ZIP_MAX_MEMBERS: int = int(os.getenv("ATTACHMENT_ZIP_MAX_MEMBERS", "100"))
+    ATTACHMENT_ZIP_MAX_MB: float = float(os.getenv("ATTACHMENT_ZIP_MAX_MB", "100"))
+    # Extracted attachment text by content hash and extractor version, in a SQLite file shared by workers
+    ATTACHMENT_CACHE_ENABLED: bool = os.getenv("ATTACHMENT_CACHE_ENABLED", "true").lower() == "true"
+    ATTACHMENT_CACHE_PATH: str = os.getenv("ATTACHMENT_CACHE_PATH", "attachment_cache.db")
+    ATTACHMENT_CACHE_MAX_ENTRIES: int = int(os.getenv("ATTACHMENT_CACHE_MAX_ENTRIES", "50000"))
+    ATTACHMENT_CACHE_MAX_MB: float = float(os.getenv("ATTACHMENT_CACHE_MAX_MB", "512"))
+    # Background jobs (/email/jobs): consumers per worker process and queue limits
+    JOB_WORKERS: int = int(os.getenv("JOB_WORKERS", "2"))
+    JOB_MAX_QUEUED: int = int(os.getenv("JOB_MAX_QUEUED", "1000"))
+    JOB_POLL_INTERVAL_SECONDS: float = float(os.getenv("JOB_POLL_INTERVAL_SECONDS", "1"))
+    JOB_STALE_SECONDS: int = int(os.getenv("JOB_STALE_SECONDS", "900"))
+    JOB_MAX_ATTEMPTS: int = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+    JOB_RECOVERY_INTERVAL_SECONDS: float = float(os.getenv("JOB_RECOVERY_INTERVAL_SECONDS", "60"))
+    # Bulk ingestion (/email/bulk and app.services.bulk_ingest_service)
+    BULK_BATCH_SIZE: int = int(os.getenv("BULK_BATCH_SIZE", "32"))
+    BULK_WORKERS: int = int(os.getenv("BULK_WORKERS", os.getenv("PARSE_WORKERS", "4")))
+    BULK_UPLOAD_DIR: str = os.getenv("BULK_UPLOAD_DIR", "bulk_uploads")
+    # LLM response cache: in-memory LRU per worker, SQLite file shared by all workers
+    LLM_CACHE_ENABLED: bool = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+    LLM_CACHE_PATH: str = os.getenv("LLM_CACHE_PATH", "llm_cache.db")
+    LLM_CACHE_TTL_SECONDS: int = int(os.getenv("LLM_CACHE_TTL_SECONDS", "86400"))
+    LLM_CACHE_MEMORY_ENTRIES: int = int(os.getenv("LLM_CACHE_MEMORY_ENTRIES", "1024"))
+    LLM_CACHE_DISK_ENTRIES: int = int(os.getenv("LLM_CACHE_DISK_ENTRIES", "100000"))
+    # LLM backend: "gemini", "fake" (deterministic offline stand-in) or a "package.module:Class" provider
+    LLM_PROVIDER: str = os.getenv("LLM_PROVIDER", "gemini")
+    LLM_FAKE_LATENCY_MS: float = float(os.getenv("LLM_FAKE_LATENCY_MS", "200"))
+    LLM_FAKE_MS_PER_1K_TOKENS: float = float(os.getenv("LLM_FAKE_MS_PER_1K_TOKENS", "0"))
+    LLM_FAKE_ERROR_RATE: float = float(os.getenv("LLM_FAKE_ERROR_RATE", "0"))
+    LLM_FAKE_SEED: int = int(os.getenv("LLM_FAKE_SEED", "0"))
+    # Models load on first use; with warm-up each worker loads them in the background after start-up
+    MODEL_WARMUP: bool = os.getenv("MODEL_WARMUP", "false").lower() == "true"
+    # Shared LLM client: quotas (0 = unlimited; shared by all workers through LLM_RATE_LIMIT_PATH), AIMD
+    # concurrency bounds per worker, retries with jittered backoff and the circuit breaker
+    LLM_REQUESTS_PER_MINUTE: float = float(os.getenv("LLM_REQUESTS_PER_MINUTE", "0"))
+    LLM_TOKENS_PER_MINUTE: float = float(os.getenv("LLM_TOKENS_PER_MINUTE", "0"))
+    LLM_RATE_LIMIT_PATH: str = os.getenv("LLM_RATE_LIMIT_PATH", "llm_rate_limit.db")
+    LLM_OUTPUT_TOKENS_ESTIMATE: int = int(os.getenv("LLM_OUTPUT_TOKENS_ESTIMATE", "512"))
+    LLM_CONCURRENCY: int = int(os.getenv("LLM_CONCURRENCY", "8"))
+    LLM_MIN_CONCURRENCY: int = int(os.getenv("LLM_MIN_CONCURRENCY", "1"))
+    LLM_MAX_CONCURRENCY: int = int(os.getenv("LLM_MAX_CONCURRENCY", "32"))
+    LLM_MAX_RETRIES: int = int(os.getenv("LLM_MAX_RETRIES", "3"))
+    LLM_BACKOFF_BASE_SECONDS: float = float(os.getenv("LLM_BACKOFF_BASE_SECONDS", "1"))
+    LLM_BACKOFF_MAX_SECONDS: float = float(os.getenv("LLM_BACKOFF_MAX_SECONDS", "30"))
+    LLM_CIRCUIT_FAILURE_THRESHOLD: int = int(os.getenv("LLM_CIRCUIT_FAILURE_THRESHOLD", "5"))
+    LLM_CIRCUIT_RESET_SECONDS: float = float(os.getenv("LLM_CIRCUIT_RESET_SECONDS", "30"))
+    # Prompt budgets: merged body and attachment text for classification, input of each LLM stage (longer
+    # summaries are map-reduced) and wall-clock limit per stage, retries included (0 = no limit)
+    LLM_INPUT_MAX_TOKENS: int = int(os.getenv("LLM_INPUT_MAX_TOKENS", "24000"))
+    LLM_STAGE_MAX_TOKENS: int = int(os.getenv("LLM_STAGE_MAX_TOKENS", "6000"))
+    LLM_STAGE_TIMEOUT_SECONDS: float = float(os.getenv("LLM_STAGE_TIMEOUT_SECONDS", "120"))
+    # /email/classify request coalescing: batch window, batch size and classifications in flight per worker
+    CLASSIFY_BATCHING_ENABLED: bool = os.getenv("CLASSIFY_BATCHING_ENABLED", "false").lower() == "true"
+    CLASSIFY_BATCH_MAX_SIZE: int = int(os.getenv("CLASSIFY_BATCH_MAX_SIZE", "8"))
+    CLASSIFY_BATCH_MAX_WAIT_MS: float = float(os.getenv("CLASSIFY_BATCH_MAX_WAIT_MS", "50"))
+    CLASSIFY_MAX_CONCURRENCY: int = int(os.getenv("CLASSIFY_MAX_CONCURRENCY", "8"))
+    # Shared embedding server (unix:///path or tcp://host:port); unset keeps a model in every worker
+    EMBEDDING_SERVER_URL: str = os.getenv("EMBEDDING_SERVER_URL")
+    EMBEDDING_SERVER_TIMEOUT_SECONDS: float = float(os.getenv("EMBEDDING_SERVER_TIMEOUT_SECONDS", "30"))
+    EMBEDDING_SERVER_RETRY_SECONDS: float = float(os.getenv("EMBEDDING_SERVER_RETRY_SECONDS", "30"))
+    EMBEDDING_BATCH_MAX_TEXTS: int = int(os.getenv("EMBEDDING_BATCH_MAX_TEXTS", "64"))
+    EMBEDDING_BATCH_MAX_WAIT_MS: float = float(os.getenv("EMBEDDING_BATCH_MAX_WAIT_MS", "5"))
 
 settings = Settings()
@@ -1,3 +1,4 @@
 from app.db.email_dto import Email
+from app.db.email_record import EmailRecord
 from app.db.db_ddl import DB_DDL
-from app.db.track_emails import check_duplicate_email
+from app.db.track_emails import check_duplicate_email, encode_email, encode_emails, find_duplicate, index_email
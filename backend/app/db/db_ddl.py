@@ -1,34 +1,99 @@
 
 from app.db.sqlite_db_config import SQLiteDBConfig as DBConfig
 
+# Original EMAIL schema; later columns and indexes are added by app.db.migrations
+EMAIL_DDL = ("CREATE TABLE IF NOT EXISTS EMAIL "
+    "("
+    "EMAIL_ID INTEGER PRIMARY KEY AUTOINCREMENT, "
+    "SENDER TEXT, "
+    "RECIEPIENT TEXT, "
+    "SUBJECT TEXT, "
+    "BODY TEXT, "
+    "S3_MESSAGE_PATH TEXT, "
+    "CREATED_AT int, "
+    "UPDATED_AT int, "
+    "REQUEST_TYPE TEXT, "
+    "SUB_REQUEST_TYPE TEXT, "
+    "PROCESSING_STATUS TEXT, "
+    "HAS_ATTACHMENTS BOOLEAN, "
+    "ATTACHMENT_METADATA TEXT, "
+    "CATEGORY_TYPE TEXT, "
+    "CATEGORY TEXT "
+    ")")
+EMAIL_EMBEDDING_DDL = ("CREATE TABLE IF NOT EXISTS EMAIL_EMBEDDING "
+    "("
+    "EMAIL_ID INTEGER PRIMARY KEY, "
+    "VECTOR BLOB NOT NULL"
+    ")")
+EMAIL_MINHASH_DDL = ("CREATE TABLE IF NOT EXISTS EMAIL_MINHASH "
+    "("
+    "EMAIL_ID INTEGER PRIMARY KEY, "
+    "SIGNATURE BLOB NOT NULL"
+    ")")
+
+# Durable queue of background /email/jobs work
+EMAIL_JOB_DDL = ("CREATE TABLE IF NOT EXISTS EMAIL_JOB "
+    "("
+    "JOB_ID INTEGER PRIMARY KEY AUTOINCREMENT, "
+    "JOB_TYPE TEXT NOT NULL, "
+    "STATUS TEXT NOT NULL, "
+    "STAGE TEXT, "
+    "PAYLOAD BLOB, "
+    "PARAMS TEXT, "
+    "RESULT TEXT, "
+    "ERROR TEXT, "
+    "EMAIL_ID INTEGER, "
+    "ATTEMPTS INTEGER DEFAULT 0, "
+    "CREATED_AT int, "
+    "UPDATED_AT int, "
+    "STARTED_AT int, "
+    "FINISHED_AT int"
+    ")")
+EMAIL_JOB_INDEX_DDL = "CREATE INDEX IF NOT EXISTS IDX_EMAIL_JOB_STATUS ON EMAIL_JOB (STATUS, JOB_ID)"
+
+# Messages of a bulk archive already stored, so an interrupted ingestion resumes where it stopped
+INGEST_CHECKPOINT_DDL = ("CREATE TABLE IF NOT EXISTS INGEST_CHECKPOINT "
+    "("
+    "SOURCE_KEY TEXT NOT NULL, "
+    "MESSAGE_KEY TEXT NOT NULL, "
+    "EMAIL_ID INTEGER, "
+    "IS_DUPLICATE BOOLEAN, "
+    "CREATED_AT int, "
+    "PRIMARY KEY (SOURCE_KEY, MESSAGE_KEY)"
+    ")")
+
 class DB_DDL:
-    def __init__(self):
-        self.db_config = DBConfig()
+    def __init__(self, pool=None):
+        self.db_config = DBConfig(pool)
     
     def create_email_table(self):
-        self.db_config.cursor.execute("CREATE TABLE IF NOT EXISTS EMAIL "
-        "("
-        "EMAIL_ID INTEGER PRIMARY KEY AUTOINCREMENT, "
-        "SENDER TEXT, "
-        "RECIEPIENT TEXT, "
-        "SUBJECT TEXT, "
-        "BODY TEXT, "
-        "S3_MESSAGE_PATH TEXT, "
-        "CREATED_AT int, "
-        "UPDATED_AT int, "
-        "REQUEST_TYPE TEXT, "
-        "SUB_REQUEST_TYPE TEXT, "
-        "PROCESSING_STATUS TEXT, "
-        "HAS_ATTACHMENTS BOOLEAN, "
-        "ATTACHMENT_METADATA TEXT, "
-        "CATEGORY_TYPE TEXT, "
-        "CATEGORY TEXT "
-        ")")
+        self.db_config.cursor.execute(EMAIL_DDL)
         self.db_config.conn.commit()
         print("Created EMAIL table")
     
+    def create_email_embedding_table(self):
+        self.db_config.cursor.execute(EMAIL_EMBEDDING_DDL)
+        self.db_config.conn.commit()
+        print("Created EMAIL_EMBEDDING table")
+
+    def create_email_job_table(self):
+        self.db_config.cursor.execute(EMAIL_JOB_DDL)
+        self.db_config.cursor.execute(EMAIL_JOB_INDEX_DDL)
+        self.db_config.conn.commit()
+        print("Created EMAIL_JOB table")
+
+    def create_ingest_checkpoint_table(self):
+        self.db_config.cursor.execute(INGEST_CHECKPOINT_DDL)
+        self.db_config.conn.commit()
+        print("Created INGEST_CHECKPOINT table")
+
     def delete_email_table(self):
         self.db_config.cursor.execute("DROP TABLE IF EXISTS EMAIL")
+        self.db_config.cursor.execute("DROP TABLE IF EXISTS EMAIL_EMBEDDING")
+        self.db_config.cursor.execute("DROP TABLE IF EXISTS EMAIL_MINHASH")
+        self.db_config.cursor.execute("DROP TABLE IF EXISTS EMAIL_JOB")
+        self.db_config.cursor.execute("DROP TABLE IF EXISTS INGEST_CHECKPOINT")
+        self.db_config.cursor.execute("DROP TABLE IF EXISTS SCHEMA_VERSION")
         self.db_config.conn.commit()
         print("Deleted EMAIL table")
     
@@ -1,6 +1,6 @@
 
-import json
 from app.db import Email, EmailRepo, DB_DDL
+from app.db.migrations import migrate
 
 def main():
     email = Email({
@@ -21,11 +21,11 @@ def main():
     print("Email ID:", emailId)
     tempEmail = emailRepo.get_email(emailId)
     if tempEmail is not None:
-        print(json.dumps(tempEmail.__dict__))
+        print(tempEmail.to_json())
         tempEmail.request_type = "new request"
         emailRepo.update_email(tempEmail)
         temp2 = emailRepo.get_email(emailId)
-        print(json.dumps(temp2.__dict__))
+        print(temp2.to_json())
         print("REQUEST_TYPE: ", temp2.request_type)
 
 def get_all_emails():
@@ -33,13 +33,17 @@ def get_all_emails():
     emailRepo = EmailRepo()
     allEmails = emailRepo.get_all_email()
     for e in allEmails:
-        print(json.dumps(e.__dict__))
+        print(e.to_json())
     emailRepo.close()
 
 def create_email_table():
     db_ddl = DB_DDL()
     db_ddl.create_email_table()
+    db_ddl.create_email_embedding_table()
+    db_ddl.create_email_job_table()
+    db_ddl.create_ingest_checkpoint_table()
     db_ddl.close()
+    migrate()
 
 def delete_email_table():
     db_ddl = DB_DDL()
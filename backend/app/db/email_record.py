@@ -0,0 +1,77 @@
+import json
+from operator import attrgetter
+from app.db.email_dto import Email
+
+# EMAIL row order used by EmailRepo queries
+EMAIL_FIELDS = ("email_id", "sender", "recipient", "subject", "body", "s3_message_path", "created_at", "updated_at",
+                "request_type", "sub_request_type", "processing_status", "has_attachment", "attachment_metadata",
+                "category_type", "category")
+get_fields = attrgetter(*EMAIL_FIELDS)
+
+
+class EmailRecord:
+    """Slotted, unvalidated EMAIL row returned by EmailRepo.
+
+    Building the py_dto Email validates every attribute, which dominates large scans; rows read back from
+    the database are already well typed, so the repository returns these instead. Use to_dto() where input
+    crosses the API boundary and needs validating.
+    """
+    __slots__ = EMAIL_FIELDS
+
+    def __init__(self, email_id=None, sender=None, recipient=None, subject=None, body=None, s3_message_path=None,
+                 created_at=None, updated_at=None, request_type=None, sub_request_type=None, processing_status=None,
+                 has_attachment=None, attachment_metadata=None, category_type=None, category=None):
+        self.email_id = email_id
+        self.sender = sender
+        self.recipient = recipient
+        self.subject = subject
+        self.body = body
+        self.s3_message_path = s3_message_path
+        self.created_at = created_at
+        self.updated_at = updated_at
+        self.request_type = request_type
+        self.sub_request_type = sub_request_type
+        self.processing_status = processing_status
+        self.has_attachment = bool(has_attachment)
+        self.attachment_metadata = attachment_metadata
+        self.category_type = category_type
+        self.category = category
+
+    @classmethod
+    def from_row(cls, row, fields=EMAIL_FIELDS):
+        """Build a record from a query row; with a projection only the selected attributes are set.
+
+        Only a row in EMAIL_FIELDS order maps positionally; other column lists are matched by name.
+        """
+        if fields is EMAIL_FIELDS:
+            return cls(*row)
+        record = cls.__new__(cls)
+        for name, value in zip(fields, row):
+            setattr(record, name, bool(value) if name == "has_attachment" else value)
+        return record
+
+    @classmethod
+    def from_dto(cls, email: Email):
+        record = cls.__new__(cls)
+        for name in EMAIL_FIELDS:
+            if hasattr(email, name):
+                setattr(record, name, getattr(email, name))
+        return record
+
+    def to_dict(self) -> dict:
+        """The attributes that are set, as a plain dict ready for json.dumps or a response body."""
+        try:
+            return dict(zip(EMAIL_FIELDS, get_fields(self)))
+        except AttributeError:
+            # Projected record
+            return {name: getattr(self, name) for name in EMAIL_FIELDS if hasattr(self, name)}
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict())
+
+    def to_dto(self) -> Email:
+        """Validated py_dto Email with the same attributes; raises TypeError on a mistyped value."""
+        return Email(self.to_dict(), allows_missing_keys=True)
+
+    def __repr__(self):
+        return f"EmailRecord({', '.join(f'{name}={value!r}' for name, value in self.to_dict().items())})"
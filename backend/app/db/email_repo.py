@@ -1,42 +1,92 @@
 import sqlite3 # type: ignore
 from app.db.email_dto import Email
+from app.db.email_record import EMAIL_FIELDS, EmailRecord
+from app.db.fingerprint import body_hash
+
+# Email attribute -> SELECT expression, in EmailRecord field order
+EMAIL_COLUMNS = dict(zip(EMAIL_FIELDS, (
+    "EMAIL_ID",
+    "SENDER",
+    "RECIEPIENT",
+    "SUBJECT",
+    "BODY",
+    "S3_MESSAGE_PATH",
+    "datetime(CREATED_AT, 'unixepoch')",
+    "datetime(UPDATED_AT, 'unixepoch')",
+    "REQUEST_TYPE",
+    "SUB_REQUEST_TYPE",
+    "PROCESSING_STATUS",
+    "HAS_ATTACHMENTS",
+    "ATTACHMENT_METADATA",
+    "CATEGORY_TYPE",
+    "CATEGORY"
+)))
+# SQLite's default limit on bound parameters per statement is 999
+MAX_IDS_PER_QUERY = 500
+
+UPDATE_EMAIL_SQL = ("UPDATE EMAIL SET SENDER = ?, RECIEPIENT = ?, SUBJECT = ?, BODY = ?, "
+    "S3_MESSAGE_PATH = ?, REQUEST_TYPE = ?, SUB_REQUEST_TYPE = ?, PROCESSING_STATUS = ?, HAS_ATTACHMENTS = ?, ATTACHMENT_METADATA = ?, "
+    "UPDATED_AT = strftime('%s','now'), CATEGORY_TYPE = ?, CATEGORY = ?, "
+    # Re-hash only when the body changes, so a legacy duplicate row left without a hash stays updatable
+    "BODY_HASH = CASE WHEN BODY IS ? THEN BODY_HASH ELSE ? END WHERE EMAIL_ID = ?")
+
+def select_columns(columns=None):
+    """Validate a projection and return (attribute names, SELECT list); EMAIL_ID is always included."""
+    if columns is None:
+        # EMAIL_FIELDS itself, so EmailRecord.from_row takes its positional fast path
+        names = EMAIL_FIELDS
+    else:
+        unknown = [column for column in columns if column not in EMAIL_COLUMNS]
+        if unknown:
+            raise ValueError(f"Unknown email columns: {', '.join(unknown)}")
+        names = ["email_id"] + [column for column in columns if column != "email_id"]
+    return names, ", ".join(EMAIL_COLUMNS[name] for name in names)
+
+def update_params(email):
+    return (email.sender, email.recipient, email.subject, email.body, email.s3_message_path, email.request_type,
+            email.sub_request_type, email.processing_status, email.has_attachment, email.attachment_metadata,
+            email.category_type, email.category, email.body, body_hash(email.body), email.email_id)
 
 class EmailRepo:
-    def __init__(self):
+    def __init__(self, pool=None):
         from app.db.sqlite_db_config import SQLiteDBConfig as DBConfig
-        self.db_config = DBConfig()
+        self.db_config = DBConfig(pool)
     
-    def insert_email(self, email: Email):
+    def insert_email(self, email: Email, commit: bool = True):
         try:
             row = self.db_config.cursor.execute("INSERT INTO EMAIL (SENDER, RECIEPIENT, SUBJECT, BODY, "
             "S3_MESSAGE_PATH, REQUEST_TYPE, SUB_REQUEST_TYPE, PROCESSING_STATUS, HAS_ATTACHMENTS, "
-            "ATTACHMENT_METADATA, CATEGORY_TYPE, CATEGORY, CREATED_AT )"
-            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, strftime('%s','now')) RETURNING EMAIL_ID",
+            "ATTACHMENT_METADATA, CATEGORY_TYPE, CATEGORY, BODY_HASH, CREATED_AT )"
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, strftime('%s','now')) RETURNING EMAIL_ID",
             (email.sender, email.recipient, email.subject, email.body, email.s3_message_path, email.request_type, 
              email.sub_request_type, email.processing_status, email.has_attachment, email.attachment_metadata, 
-             email.category_type, email.category))
+             email.category_type, email.category, body_hash(email.body)))
             if row:
                 email_id = int(row.fetchone()[0])
                 print("Email INSERTED with email_id:", email_id)
-                self.db_config.conn.commit()
+                if commit:
+                    self.db_config.conn.commit()
                 return email_id
         except sqlite3.DatabaseError as e:
             print(f"Error inserting email: {e}")
         return None
     
-    def update_email(self, email: Email):
+    def update_email(self, email):
         try:
-            self.db_config.cursor.execute("UPDATE EMAIL SET SENDER = ?, RECIEPIENT = ?, SUBJECT = ?, BODY = ?, "
-            "S3_MESSAGE_PATH = ?, REQUEST_TYPE = ?, SUB_REQUEST_TYPE = ?, PROCESSING_STATUS = ?, HAS_ATTACHMENTS = ?, ATTACHMENT_METADATA = ?, "
-            "UPDATED_AT = strftime('%s','now'), CATEGORY_TYPE = ?, CATEGORY = ? WHERE EMAIL_ID = ?",
-            (email.sender, email.recipient, email.subject, email.body, email.s3_message_path, email.request_type, 
-             email.sub_request_type, email.processing_status, email.has_attachment, email.attachment_metadata, 
-             email.category_type, email.category, email.email_id))
+            self.db_config.cursor.execute(UPDATE_EMAIL_SQL, update_params(email))
             self.db_config.conn.commit()
             print("Email updated successfully")
         except sqlite3.DatabaseError as e:
             print(f"Error updating email: {e}")
     
+    def update_processing_status(self, email_id: int, processing_status: str):
+        try:
+            self.db_config.cursor.execute("UPDATE EMAIL SET PROCESSING_STATUS = ?, UPDATED_AT = strftime('%s','now') "
+            "WHERE EMAIL_ID = ?", (processing_status, email_id))
+            self.db_config.conn.commit()
+        except sqlite3.DatabaseError as e:
+            print(f"Error updating processing status: {e}")
+    
     def get_email(self, email_id: int):
         try:
             self.db_config.cursor.execute("SELECT EMAIL_ID, SENDER, RECIEPIENT, SUBJECT, BODY, S3_MESSAGE_PATH, "
@@ -46,40 +96,97 @@ class EmailRepo:
             row = self.db_config.cursor.fetchone()
             if row:
                 print("Email found for id: ", email_id)
-                return EmailRepo.build_email_dto(row)
+                return EmailRepo.build_email_record(row)
         except sqlite3.DatabaseError as e:
             print(f"Error fetching email: {e}")
         return None
     
+    def get_email_id_by_body_hash(self, fingerprint: str):
+        """Id of the stored email whose normalized body has this hash (unique index lookup), else None."""
+        if fingerprint is None:
+            return None
+        try:
+            self.db_config.cursor.execute("SELECT EMAIL_ID FROM EMAIL WHERE BODY_HASH = ?", (fingerprint,))
+            row = self.db_config.cursor.fetchone()
+            if row:
+                return row[0]
+        except sqlite3.DatabaseError as e:
+            print(f"Error fetching email by body hash: {e}")
+        return None
+    
     def get_all_email(self):
+        """Every email with every column; prefer iter_emails for anything that can grow with the table."""
+        return list(self.iter_emails())
+
+    def get_emails_page(self, after_id: int = 0, limit: int = 100, columns=None):
+        """Keyset page: up to `limit` emails with EMAIL_ID > after_id, in id order.
+
+        Pass the last email_id of a page as after_id to get the next one.
+        """
+        names, select = select_columns(columns)
         try:
-            self.db_config.cursor.execute("SELECT EMAIL_ID, SENDER, RECIEPIENT, SUBJECT, BODY, S3_MESSAGE_PATH, "
-            "datetime(CREATED_AT, 'unixepoch'), datetime(UPDATED_AT, 'unixepoch'), "
-            "REQUEST_TYPE, SUB_REQUEST_TYPE, PROCESSING_STATUS, HAS_ATTACHMENTS, ATTACHMENT_METADATA, CATEGORY_TYPE, CATEGORY FROM EMAIL")
-            rows = self.db_config.cursor.fetchall()
-            return [EmailRepo.build_email_dto(row) for row in rows]
+            self.db_config.cursor.execute(f"SELECT {select} FROM EMAIL WHERE EMAIL_ID > ? ORDER BY EMAIL_ID LIMIT ?",
+                (after_id, limit))
+            return [EmailRepo.build_email_record(row, names) for row in self.db_config.cursor.fetchall()]
         except sqlite3.DatabaseError as e:
-            print(f"Error fetching all emails: {e}")
+            print(f"Error fetching emails: {e}")
             return []
-    
-    def build_email_dto(row):
-        return Email({
-            "email_id": row[0],
-            "sender": row[1],
-            "recipient": row[2],
-            "subject": row[3],
-            "body": row[4],
-            "s3_message_path": row[5],
-            "created_at": row[6],
-            "updated_at": row[7],
-            "request_type": row[8],
-            "sub_request_type": row[9],
-            "processing_status": row[10],
-            "has_attachment": bool(row[11]),
-            "attachment_metadata": row[12],
-            "category_type": row[13],
-            "category": row[14]
-        })
+
+    def iter_emails(self, batch_size: int = 500, columns=None, after_id: int = 0):
+        """Yield emails in id order, holding at most one page of `batch_size` rows in memory."""
+        while True:
+            page = self.get_emails_page(after_id, batch_size, columns)
+            yield from page
+            if len(page) < batch_size:
+                return
+            after_id = page[-1].email_id
+
+    def get_emails(self, email_ids, columns=None):
+        """Batch lookup: the emails with the given ids, in the order given, skipping ids that do not exist."""
+        names, select = select_columns(columns)
+        email_ids = list(email_ids)
+        found = {}
+        try:
+            for start in range(0, len(email_ids), MAX_IDS_PER_QUERY):
+                chunk = email_ids[start:start + MAX_IDS_PER_QUERY]
+                self.db_config.cursor.execute(f"SELECT {select} FROM EMAIL WHERE EMAIL_ID IN "
+                f"({', '.join('?' * len(chunk))})", chunk)
+                for row in self.db_config.cursor.fetchall():
+                    found[row[0]] = EmailRepo.build_email_record(row, names)
+        except sqlite3.DatabaseError as e:
+            print(f"Error fetching emails: {e}")
+        return [found[email_id] for email_id in email_ids if email_id in found]
+
+    def insert_many(self, emails):
+        """Insert emails in a single transaction and return their ids, or [] if the batch was rolled back."""
+        email_ids = []
+        try:
+            for email in emails:
+                email_id = self.insert_email(email, commit=False)
+                if email_id is None:
+                    raise sqlite3.DatabaseError("insert failed")
+                email_ids.append(email_id)
+            self.db_config.conn.commit()
+            return email_ids
+        except sqlite3.DatabaseError as e:
+            print(f"Error inserting emails: {e}")
+            self.db_config.conn.rollback()
+        return []
+
+    def update_many(self, emails):
+        """Update emails (matched on email_id) in a single transaction; returns the number of rows updated."""
+        try:
+            self.db_config.cursor.executemany(UPDATE_EMAIL_SQL, [update_params(email) for email in emails])
+            updated = self.db_config.cursor.rowcount
+            self.db_config.conn.commit()
+            return updated
+        except sqlite3.DatabaseError as e:
+            print(f"Error updating emails: {e}")
+            self.db_config.conn.rollback()
+        return 0
+
+    def build_email_record(row, columns=EMAIL_FIELDS):
+        return EmailRecord.from_row(row, columns)
     
     def close(self):
         self.db_config.close()
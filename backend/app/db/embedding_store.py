@@ -0,0 +1,176 @@
+import os
+import sqlite3
+import threading
+import numpy as np
+from app.core.config import settings
+from app.db.db_ddl import EMAIL_EMBEDDING_DDL
+from app.db.sqlite_db_config import SQLiteDBConfig as DBConfig
+from app.db.vector_index import create_index, load_index
+
+BACKFILL_BATCH_SIZE = 64
+
+
+class EmbeddingStore:
+    """Persistent EMAIL_ID -> embedding store backed by the EMAIL_EMBEDDING table.
+
+    Vectors are L2-normalized float32 so cosine similarity is a dot product. The table is the
+    source of truth; each process keeps a VectorIndex over it (optionally restored from an
+    on-disk snapshot) and tops it up with rows written by other workers.
+    """
+
+    def __init__(self, encoder, backend: str = None, snapshot_path: str = None):
+        # encoder: callable(list[str]) -> np.ndarray of normalized float32 rows
+        self.encoder = encoder
+        self.backend = backend or settings.VECTOR_INDEX_BACKEND
+        self.snapshot_path = snapshot_path if snapshot_path is not None else settings.VECTOR_INDEX_PATH
+        self.lock = threading.Lock()
+        self.index = None
+        self.last_id = 0
+        self.table_ready = False
+        # Ids this process indexed directly that refresh() will see again from the table
+        self.indexed_ahead = set()
+        # Whether the index has rows the snapshot on disk lacks
+        self.dirty = False
+
+    def ensure_table(self, db_config):
+        if self.table_ready:
+            return
+        db_config.cursor.execute(EMAIL_EMBEDDING_DDL)
+        db_config.conn.commit()
+        self.table_ready = True
+
+    def load(self):
+        """Build the index, encoding any EMAIL rows that predate the store."""
+        db_config = DBConfig()
+        try:
+            self.ensure_table(db_config)
+            self.backfill(db_config)
+            self.index = self.load_snapshot()
+            self.refresh(db_config)
+            db_config.cursor.execute("SELECT COUNT(*) FROM EMAIL_EMBEDDING")
+            if db_config.cursor.fetchone()[0] != len(self.index):
+                # Snapshot is missing rows below its high-water mark (or has deleted ones): rebuild
+                self.index, self.last_id = create_index(self.backend), 0
+                self.indexed_ahead = set()
+                self.refresh(db_config)
+            # Workers start together; only one whose snapshot was stale (or missing) rewrites it
+            if self.dirty:
+                self.save()
+        except sqlite3.DatabaseError as e:
+            print(f"Error loading email embeddings: {e}")
+            if self.index is None:
+                self.index = create_index(self.backend)
+        finally:
+            db_config.close()
+
+    def load_snapshot(self):
+        if self.snapshot_path and os.path.exists(self.snapshot_path):
+            try:
+                index = load_index(self.snapshot_path)
+                if index.backend == self.backend:
+                    ids = index.ids()
+                    self.last_id = int(ids.max()) if len(ids) else 0
+                    return index
+            except (OSError, ValueError, KeyError) as e:
+                print(f"Ignoring unreadable vector index snapshot: {e}")
+        self.last_id = 0
+        return create_index(self.backend)
+
+    def save(self):
+        """Write the index snapshot so the next process start skips the rebuild; a no-op when it is current."""
+        if self.snapshot_path and self.index is not None and self.dirty:
+            with self.lock:
+                self.index.save(self.snapshot_path)
+                self.dirty = False
+
+    def backfill(self, db_config):
+        db_config.cursor.execute("SELECT e.EMAIL_ID, e.BODY FROM EMAIL e "
+        "LEFT JOIN EMAIL_EMBEDDING v ON v.EMAIL_ID = e.EMAIL_ID WHERE v.EMAIL_ID IS NULL")
+        missing = db_config.cursor.fetchall()
+        for start in range(0, len(missing), BACKFILL_BATCH_SIZE):
+            batch = missing[start:start + BACKFILL_BATCH_SIZE]
+            vectors = self.encoder([body or "" for _, body in batch])
+            db_config.cursor.executemany("INSERT OR REPLACE INTO EMAIL_EMBEDDING (EMAIL_ID, VECTOR) VALUES (?, ?)",
+                [(email_id, np.asarray(vector, dtype=np.float32).tobytes()) for (email_id, _), vector in zip(batch, vectors)])
+            db_config.conn.commit()
+        if missing:
+            print(f"Backfilled {len(missing)} email embeddings")
+
+    def refresh(self, db_config=None):
+        """Pull vectors inserted since the last load (e.g. by another worker)."""
+        owns_config = db_config is None
+        if owns_config:
+            db_config = DBConfig()
+        try:
+            db_config.cursor.execute("SELECT EMAIL_ID, VECTOR FROM EMAIL_EMBEDDING WHERE EMAIL_ID > ? ORDER BY EMAIL_ID",
+                (self.last_id,))
+            rows = db_config.cursor.fetchall()
+        except sqlite3.DatabaseError as e:
+            print(f"Error refreshing email embeddings: {e}")
+            rows = []
+        finally:
+            if owns_config:
+                db_config.close()
+        if not rows:
+            return
+        with self.lock:
+            self.last_id = max(self.last_id, rows[-1][0])
+            rows = [row for row in rows if row[0] not in self.indexed_ahead]
+            self.indexed_ahead = {email_id for email_id in self.indexed_ahead if email_id > self.last_id}
+            if rows:
+                ids = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+                vectors = np.vstack([np.frombuffer(row[1], dtype=np.float32) for row in rows])
+                self.index.add(ids, vectors)
+                self.dirty = True
+
+    def add(self, email_id: int, vector, db_config=None):
+        """Persist the embedding of a newly inserted email and add it to the index.
+
+        With a caller's db_config the row joins that connection's open transaction (the caller commits).
+        """
+        vector = np.asarray(vector, dtype=np.float32)
+        owns_config = db_config is None
+        if owns_config:
+            db_config = DBConfig()
+        try:
+            self.ensure_table(db_config)
+            db_config.cursor.execute("INSERT OR REPLACE INTO EMAIL_EMBEDDING (EMAIL_ID, VECTOR) VALUES (?, ?)",
+                (email_id, vector.tobytes()))
+            if owns_config:
+                db_config.conn.commit()
+        except sqlite3.DatabaseError as e:
+            print(f"Error storing email embedding: {e}")
+        finally:
+            if owns_config:
+                db_config.close()
+        if self.index is not None:
+            with self.lock:
+                self.index.add(np.array([email_id], dtype=np.int64), vector.reshape(1, -1))
+                if email_id > self.last_id:
+                    self.indexed_ahead.add(email_id)
+                self.dirty = True
+
+    def remove(self, email_id: int):
+        """Drop an email's embedding from the table and the index."""
+        db_config = DBConfig()
+        try:
+            db_config.cursor.execute("DELETE FROM EMAIL_EMBEDDING WHERE EMAIL_ID = ?", (email_id,))
+            db_config.conn.commit()
+        except sqlite3.DatabaseError as e:
+            print(f"Error deleting email embedding: {e}")
+        finally:
+            db_config.close()
+        if self.index is not None:
+            with self.lock:
+                self.index.remove([email_id])
+                self.dirty = True
+
+    def search(self, vector, top_k: int = 10, threshold: float = 0.0):
+        """Return up to top_k (email_id, cosine score) pairs with score >= threshold, best first."""
+        if self.index is None:
+            self.load()
+        else:
+            self.refresh()
+        with self.lock:
+            matches = self.index.search(np.asarray(vector, dtype=np.float32), top_k)
+        return [(email_id, score) for email_id, score in matches if score >= threshold]
@@ -0,0 +1,20 @@
+import hashlib
+import unicodedata
+from typing import Optional
+
+
+def normalize_body(body: Optional[str]) -> str:
+    """Canonical form for exact-duplicate matching: NFKC, case-folded, whitespace collapsed."""
+    if not body:
+        return ""
+    if not unicodedata.is_normalized("NFKC", body):
+        body = unicodedata.normalize("NFKC", body)
+    return " ".join(body.casefold().split())
+
+
+def body_hash(body: Optional[str]) -> Optional[str]:
+    """SHA-256 of the normalized body, or None for an empty body (never treated as an exact duplicate)."""
+    normalized = normalize_body(body)
+    if not normalized:
+        return None
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
@@ -0,0 +1,39 @@
+import sqlite3 # type: ignore
+from app.db.db_ddl import INGEST_CHECKPOINT_DDL
+
+class IngestCheckpointRepo:
+    table_ready = False
+
+    def __init__(self):
+        from app.db.sqlite_db_config import SQLiteDBConfig as DBConfig
+        self.db_config = DBConfig()
+        if not IngestCheckpointRepo.table_ready:
+            self.db_config.cursor.execute(INGEST_CHECKPOINT_DDL)
+            self.db_config.conn.commit()
+            IngestCheckpointRepo.table_ready = True
+
+    def get_done_keys(self, source_key: str):
+        """Message keys of an archive that were stored (or found to be duplicates) by an earlier run."""
+        try:
+            self.db_config.cursor.execute("SELECT MESSAGE_KEY FROM INGEST_CHECKPOINT WHERE SOURCE_KEY = ?", (source_key,))
+            return {row[0] for row in self.db_config.cursor.fetchall()}
+        except sqlite3.DatabaseError as e:
+            print(f"Error reading ingest checkpoint: {e}")
+        return set()
+
+    def record(db_config, source_key: str, message_keys: list, results: list):
+        """Write checkpoint rows on the caller's connection; the caller's transaction commits them."""
+        db_config.cursor.executemany("INSERT OR REPLACE INTO INGEST_CHECKPOINT (SOURCE_KEY, MESSAGE_KEY, EMAIL_ID, "
+        "IS_DUPLICATE, CREATED_AT) VALUES (?, ?, ?, ?, strftime('%s','now'))",
+        [(source_key, message_key, result.get("email_id"), result.get("is_duplicate"))
+         for message_key, result in zip(message_keys, results)])
+
+    def clear(self, source_key: str):
+        try:
+            self.db_config.cursor.execute("DELETE FROM INGEST_CHECKPOINT WHERE SOURCE_KEY = ?", (source_key,))
+            self.db_config.conn.commit()
+        except sqlite3.DatabaseError as e:
+            print(f"Error clearing ingest checkpoint: {e}")
+
+    def close(self):
+        self.db_config.close()
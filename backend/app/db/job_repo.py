@@ -0,0 +1,121 @@
+import json
+import sqlite3 # type: ignore
+from app.db.db_ddl import EMAIL_JOB_DDL, EMAIL_JOB_INDEX_DDL
+
+JOB_COLUMNS = ("JOB_ID, JOB_TYPE, STATUS, STAGE, PARAMS, RESULT, ERROR, EMAIL_ID, ATTEMPTS, "
+    "datetime(CREATED_AT, 'unixepoch'), datetime(UPDATED_AT, 'unixepoch'), "
+    "datetime(STARTED_AT, 'unixepoch'), datetime(FINISHED_AT, 'unixepoch')")
+
+class JobRepo:
+    table_ready = False
+
+    def __init__(self):
+        from app.db.sqlite_db_config import SQLiteDBConfig as DBConfig
+        self.db_config = DBConfig()
+        if not JobRepo.table_ready:
+            self.db_config.cursor.execute(EMAIL_JOB_DDL)
+            self.db_config.cursor.execute(EMAIL_JOB_INDEX_DDL)
+            self.db_config.conn.commit()
+            JobRepo.table_ready = True
+
+    def create_job(self, job_type: str, payload: bytes = None, params: dict = None):
+        try:
+            row = self.db_config.cursor.execute("INSERT INTO EMAIL_JOB (JOB_TYPE, STATUS, STAGE, PAYLOAD, PARAMS, "
+            "CREATED_AT, UPDATED_AT) VALUES (?, 'QUEUED', 'QUEUED', ?, ?, strftime('%s','now'), strftime('%s','now')) "
+            "RETURNING JOB_ID", (job_type, payload, json.dumps(params or {})))
+            job_id = int(row.fetchone()[0])
+            self.db_config.conn.commit()
+            return job_id
+        except sqlite3.DatabaseError as e:
+            print(f"Error creating job: {e}")
+        return None
+
+    def count_queued(self):
+        self.db_config.cursor.execute("SELECT COUNT(*) FROM EMAIL_JOB WHERE STATUS = 'QUEUED'")
+        return self.db_config.cursor.fetchone()[0]
+
+    def claim_next_job(self):
+        """Atomically move the oldest QUEUED job to RUNNING and return (job_id, job_type, payload, params)."""
+        try:
+            row = self.db_config.cursor.execute("UPDATE EMAIL_JOB SET STATUS = 'RUNNING', ATTEMPTS = ATTEMPTS + 1, "
+            "STARTED_AT = strftime('%s','now'), UPDATED_AT = strftime('%s','now') "
+            "WHERE JOB_ID = (SELECT JOB_ID FROM EMAIL_JOB WHERE STATUS = 'QUEUED' ORDER BY JOB_ID LIMIT 1) "
+            "AND STATUS = 'QUEUED' RETURNING JOB_ID, JOB_TYPE, PAYLOAD, PARAMS").fetchone()
+            self.db_config.conn.commit()
+            if row:
+                return row[0], row[1], row[2], json.loads(row[3] or "{}")
+        except sqlite3.DatabaseError as e:
+            print(f"Error claiming job: {e}")
+        return None
+
+    def update_stage(self, job_id: int, stage: str, email_id: int = None):
+        try:
+            self.db_config.cursor.execute("UPDATE EMAIL_JOB SET STAGE = ?, EMAIL_ID = COALESCE(?, EMAIL_ID), "
+            "UPDATED_AT = strftime('%s','now') WHERE JOB_ID = ?", (stage, email_id, job_id))
+            self.db_config.conn.commit()
+        except sqlite3.DatabaseError as e:
+            print(f"Error updating job stage: {e}")
+
+    def finish_job(self, job_id: int, status: str, result=None, error: str = None):
+        """Record the outcome and drop the payload, which is no longer needed."""
+        try:
+            self.db_config.cursor.execute("UPDATE EMAIL_JOB SET STATUS = ?, STAGE = ?, RESULT = ?, ERROR = ?, PAYLOAD = NULL, "
+            "FINISHED_AT = strftime('%s','now'), UPDATED_AT = strftime('%s','now') WHERE JOB_ID = ?",
+            (status, status, json.dumps(result) if result is not None else None, error, job_id))
+            self.db_config.conn.commit()
+        except sqlite3.DatabaseError as e:
+            print(f"Error finishing job: {e}")
+
+    def requeue_job(self, job_id: int):
+        try:
+            self.db_config.cursor.execute("UPDATE EMAIL_JOB SET STATUS = 'QUEUED', STAGE = 'QUEUED', "
+            "UPDATED_AT = strftime('%s','now') WHERE JOB_ID = ?", (job_id,))
+            self.db_config.conn.commit()
+        except sqlite3.DatabaseError as e:
+            print(f"Error requeuing job: {e}")
+
+    def requeue_stale_jobs(self, stale_seconds: int, max_attempts: int):
+        """Requeue RUNNING jobs whose worker stopped reporting (e.g. a killed process); fail repeat offenders."""
+        try:
+            self.db_config.cursor.execute("UPDATE EMAIL_JOB SET STATUS = 'FAILED', STAGE = 'FAILED', "
+            "ERROR = 'Worker stopped responding', FINISHED_AT = strftime('%s','now'), PAYLOAD = NULL "
+            "WHERE STATUS = 'RUNNING' AND UPDATED_AT < strftime('%s','now') - ? AND ATTEMPTS >= ?",
+            (stale_seconds, max_attempts))
+            self.db_config.cursor.execute("UPDATE EMAIL_JOB SET STATUS = 'QUEUED', STAGE = 'QUEUED' "
+            "WHERE STATUS = 'RUNNING' AND UPDATED_AT < strftime('%s','now') - ?", (stale_seconds,))
+            requeued = self.db_config.cursor.rowcount
+            self.db_config.conn.commit()
+            return requeued
+        except sqlite3.DatabaseError as e:
+            print(f"Error requeuing stale jobs: {e}")
+        return 0
+
+    def get_job(self, job_id: int):
+        try:
+            self.db_config.cursor.execute(f"SELECT {JOB_COLUMNS} FROM EMAIL_JOB WHERE JOB_ID = ?", (job_id,))
+            row = self.db_config.cursor.fetchone()
+            if row:
+                return JobRepo.build_job_dict(row)
+        except sqlite3.DatabaseError as e:
+            print(f"Error fetching job: {e}")
+        return None
+
+    def build_job_dict(row):
+        return {
+            "job_id": row[0],
+            "job_type": row[1],
+            "status": row[2],
+            "stage": row[3],
+            "params": json.loads(row[4] or "{}"),
+            "result": json.loads(row[5]) if row[5] else None,
+            "error": row[6],
+            "email_id": row[7],
+            "attempts": row[8],
+            "created_at": row[9],
+            "updated_at": row[10],
+            "started_at": row[11],
+            "finished_at": row[12]
+        }
+
+    def close(self):
+        self.db_config.close()
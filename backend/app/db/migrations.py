@@ -0,0 +1,110 @@
+"""Versioned schema migrations.
+
+Each migration runs once, in order, in its own transaction, and its version is recorded in SCHEMA_VERSION.
+The app migrates on startup; to migrate by hand, from the backend directory:
+    python -m app.db.migrations
+"""
+import logging
+import sqlite3
+from app.db.db_ddl import (EMAIL_DDL, EMAIL_EMBEDDING_DDL, EMAIL_JOB_DDL, EMAIL_JOB_INDEX_DDL,
+                           EMAIL_MINHASH_DDL, INGEST_CHECKPOINT_DDL)
+from app.db.fingerprint import body_hash
+
+logger = logging.getLogger(__name__)
+
+SCHEMA_VERSION_DDL = ("CREATE TABLE IF NOT EXISTS SCHEMA_VERSION "
+    "("
+    "VERSION INTEGER PRIMARY KEY, "
+    "DESCRIPTION TEXT, "
+    "APPLIED_AT int"
+    ")")
+BACKFILL_BATCH_SIZE = 1000
+
+
+def add_body_hash(cursor):
+    """BODY_HASH holds the SHA-256 of the normalized body; the unique index rejects exact duplicates on insert.
+
+    Existing rows are hashed in id order; an older exact duplicate keeps the hash and later copies keep NULL.
+    """
+    columns = [row[1] for row in cursor.execute("PRAGMA table_info(EMAIL)").fetchall()]
+    if "BODY_HASH" not in columns:
+        cursor.execute("ALTER TABLE EMAIL ADD COLUMN BODY_HASH TEXT")
+    seen = set()
+    updates = []
+    rows = cursor.connection.execute("SELECT EMAIL_ID, BODY FROM EMAIL WHERE BODY_HASH IS NULL ORDER BY EMAIL_ID")
+    for email_id, body in rows:
+        fingerprint = body_hash(body)
+        if fingerprint is None or fingerprint in seen:
+            continue
+        seen.add(fingerprint)
+        updates.append((fingerprint, email_id))
+        if len(updates) >= BACKFILL_BATCH_SIZE:
+            cursor.executemany("UPDATE EMAIL SET BODY_HASH = ? WHERE EMAIL_ID = ?", updates)
+            updates = []
+    cursor.executemany("UPDATE EMAIL SET BODY_HASH = ? WHERE EMAIL_ID = ?", updates)
+    cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS IDX_EMAIL_BODY_HASH ON EMAIL (BODY_HASH)")
+
+
+# (version, description, SQL statements or a function taking a cursor)
+MIGRATIONS = [
+    (1, "Base tables", [EMAIL_DDL, EMAIL_EMBEDDING_DDL, EMAIL_JOB_DDL, EMAIL_JOB_INDEX_DDL, INGEST_CHECKPOINT_DDL]),
+    (2, "EMAIL lookup indexes", [
+        "CREATE INDEX IF NOT EXISTS IDX_EMAIL_CREATED_AT ON EMAIL (CREATED_AT)",
+        "CREATE INDEX IF NOT EXISTS IDX_EMAIL_PROCESSING_STATUS ON EMAIL (PROCESSING_STATUS)",
+        "CREATE INDEX IF NOT EXISTS IDX_EMAIL_CATEGORY_TYPE ON EMAIL (CATEGORY_TYPE)",
+        "CREATE INDEX IF NOT EXISTS IDX_EMAIL_SENDER ON EMAIL (SENDER)"
+    ]),
+    (3, "Normalized body hash with unique index", add_body_hash),
+    # Signatures of existing emails are backfilled by MinHashStore.load
+    (4, "MinHash signatures for near-duplicate detection", [EMAIL_MINHASH_DDL]),
+]
+
+
+def current_version(cursor) -> int:
+    cursor.execute(SCHEMA_VERSION_DDL)
+    return cursor.execute("SELECT COALESCE(MAX(VERSION), 0) FROM SCHEMA_VERSION").fetchone()[0]
+
+
+def migrate(pool=None) -> int:
+    """Apply pending migrations and return the schema version.
+
+    BEGIN IMMEDIATE takes the write lock before the version is read, so workers starting together apply
+    each migration once.
+    """
+    from app.db.sqlite_db_config import SQLiteDBConfig as DBConfig
+    db_config = DBConfig(pool)
+    cursor = db_config.cursor
+    try:
+        version = current_version(cursor)
+        db_config.conn.commit()
+        for migration_version, description, steps in MIGRATIONS:
+            if migration_version <= version:
+                continue
+            cursor.execute("BEGIN IMMEDIATE")
+            try:
+                applied = current_version(cursor)
+                if applied >= migration_version:
+                    # Another worker got here first
+                    db_config.conn.commit()
+                    version = applied
+                    continue
+                if callable(steps):
+                    steps(cursor)
+                else:
+                    for statement in steps:
+                        cursor.execute(statement)
+                cursor.execute("INSERT INTO SCHEMA_VERSION (VERSION, DESCRIPTION, APPLIED_AT) "
+                "VALUES (?, ?, strftime('%s','now'))", (migration_version, description))
+                db_config.conn.commit()
+                logger.info("Applied migration %s: %s", migration_version, description)
+            except sqlite3.DatabaseError:
+                db_config.conn.rollback()
+                raise
+            version = migration_version
+        return version
+    finally:
+        db_config.close()
+
+
+if __name__ == "__main__":
+    print(f"Schema version {migrate()}")
@@ -0,0 +1,100 @@
+import threading
+import zlib
+from collections import defaultdict
+import numpy as np
+from app.db.fingerprint import normalize_body
+
+# Mersenne prime for the universal hash family h(x) = (a*x + b) mod p
+MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+MAX_HASH = np.uint64(0xFFFFFFFF)
+
+
+class MinHasher:
+    """MinHash signatures over word shingles of the normalized body.
+
+    The share of equal positions in two signatures estimates the Jaccard similarity of their shingle sets.
+    """
+
+    def __init__(self, num_perm: int = 128, shingle_size: int = 3, seed: int = 1):
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        rng = np.random.RandomState(seed)
+        # a, b < 2^32 and shingle hashes < 2^32 keep a*x + b inside uint64
+        self.a = rng.randint(1, 1 << 32, size=num_perm, dtype=np.uint64)
+        self.b = rng.randint(0, 1 << 32, size=num_perm, dtype=np.uint64)
+
+    def shingles(self, body: str):
+        words = normalize_body(body).split(" ")
+        if len(words) <= self.shingle_size:
+            return {" ".join(words)} if words[0] else set()
+        return {" ".join(words[i:i + self.shingle_size]) for i in range(len(words) - self.shingle_size + 1)}
+
+    def signature(self, body: str) -> np.ndarray:
+        """uint32 signature of num_perm values; all MAX_HASH for an empty body."""
+        shingles = self.shingles(body)
+        if not shingles:
+            return np.full(self.num_perm, MAX_HASH, dtype=np.uint32)
+        hashes = np.fromiter((zlib.crc32(shingle.encode("utf-8")) for shingle in shingles),
+                             dtype=np.uint64, count=len(shingles))
+        permuted = (np.outer(hashes, self.a) + self.b) % MERSENNE_PRIME & MAX_HASH
+        return permuted.min(axis=0).astype(np.uint32)
+
+
+def jaccard(signature, other) -> float:
+    return float(np.count_nonzero(signature == other)) / len(signature)
+
+
+class MinHashLSH:
+    """Banded LSH over MinHash signatures: emails sharing any band bucket become candidates.
+
+    With b bands of r rows, pairs at Jaccard s collide with probability 1 - (1 - s^r)^b.
+    """
+
+    def __init__(self, num_perm: int = 128, bands: int = 32):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.buckets = [defaultdict(set) for _ in range(bands)]
+        self.signatures = {}
+        self.lock = threading.Lock()
+
+    def band_keys(self, signature):
+        return [signature[band * self.rows:(band + 1) * self.rows].tobytes() for band in range(self.bands)]
+
+    def add(self, email_id: int, signature):
+        with self.lock:
+            if email_id in self.signatures:
+                self.remove_locked(email_id)
+            self.signatures[email_id] = signature
+            for bucket, key in zip(self.buckets, self.band_keys(signature)):
+                bucket[key].add(email_id)
+
+    def remove(self, email_id: int):
+        with self.lock:
+            self.remove_locked(email_id)
+
+    def remove_locked(self, email_id):
+        signature = self.signatures.pop(email_id, None)
+        if signature is None:
+            return
+        for bucket, key in zip(self.buckets, self.band_keys(signature)):
+            members = bucket.get(key)
+            if members is not None:
+                members.discard(email_id)
+                if not members:
+                    del bucket[key]
+
+    def search(self, signature, top_k: int = 10, threshold: float = 0.0):
+        """Return up to top_k (email_id, estimated Jaccard) pairs with score >= threshold, best first."""
+        with self.lock:
+            candidates = set()
+            for bucket, key in zip(self.buckets, self.band_keys(signature)):
+                candidates.update(bucket.get(key, ()))
+            scored = [(email_id, jaccard(signature, self.signatures[email_id])) for email_id in candidates]
+        scored = [match for match in scored if match[1] >= threshold]
+        scored.sort(key=lambda match: match[1], reverse=True)
+        return scored[:top_k]
+
+    def __len__(self):
+        return len(self.signatures)
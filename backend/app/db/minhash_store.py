@@ -0,0 +1,135 @@
+import sqlite3
+import threading
+import numpy as np
+from app.core.config import settings
+from app.db.db_ddl import EMAIL_MINHASH_DDL
+from app.db.minhash_index import MinHasher, MinHashLSH
+from app.db.sqlite_db_config import SQLiteDBConfig as DBConfig
+
+BACKFILL_BATCH_SIZE = 500
+
+
+class MinHashStore:
+    """Persistent EMAIL_ID -> MinHash signature store backed by the EMAIL_MINHASH table.
+
+    Like EmbeddingStore, the table is the source of truth and each process keeps an in-memory
+    LSH index over it, topped up with rows written by other workers.
+    """
+
+    def __init__(self, num_perm: int = None, bands: int = None, shingle_size: int = None):
+        self.hasher = MinHasher(num_perm or settings.DEDUP_MINHASH_PERMUTATIONS,
+                                shingle_size or settings.DEDUP_SHINGLE_SIZE)
+        self.bands = bands or settings.DEDUP_MINHASH_BANDS
+        self.lock = threading.Lock()
+        self.index = None
+        self.last_id = 0
+        self.table_ready = False
+        # Ids this process indexed directly that refresh() will see again from the table
+        self.indexed_ahead = set()
+
+    def ensure_table(self, db_config):
+        if self.table_ready:
+            return
+        db_config.cursor.execute(EMAIL_MINHASH_DDL)
+        db_config.conn.commit()
+        self.table_ready = True
+
+    def signature(self, body: str):
+        return self.hasher.signature(body)
+
+    def load(self):
+        """Build the LSH index, hashing any EMAIL rows that predate the store."""
+        db_config = DBConfig()
+        try:
+            self.ensure_table(db_config)
+            self.backfill(db_config)
+            self.index, self.last_id = MinHashLSH(self.hasher.num_perm, self.bands), 0
+            self.refresh(db_config)
+        except sqlite3.DatabaseError as e:
+            print(f"Error loading MinHash signatures: {e}")
+            if self.index is None:
+                self.index = MinHashLSH(self.hasher.num_perm, self.bands)
+        finally:
+            db_config.close()
+
+    def backfill(self, db_config):
+        db_config.cursor.execute("SELECT e.EMAIL_ID, e.BODY FROM EMAIL e "
+        "LEFT JOIN EMAIL_MINHASH m ON m.EMAIL_ID = e.EMAIL_ID WHERE m.EMAIL_ID IS NULL")
+        missing = db_config.cursor.fetchall()
+        for start in range(0, len(missing), BACKFILL_BATCH_SIZE):
+            batch = missing[start:start + BACKFILL_BATCH_SIZE]
+            db_config.cursor.executemany("INSERT OR REPLACE INTO EMAIL_MINHASH (EMAIL_ID, SIGNATURE) VALUES (?, ?)",
+                [(email_id, self.signature(body).tobytes()) for email_id, body in batch])
+            db_config.conn.commit()
+        if missing:
+            print(f"Backfilled {len(missing)} MinHash signatures")
+
+    def refresh(self, db_config=None):
+        """Pull signatures inserted since the last load (e.g. by another worker)."""
+        owns_config = db_config is None
+        if owns_config:
+            db_config = DBConfig()
+        try:
+            db_config.cursor.execute("SELECT EMAIL_ID, SIGNATURE FROM EMAIL_MINHASH WHERE EMAIL_ID > ? ORDER BY EMAIL_ID",
+                (self.last_id,))
+            rows = db_config.cursor.fetchall()
+        except sqlite3.DatabaseError as e:
+            print(f"Error refreshing MinHash signatures: {e}")
+            rows = []
+        finally:
+            if owns_config:
+                db_config.close()
+        if not rows:
+            return
+        with self.lock:
+            self.last_id = max(self.last_id, rows[-1][0])
+            rows = [row for row in rows if row[0] not in self.indexed_ahead]
+            self.indexed_ahead = {email_id for email_id in self.indexed_ahead if email_id > self.last_id}
+        for email_id, signature in rows:
+            self.index.add(email_id, np.frombuffer(signature, dtype=np.uint32))
+
+    def add(self, email_id: int, body: str, db_config=None):
+        """Persist the signature of a newly inserted email and add it to the index.
+
+        With a caller's db_config the row joins that connection's open transaction (the caller commits).
+        """
+        signature = self.signature(body)
+        owns_config = db_config is None
+        if owns_config:
+            db_config = DBConfig()
+        try:
+            self.ensure_table(db_config)
+            db_config.cursor.execute("INSERT OR REPLACE INTO EMAIL_MINHASH (EMAIL_ID, SIGNATURE) VALUES (?, ?)",
+                (email_id, signature.tobytes()))
+            if owns_config:
+                db_config.conn.commit()
+        except sqlite3.DatabaseError as e:
+            print(f"Error storing MinHash signature: {e}")
+        finally:
+            if owns_config:
+                db_config.close()
+        if self.index is not None:
+            self.index.add(email_id, signature)
+            with self.lock:
+                if email_id > self.last_id:
+                    self.indexed_ahead.add(email_id)
+
+    def remove(self, email_id: int):
+        db_config = DBConfig()
+        try:
+            db_config.cursor.execute("DELETE FROM EMAIL_MINHASH WHERE EMAIL_ID = ?", (email_id,))
+            db_config.conn.commit()
+        except sqlite3.DatabaseError as e:
+            print(f"Error deleting MinHash signature: {e}")
+        finally:
+            db_config.close()
+        if self.index is not None:
+            self.index.remove(email_id)
+
+    def search(self, body: str, top_k: int = 10, threshold: float = 0.0):
+        """Return up to top_k (email_id, estimated Jaccard) pairs with score >= threshold, best first."""
+        if self.index is None:
+            self.load()
+        else:
+            self.refresh()
+        return self.index.search(self.signature(body), top_k, threshold)
@@ -1,33 +1,28 @@
 from app.db import Email
 from app.db.email_repo import EmailRepo
-from sentence_transformers import SentenceTransformer, util
-from google.generativeai import configure, GenerativeModel
-import os
+from app.utils.llm_cache import cached_generate_content
+from app.utils.model_loader import gemini_model, get_embedding_model
 
 #pip install sentence_transformers
 #pip install transformers==4.41.0
 #pip install google.generativeai
 #numpy <"2.0.0"
 
-# Configure Gemini API
-configure(api_key=os.getenv("GEMINI_API_KEY"))
-model_gemini = GenerativeModel("gemini-1.5-pro")
-
-# Load sentence embedding model
-embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
+# Shares the process's lazily loaded models instead of loading its own copies
+model_gemini = gemini_model("gemini-1.5-pro")
 
 
 def fetch_emails_from_db():
     """Fetch existing emails and their attachment status from the database."""
     emailRepo = EmailRepo()
-    emails = emailRepo.get_all_email()
+    emails = list(emailRepo.iter_emails(columns=("body", "has_attachment")))
     emailRepo.close()
     return emails
 
 
 def get_email_embeddings(email_bodies):
     """Generate embeddings for email bodies."""
-    return embedding_model.encode(email_bodies, convert_to_tensor=True)
+    return get_embedding_model().encode(email_bodies, convert_to_tensor=True)
 
 
 def check_duplicate_email(email_body, has_attachment, threshold=0.85, llm_threshold=90):
@@ -41,9 +36,10 @@ def check_duplicate_email(email_body, has_attachment, threshold=0.85, llm_thresh
     stored_embeddings = get_email_embeddings(stored_bodies)
     
     # Compute embedding for the new email
-    email_embedding = embedding_model.encode(email_body, convert_to_tensor=True)
+    email_embedding = get_embedding_model().encode(email_body, convert_to_tensor=True)
 
     # Compute cosine similarity with stored emails
+    from sentence_transformers import util
     similarities = util.pytorch_cos_sim(email_embedding, stored_embeddings)[0]
 
     # Find potential duplicates (above similarity threshold)
@@ -67,10 +63,10 @@ def check_duplicate_email(email_body, has_attachment, threshold=0.85, llm_thresh
 
         Return only a numeric value.
         """
-        response = model_gemini.generate_content(prompt)
+        response_text = cached_generate_content(model_gemini, prompt, validate=float)
 
         try:
-            llm_similarity_score = float(response.text.strip())
+            llm_similarity_score = float(response_text)
 
             if llm_similarity_score >= llm_threshold:
                 # Case 1: Exact duplicate (same attachment status)
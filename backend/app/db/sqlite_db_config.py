@@ -1,25 +1,127 @@
+import logging
+import os
+import queue
 import sqlite3
+import threading
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DB_PATH = "hackathon.db"
+SYNCHRONOUS_MODES = ("OFF", "NORMAL", "FULL", "EXTRA")
+
+
+def database_path(database_url=None):
+    """SQLite file named by DATABASE_URL: a plain path or a sqlite:/// URL, hackathon.db when unset."""
+    if not database_url:
+        return DEFAULT_DB_PATH
+    if database_url.startswith("sqlite:///"):
+        return database_url[len("sqlite:///"):] or DEFAULT_DB_PATH
+    if database_url.startswith("sqlite://"):
+        return database_url[len("sqlite://"):] or DEFAULT_DB_PATH
+    return database_url
+
+
+def configure_connection(conn):
+    """WAL lets readers run alongside the single writer; the busy timeout makes writers wait instead of failing."""
+    synchronous = settings.DB_SYNCHRONOUS.upper()
+    if synchronous not in SYNCHRONOUS_MODES:
+        raise ValueError(f"DB_SYNCHRONOUS must be one of {', '.join(SYNCHRONOUS_MODES)}")
+    conn.execute(f"PRAGMA busy_timeout = {int(settings.DB_BUSY_TIMEOUT_MS)}")
+    conn.execute("PRAGMA journal_mode = WAL")
+    # NORMAL is durable in WAL mode except for the last transactions before a power loss
+    conn.execute(f"PRAGMA synchronous = {synchronous}")
+    conn.execute(f"PRAGMA cache_size = -{int(settings.DB_CACHE_SIZE_KB)}")
+    conn.execute(f"PRAGMA mmap_size = {int(settings.DB_MMAP_SIZE_MB) * 1024 * 1024}")
+    conn.execute("PRAGMA temp_store = MEMORY")
+    return conn
+
+
+class SQLiteConnectionPool:
+    """Thread-safe pool of configured connections to one database file, per process.
+
+    Up to `size` idle connections are kept; when all are in use a new one is opened and closed again on
+    release, so callers never wait on the pool itself.
+    """
+
+    def __init__(self, path: str, size: int):
+        self.path = path
+        self.size = size
+        self.idle = queue.LifoQueue()
+        self.lock = threading.Lock()
+        self.pid = os.getpid()
+
+    def connect(self):
+        conn = sqlite3.connect(self.path, timeout=settings.DB_BUSY_TIMEOUT_MS / 1000, check_same_thread=False)
+        return configure_connection(conn)
+
+    def acquire(self):
+        if self.pid != os.getpid():
+            # Connections must not cross a fork: start over in the child
+            with self.lock:
+                if self.pid != os.getpid():
+                    self.idle = queue.LifoQueue()
+                    self.pid = os.getpid()
+        try:
+            return self.idle.get_nowait()
+        except queue.Empty:
+            return self.connect()
+
+    def release(self, conn):
+        if conn.in_transaction:
+            # Same as closing a connection with uncommitted work
+            conn.rollback()
+        if self.pid == os.getpid() and self.idle.qsize() < self.size:
+            self.idle.put(conn)
+        else:
+            conn.close()
+
+    def close_all(self):
+        while True:
+            try:
+                self.idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = SQLiteConnectionPool(database_path(settings.DATABASE_URL), settings.DB_POOL_SIZE)
+        return _pool
+
 
 class SQLiteDBConfig:
-    def __init__(self):
+    def __init__(self, pool=None):
+        self.pool = pool or get_pool()
         try:
-            db_path = "hackathon.db"
-            self.conn = sqlite3.connect(db_path)
-            print(f"Connected to SQLite database at {db_path}")
+            self.conn = self.pool.acquire()
+            logger.debug("Connected to SQLite database at %s", self.pool.path)
             self.cursor = self.conn.cursor()
         except sqlite3.DatabaseError as e:
             print(f"Error connecting to SQLite database: {e}")
             self.conn = None
             self.cursor = None
-    
+
     def close(self):
+        """Return the connection to the pool; closing twice is a no-op."""
         if self.cursor:
             self.cursor.close()
+            self.cursor = None
         if self.conn:
-            self.conn.close()
-        print("Closed connection to SQLite database")
+            try:
+                self.pool.release(self.conn)
+            except sqlite3.DatabaseError as e:
+                print(f"Error releasing SQLite connection: {e}")
+            self.conn = None
+        logger.debug("Released connection to SQLite database")
 
 # Example usage
 # if __name__ == "__main__":
 #     db_config = SQLiteDBConfig()
-#     db_config.close()
\ No newline at end of file
+#     db_config.close()
@@ -1,102 +1,283 @@
+import json
+import threading
+import numpy as np
+from app.core.config import settings
 from app.db import Email
-from sentence_transformers import SentenceTransformer, util
-from google.generativeai import configure, GenerativeModel
-from app.utils.get_api_key import api_key
-API_KEY = api_key()
+from app.db.embedding_store import EmbeddingStore
+from app.db.fingerprint import body_hash
+from app.db.minhash_store import MinHashStore
+from app.utils.llm_cache import cached_generate_content
+from app.utils.embedding_client import embedding_client
+from app.utils.model_loader import encode_texts, gemini_model
 
-# Configure Gemini API
-configure(api_key=API_KEY)
-
-
-model_gemini = GenerativeModel("gemini-1.5-pro")
-
-# Load sentence embedding model
-embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
+# Loaded on first use (see app.utils.model_loader)
+model_gemini = gemini_model("gemini-1.5-pro")
 
 
 def fetch_emails_from_db():
     """Fetch existing emails and their attachment status from the database."""
     from app.db.email_repo import EmailRepo
     emailRepo = EmailRepo()
-    emails = emailRepo.get_all_email()
+    emails = list(emailRepo.iter_emails(columns=("body", "has_attachment")))
     emailRepo.close()
     return emails
 
 
 def get_email_embeddings(email_bodies):
-    """Generate embeddings for email bodies."""
-    return embedding_model.encode(email_bodies, convert_to_tensor=True)
+    """Generate normalized embeddings for email bodies, on the shared embedding server when one is configured.
 
+    With a server the worker never loads its own model; the client waits for an unreachable server and
+    raises if it does not come back.
+    """
+    if embedding_client is not None:
+        return embedding_client.encode(email_bodies)
+    return encode_texts(email_bodies)
 
-def check_duplicate_email(email_body, has_attachment, threshold=0.85, llm_threshold=90):
-    """Checks if an email is a duplicate by comparing both body text and attachment status."""
-    
-    stored_emails = fetch_emails_from_db()
-    if not stored_emails:
-        return False  # No stored emails to compare
 
-    stored_bodies = [email.body for email in stored_emails]
-    stored_embeddings = get_email_embeddings(stored_bodies)
-    
-    # Compute embedding for the new email
-    email_embedding = embedding_model.encode(email_body, convert_to_tensor=True)
+# Stored embeddings are computed once at insert time and searched in memory
+embedding_store = EmbeddingStore(get_email_embeddings)
+minhash_store = MinHashStore()
 
-    # Compute cosine similarity with stored emails
-    similarities = util.pytorch_cos_sim(email_embedding, stored_embeddings)[0]
 
-    # Find potential duplicates (above similarity threshold)
-    potential_duplicates = [
-        (stored_emails[i], score.item()) for i, score in enumerate(similarities) if score.item() >= threshold
-    ]
+def encode_email(email_body):
+    """Generate the normalized embedding for a single email body."""
+    return get_email_embeddings([email_body or ""])[0]
 
-    print("===================")
-    print(potential_duplicates)
-    print("===================")
 
-    if not potential_duplicates:
-        return False  # No potential matches found
+def encode_emails(email_bodies):
+    """Generate normalized embeddings for a batch of email bodies in one forward pass."""
+    return get_email_embeddings([email_body or "" for email_body in email_bodies])
+
+
+def index_email(email_id, email_embedding, db_config=None, email_body=None):
+    """Persist the embedding (and MinHash signature, given the body) of a stored email for later uploads."""
+    embedding_store.add(email_id, email_embedding, db_config)
+    if email_body is not None and settings.DEDUP_MINHASH_ENABLED:
+        minhash_store.add(email_id, email_body, db_config)
+
+
+def unindex_email(email_id):
+    embedding_store.remove(email_id)
+    minhash_store.remove(email_id)
+
+
+def fetch_candidate_emails(email_ids, emailRepo=None):
+    """Fetch id, body and attachment status of the given stored emails in one query, skipping missing ids."""
+    from app.db.email_repo import EmailRepo
+    owns_repo = emailRepo is None
+    if owns_repo:
+        emailRepo = EmailRepo()
+    emails = emailRepo.get_emails(email_ids, columns=("body", "has_attachment"))
+    if owns_repo:
+        emailRepo.close()
+    return emails
+
+
+def check_duplicate_email(email_body, has_attachment, threshold=None, llm_threshold=None, top_k=None, email_embedding=None,
+                          emailRepo=None):
+    """Checks if an email is a duplicate by comparing both body text and attachment status.
+
+    Pass the EmailRepo of an open batch transaction so candidates inserted earlier in the batch are visible.
+    """
+    return find_duplicate(email_body, has_attachment, threshold, llm_threshold, top_k, email_embedding, emailRepo)[0]
+
+
+def find_duplicate(email_body, has_attachment, threshold=None, llm_threshold=None, top_k=None, email_embedding=None,
+                   emailRepo=None):
+    """Run the duplicate cascade and return (is_duplicate, email_embedding, deciding stage).
+
+    Stages run cheapest first: exact BODY_HASH match, MinHash/LSH shingle similarity, embedding similarity,
+    then the LLM for their candidates. Only the hash and the LLM decide unless a DUPLICATE threshold is
+    lowered to 1 or below to let MinHash or embedding similarity decide on its own. The embedding is
+    computed only if the cascade gets that far (None otherwise), so callers can index it without re-encoding.
+    """
+    threshold = settings.DEDUP_EMBEDDING_CANDIDATE_THRESHOLD if threshold is None else threshold
+    llm_threshold = settings.DEDUP_LLM_THRESHOLD if llm_threshold is None else llm_threshold
+    top_k = settings.DEDUP_TOP_K if top_k is None else top_k
+    from app.db.email_repo import EmailRepo
+    owns_repo = emailRepo is None
+    if owns_repo:
+        emailRepo = EmailRepo()
+    try:
+        # Stage 1: exact match on the normalized body hash (unique index)
+        if emailRepo.get_email_id_by_body_hash(body_hash(email_body)) is not None:
+            return record_stage(True, email_embedding, "hash")
+
+        # Stage 2: MinHash/LSH estimate of shingle Jaccard similarity
+        shingle_matches = []
+        if settings.DEDUP_MINHASH_ENABLED:
+            shingle_matches = minhash_store.search(email_body, top_k, settings.DEDUP_MINHASH_CANDIDATE_THRESHOLD)
+            if shingle_matches and shingle_matches[0][1] >= settings.DEDUP_MINHASH_DUPLICATE_THRESHOLD:
+                return record_stage(True, email_embedding, "minhash")
+
+        # Stage 3: cosine similarity of sentence embeddings (vectorized top-k search)
+        if email_embedding is None:
+            email_embedding = encode_email(email_body)
+        matches = embedding_store.search(email_embedding, top_k=top_k, threshold=threshold)
+        if matches and matches[0][1] >= settings.DEDUP_EMBEDDING_DUPLICATE_THRESHOLD:
+            return record_stage(True, email_embedding, "embedding")
+
+        # Stage 4: LLM adjudication of the ambiguous band, most similar first
+        scores = dict(shingle_matches)
+        scores.update(matches)
+        candidate_ids = sorted(scores, key=scores.get, reverse=True)[:top_k]
+        if not candidate_ids:
+            return record_stage(False, email_embedding, "unique")  # No potential matches found
+        potential_duplicates = [
+            (stored_email, scores[stored_email.email_id])
+            for stored_email in fetch_candidate_emails(candidate_ids, emailRepo)
+        ]
+        if potential_duplicates:
+            count_stat("llm_checks")
+            count_stat("llm_candidates", len(potential_duplicates))
+        if llm_confirms_duplicate(email_body, has_attachment, potential_duplicates, llm_threshold):
+            return record_stage(True, email_embedding, "llm")
+        return record_stage(False, email_embedding, "unique")
+    finally:
+        if owns_repo:
+            emailRepo.close()
 
-    # Check LLM similarity for highly similar emails
-    for stored_email, similarity_score in potential_duplicates:
-        prompt = f"""
-        Compare the following two emails and determine if they are duplicates.
+
+def find_batch_duplicate(email_body, has_attachment, email_embedding, earlier, llm_threshold=None, top_k=None):
+    """Whether an email duplicates one decided unique earlier in the same, not yet stored, batch.
+
+    earlier holds (EmailRecord, embedding) pairs. The same embedding thresholds and LLM adjudication as
+    find_duplicate apply; nothing is indexed or written, so a batch can be checked before it is stored.
+    """
+    llm_threshold = settings.DEDUP_LLM_THRESHOLD if llm_threshold is None else llm_threshold
+    top_k = settings.DEDUP_TOP_K if top_k is None else top_k
+    if not earlier:
+        return False
+    digest = body_hash(email_body)
+    if any(body_hash(stored_email.body) == digest for stored_email, _ in earlier):
+        return True
+    similarities = np.stack([embedding for _, embedding in earlier]) @ np.asarray(email_embedding)
+    ranked = [int(position) for position in np.argsort(-similarities)[:top_k]
+              if similarities[position] >= settings.DEDUP_EMBEDDING_CANDIDATE_THRESHOLD]
+    if not ranked:
+        return False
+    if similarities[ranked[0]] >= settings.DEDUP_EMBEDDING_DUPLICATE_THRESHOLD:
+        return True
+    potential_duplicates = [(earlier[position][0], float(similarities[position])) for position in ranked]
+    return llm_confirms_duplicate(email_body, has_attachment, potential_duplicates, llm_threshold)
+
+
+# One similarity score per numbered candidate, 0-100
+DUPLICATE_RESPONSE_SCHEMA = {
+    "type": "array",
+    "items": {
+        "type": "object",
+        "properties": {
+            "candidate": {"type": "integer"},
+            "similarity": {"type": "number"}
+        },
+        "required": ["candidate", "similarity"]
+    }
+}
+
+
+def build_duplicate_prompt(email_body, candidates):
+    numbered = "\n\n".join(
+        f"Candidate {number}:\n{stored_email.body}" for number, stored_email in enumerate(candidates, start=1)
+    )
+    return f"""
+        Compare the new email with each numbered candidate and determine which are duplicates of it.
         - Consider minor wording differences.
         - Check if one email has an attachment while the other does not.
-        - If they are duplicates, return a similarity percentage (0-100).
+        - For every candidate, return its number and a similarity percentage (0-100).
 
-        Email 1: {stored_email.body}
-        Email 2: {email_body}
+        New email: {email_body}
 
-        Return only a numeric value.
+        {numbered}
         """
-        response = model_gemini.generate_content(prompt)
 
+
+def parse_duplicate_scores(response_text, count):
+    """Map candidate number (1-based) to similarity from a batched response, skipping malformed entries."""
+    scores = {}
+    for item in json.loads(response_text):
+        try:
+            number, similarity = int(item["candidate"]), float(item["similarity"])
+        except (KeyError, TypeError, ValueError):
+            print(f"Skipping invalid duplicate score: {item}")
+            continue
+        if 1 <= number <= count:
+            scores[number] = max(similarity, scores.get(number, similarity))
+    return scores
+
+
+def llm_confirms_duplicate(email_body, has_attachment, potential_duplicates, llm_threshold):
+    """Ask the LLM to score all candidates in one call per DEDUP_LLM_MAX_CANDIDATES, most similar first."""
+    print("===================")
+    print(potential_duplicates)
+    print("===================")
+
+    generation_config = {
+        "response_mime_type": "application/json",
+        "response_schema": DUPLICATE_RESPONSE_SCHEMA
+    }
+    candidates = [stored_email for stored_email, _ in potential_duplicates]
+    batch_size = max(1, settings.DEDUP_LLM_MAX_CANDIDATES)
+    for start in range(0, len(candidates), batch_size):
+        batch = candidates[start:start + batch_size]
+        count_stat("llm_calls")
+        response_text = cached_generate_content(model_gemini, build_duplicate_prompt(email_body, batch),
+                                                generation_config=generation_config, validate=json.loads)
         try:
-            llm_similarity_score = float(response.text.strip())
-            print("llm_similarity_score")
-            print(llm_similarity_score)
-            print("llm_threadhold")
-            print(llm_threshold)
-            if llm_similarity_score >= llm_threshold:
-                # Case 1: Exact duplicate (same attachment status)
-                if stored_email.has_attachment == has_attachment:
-                    return True
-
-                # Case 2: Same email, only attachment differs
-                if stored_email.has_attachment and not has_attachment:
-                    print("Duplicate found: The same email was sent earlier with an attachment.")
-                    return True
-
-                if not stored_email.has_attachment and has_attachment:
-                    print("Duplicate found: The same email was sent earlier, now with an attachment.")
-                    return True
-
-        except ValueError:
-            continue  # Skip invalid responses
+            scores = parse_duplicate_scores(response_text, len(batch))
+        except (ValueError, TypeError):
+            print(f"Invalid duplicate scores response: {response_text!r}")
+            continue
+        print("llm_similarity_scores")
+        print(scores)
+        print("llm_threadhold")
+        print(llm_threshold)
+        for number, llm_similarity_score in sorted(scores.items()):
+            if llm_similarity_score < llm_threshold:
+                continue
+            stored_email = batch[number - 1]
+            # Case 1: Exact duplicate (same attachment status)
+            if stored_email.has_attachment == has_attachment:
+                return True
+
+            # Case 2: Same email, only attachment differs
+            if stored_email.has_attachment and not has_attachment:
+                print("Duplicate found: The same email was sent earlier with an attachment.")
+                return True
+
+            if not stored_email.has_attachment and has_attachment:
+                print("Duplicate found: The same email was sent earlier, now with an attachment.")
+                return True
 
     return False  # Not a duplicate
 
 
+# Per-process counters behind GET /email/dedup/stats
+dedup_stats = {"checks": 0, "hash_hits": 0, "minhash_hits": 0, "embedding_hits": 0, "llm_hits": 0, "unique": 0,
+               "llm_checks": 0, "llm_candidates": 0, "llm_calls": 0}
+dedup_stats_lock = threading.Lock()
+
+
+def count_stat(name, amount=1):
+    with dedup_stats_lock:
+        dedup_stats[name] += amount
+
+
+def record_stage(is_duplicate, email_embedding, stage):
+    with dedup_stats_lock:
+        dedup_stats["checks"] += 1
+        dedup_stats["unique" if stage == "unique" else f"{stage}_hits"] += 1
+    return is_duplicate, email_embedding, stage
+
+
+def get_dedup_stats():
+    with dedup_stats_lock:
+        stats = dict(dedup_stats)
+    # Checks settled without asking the LLM at all
+    stats["decided_before_llm"] = stats["checks"] - stats["llm_checks"]
+    return stats
+
+
 
     # # Store new emails only if they are unique
     # if not check_duplicate_email(email2_body, has_attachment=False):
@@ -2,6 +2,6 @@ def fetch_emails_from_db():
     from app.db.email_repo import EmailRepo  
     """Fetch existing emails and their attachment status from the database."""
     emailRepo = EmailRepo()
-    emails = emailRepo.get_all_email()
+    emails = list(emailRepo.iter_emails(columns=("body", "has_attachment")))
     emailRepo.close()
     return emails
\ No newline at end of file
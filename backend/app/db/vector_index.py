@@ -0,0 +1,365 @@
+import os
+import time
+import numpy as np
+
+# Superseded HNSW graph files are kept this long for workers still loading the snapshot that named them
+GRAPH_GRACE_SECONDS = 300
+
+
+class VectorIndex:
+    """Nearest-neighbour index over L2-normalized float32 vectors keyed by integer ids (EMAIL_ID)."""
+
+    backend = None
+
+    def add(self, ids, vectors):
+        raise NotImplementedError
+
+    def remove(self, ids):
+        raise NotImplementedError
+
+    def search(self, vector, top_k: int = 10):
+        """Return up to top_k (id, cosine score) pairs, best first."""
+        raise NotImplementedError
+
+    def ids(self):
+        """Return the ids currently stored in the index."""
+        raise NotImplementedError
+
+    def save(self, path: str):
+        raise NotImplementedError
+
+    @classmethod
+    def load(cls, path: str):
+        raise NotImplementedError
+
+    def __len__(self):
+        raise NotImplementedError
+
+
+def save_arrays(path, **arrays):
+    """Write an .npz snapshot atomically so concurrent workers never read a partial file."""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        np.savez(f, **arrays)
+    os.replace(tmp_path, path)
+
+
+def remove_stale_graphs(path, current):
+    """Delete graph files of earlier HNSW snapshots, sparing recent ones a reader may still be opening."""
+    directory, prefix = os.path.dirname(path) or ".", os.path.basename(path) + "."
+    cutoff = time.time() - GRAPH_GRACE_SECONDS
+    for name in os.listdir(directory):
+        if name.startswith(prefix) and name.endswith(".hnsw") and name != current:
+            try:
+                if os.path.getmtime(os.path.join(directory, name)) < cutoff:
+                    os.remove(os.path.join(directory, name))
+            except OSError:
+                pass  # Removed by another worker
+
+
+def top_k_scores(ids, matrix, vector, top_k):
+    """Exact cosine top-k over a (n, d) matrix of normalized rows."""
+    if len(ids) == 0:
+        return []
+    scores = matrix @ vector
+    k = min(top_k, len(scores))
+    top = np.argpartition(-scores, k - 1)[:k]
+    top = top[np.argsort(-scores[top])]
+    return [(int(ids[i]), float(scores[i])) for i in top]
+
+
+class VectorList:
+    """Growable (ids, vectors) block; appends are buffered and compacted on read."""
+
+    def __init__(self):
+        self.ids = np.empty(0, dtype=np.int64)
+        self.vectors = None
+        self.pending_ids = []
+        self.pending_vectors = []
+
+    def add(self, ids, vectors):
+        self.pending_ids.append(np.asarray(ids, dtype=np.int64))
+        self.pending_vectors.append(np.asarray(vectors, dtype=np.float32))
+
+    def arrays(self):
+        if self.pending_ids:
+            ids = np.concatenate([self.ids] + self.pending_ids)
+            blocks = self.pending_vectors if self.vectors is None else [self.vectors] + self.pending_vectors
+            self.ids, self.vectors = ids, np.vstack(blocks)
+            self.pending_ids, self.pending_vectors = [], []
+        return self.ids, self.vectors
+
+    def remove(self, ids):
+        current, vectors = self.arrays()
+        keep = ~np.isin(current, np.asarray(ids, dtype=np.int64))
+        if not keep.all():
+            self.ids, self.vectors = current[keep], vectors[keep]
+
+    def __len__(self):
+        return len(self.ids) + sum(len(block) for block in self.pending_ids)
+
+
+class ExactIndex(VectorIndex):
+    """Brute-force scan; the reference the approximate backends are measured against."""
+
+    backend = "exact"
+
+    def __init__(self):
+        self.entries = VectorList()
+        self.members = set()
+
+    def add(self, ids, vectors):
+        ids = np.asarray(ids, dtype=np.int64)
+        self.remove([i for i in ids.tolist() if i in self.members])
+        self.entries.add(ids, vectors)
+        self.members.update(ids.tolist())
+
+    def remove(self, ids):
+        ids = [int(i) for i in ids if int(i) in self.members]
+        if ids:
+            self.entries.remove(ids)
+            self.members.difference_update(ids)
+
+    def search(self, vector, top_k: int = 10):
+        ids, matrix = self.entries.arrays()
+        if matrix is None:
+            return []
+        return top_k_scores(ids, matrix, np.asarray(vector, dtype=np.float32), top_k)
+
+    def ids(self):
+        return self.entries.arrays()[0]
+
+    def save(self, path: str):
+        ids, matrix = self.entries.arrays()
+        save_arrays(path, backend=self.backend, ids=ids, vectors=matrix if matrix is not None else np.empty((0, 0), np.float32))
+
+    @classmethod
+    def load(cls, path: str):
+        data = np.load(path)
+        index = cls()
+        if len(data["ids"]):
+            index.add(data["ids"], data["vectors"])
+        return index
+
+    def __len__(self):
+        return len(self.members)
+
+
+class IVFIndex(VectorIndex):
+    """Inverted-file index: k-means centroids partition the vectors, a query scans the nprobe closest lists.
+
+    Until min_train_size vectors have been added everything lives in a single list (an exact scan).
+    """
+
+    backend = "ivf"
+
+    def __init__(self, nlist: int = 256, nprobe: int = 8, min_train_size: int = 10000, iterations: int = 10, seed: int = 0):
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.min_train_size = min_train_size
+        self.iterations = iterations
+        self.seed = seed
+        self.centroids = None
+        self.lists = [VectorList()]
+        self.assignment = {}
+
+    @property
+    def trained(self):
+        return self.centroids is not None
+
+    def assign(self, vectors):
+        if not self.trained:
+            return np.zeros(len(vectors), dtype=np.int64)
+        return np.argmax(vectors @ self.centroids.T, axis=1)
+
+    def add(self, ids, vectors):
+        ids = np.asarray(ids, dtype=np.int64)
+        vectors = np.asarray(vectors, dtype=np.float32)
+        self.remove([i for i in ids if int(i) in self.assignment])
+        lists = self.assign(vectors)
+        for list_id in np.unique(lists):
+            mask = lists == list_id
+            self.lists[list_id].add(ids[mask], vectors[mask])
+        self.assignment.update(zip(ids.tolist(), lists.tolist()))
+        if not self.trained and len(self.assignment) >= self.min_train_size:
+            self.train()
+
+    def remove(self, ids):
+        by_list = {}
+        for email_id in ids:
+            list_id = self.assignment.pop(int(email_id), None)
+            if list_id is not None:
+                by_list.setdefault(list_id, []).append(int(email_id))
+        for list_id, list_ids in by_list.items():
+            self.lists[list_id].remove(list_ids)
+
+    def train(self):
+        """Fit spherical k-means centroids and redistribute every stored vector."""
+        ids, vectors = self.all_arrays()
+        if len(ids) == 0:
+            return
+        rng = np.random.default_rng(self.seed)
+        nlist = min(self.nlist, len(ids))
+        sample = vectors[rng.choice(len(ids), size=min(len(ids), nlist * 64), replace=False)]
+        centroids = sample[rng.choice(len(sample), size=nlist, replace=False)].copy()
+        for _ in range(self.iterations):
+            labels = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, sample)
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            empty = norms[:, 0] == 0
+            sums[empty] = sample[rng.choice(len(sample), size=int(empty.sum()))]
+            norms[empty] = 1.0
+            centroids = (sums / norms).astype(np.float32)
+        self.centroids = centroids
+        self.lists = [VectorList() for _ in range(nlist)]
+        self.assignment = {}
+        self.add(ids, vectors)
+
+    def all_arrays(self):
+        blocks = [entries.arrays() for entries in self.lists if len(entries)]
+        if not blocks:
+            return np.empty(0, dtype=np.int64), None
+        return np.concatenate([ids for ids, _ in blocks]), np.vstack([vectors for _, vectors in blocks])
+
+    def search(self, vector, top_k: int = 10):
+        vector = np.asarray(vector, dtype=np.float32)
+        if self.trained:
+            probe = np.argsort(-(self.centroids @ vector))[:self.nprobe]
+        else:
+            probe = [0]
+        blocks = [self.lists[list_id].arrays() for list_id in probe if len(self.lists[list_id])]
+        if not blocks:
+            return []
+        ids = np.concatenate([ids for ids, _ in blocks])
+        matrix = np.vstack([vectors for _, vectors in blocks])
+        return top_k_scores(ids, matrix, vector, top_k)
+
+    def ids(self):
+        return np.fromiter(self.assignment.keys(), dtype=np.int64, count=len(self.assignment))
+
+    def save(self, path: str):
+        ids, vectors = self.all_arrays()
+        save_arrays(path, backend=self.backend, ids=ids,
+                 vectors=vectors if vectors is not None else np.empty((0, 0), np.float32),
+                 centroids=self.centroids if self.trained else np.empty((0, 0), np.float32),
+                 params=np.array([self.nlist, self.nprobe, self.min_train_size, self.iterations, self.seed]))
+
+    @classmethod
+    def load(cls, path: str):
+        data = np.load(path)
+        nlist, nprobe, min_train_size, iterations, seed = (int(v) for v in data["params"])
+        index = cls(nlist=nlist, nprobe=nprobe, min_train_size=min_train_size, iterations=iterations, seed=seed)
+        if data["centroids"].size:
+            index.centroids = data["centroids"]
+            index.lists = [VectorList() for _ in range(len(index.centroids))]
+        if len(data["ids"]):
+            index.add(data["ids"], data["vectors"])
+        return index
+
+    def __len__(self):
+        return len(self.assignment)
+
+
+class HNSWIndex(VectorIndex):
+    """Graph index backed by hnswlib (optional dependency, imported on first use)."""
+
+    backend = "hnsw"
+
+    def __init__(self, dim: int = None, ef_search: int = 64, ef_construction: int = 200, m: int = 16, capacity: int = 1024):
+        self.dim = dim
+        self.ef_search = ef_search
+        self.ef_construction = ef_construction
+        self.m = m
+        self.capacity = capacity
+        self.index = None
+        self.labels = set()
+
+    def build(self, dim):
+        import hnswlib
+        self.dim = dim
+        self.index = hnswlib.Index(space="ip", dim=dim)
+        self.index.init_index(max_elements=self.capacity, ef_construction=self.ef_construction, M=self.m, allow_replace_deleted=True)
+        self.index.set_ef(self.ef_search)
+
+    def add(self, ids, vectors):
+        ids = np.asarray(ids, dtype=np.int64)
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if len(ids) == 0:
+            return
+        if self.index is None:
+            self.build(vectors.shape[1])
+        self.remove([i for i in ids.tolist() if i in self.labels])
+        needed = len(self.labels) + len(ids)
+        if needed > self.capacity:
+            self.capacity = max(needed, self.capacity * 2)
+            self.index.resize_index(self.capacity)
+        self.index.add_items(vectors, ids, replace_deleted=True)
+        self.labels.update(ids.tolist())
+
+    def remove(self, ids):
+        for email_id in ids:
+            if int(email_id) in self.labels:
+                self.index.mark_deleted(int(email_id))
+                self.labels.discard(int(email_id))
+
+    def search(self, vector, top_k: int = 10):
+        if not self.labels:
+            return []
+        labels, distances = self.index.knn_query(np.asarray(vector, dtype=np.float32), k=min(top_k, len(self.labels)))
+        # hnswlib "ip" distance is 1 - inner product
+        return [(int(label), float(1.0 - distance)) for label, distance in zip(labels[0], distances[0])]
+
+    def ids(self):
+        return np.array(sorted(self.labels), dtype=np.int64)
+
+    def save(self, path: str):
+        """Write the graph under a new versioned name, then the .npz naming it, so readers get a matching pair."""
+        graph = ""
+        if self.index is not None:
+            graph = f"{os.path.basename(path)}.{os.getpid()}.{time.time_ns()}.hnsw"
+            self.index.save_index(os.path.join(os.path.dirname(path), graph))
+        save_arrays(path, backend=self.backend, ids=np.array(sorted(self.labels), dtype=np.int64),
+                 params=np.array([self.dim or 0, self.ef_search, self.ef_construction, self.m, self.capacity]),
+                 graph=np.array(graph))
+        remove_stale_graphs(path, graph)
+
+    @classmethod
+    def load(cls, path: str):
+        data = np.load(path)
+        dim, ef_search, ef_construction, m, capacity = (int(v) for v in data["params"])
+        index = cls(dim=dim or None, ef_search=ef_search, ef_construction=ef_construction, m=m, capacity=capacity)
+        if dim:
+            import hnswlib
+            index.index = hnswlib.Index(space="ip", dim=dim)
+            # Snapshots written before graphs were versioned sit next to the .npz as <path>.hnsw
+            graph = str(data["graph"]) if "graph" in data.files else os.path.basename(path) + ".hnsw"
+            index.index.load_index(os.path.join(os.path.dirname(path), graph), max_elements=capacity,
+                                   allow_replace_deleted=True)
+            index.index.set_ef(ef_search)
+            index.labels = set(data["ids"].tolist())
+        return index
+
+    def __len__(self):
+        return len(self.labels)
+
+
+INDEX_BACKENDS = {
+    ExactIndex.backend: ExactIndex,
+    IVFIndex.backend: IVFIndex,
+    HNSWIndex.backend: HNSWIndex,
+}
+
+
+def create_index(backend: str = "exact", **kwargs) -> VectorIndex:
+    """Build an empty index for the configured backend ("exact", "ivf" or "hnsw")."""
+    try:
+        return INDEX_BACKENDS[backend](**kwargs)
+    except KeyError as e:
+        raise ValueError(f"Unknown vector index backend: {backend}") from e
+
+
+def load_index(path: str) -> VectorIndex:
+    """Load an index written by VectorIndex.save, whichever backend produced it."""
+    backend = str(np.load(path)["backend"])
+    return INDEX_BACKENDS[backend].load(path)
@@ -1,6 +1,12 @@
+import asyncio
+import logging
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.api.endpoints import email_processor
+from app.core.config import settings
+from app.utils.model_loader import models_loaded
+
+logger = logging.getLogger(__name__)
 
 app = FastAPI(title="Email Processor API", version="1.0")
 
@@ -16,6 +22,59 @@ app.add_middleware(
 # Include router
 app.include_router(email_processor.router)
 
+@app.on_event("startup")
+def run_migrations():
+    from app.db.migrations import migrate
+    migrate()
+
+@app.on_event("startup")
+async def start_job_workers():
+    from app.services.job_service import start_workers
+    start_workers()
+
+def warm_up():
+    from app.db.track_emails import embedding_store, minhash_store
+    from app.utils.model_loader import warm_up as warm_up_models
+    try:
+        warm_up_models()
+        if embedding_store.index is None:
+            embedding_store.load()
+        if settings.DEDUP_MINHASH_ENABLED and minhash_store.index is None:
+            minhash_store.load()
+    except Exception:
+        logger.exception("Model warm-up failed; models will load on first use")
+
+@app.on_event("startup")
+async def start_warm_up():
+    # In the background: the worker accepts requests while models load
+    if settings.MODEL_WARMUP:
+        asyncio.get_running_loop().run_in_executor(None, warm_up)
+
+@app.on_event("shutdown")
+async def stop_job_workers():
+    from app.services.job_service import stop_workers
+    await stop_workers()
+
+@app.on_event("shutdown")
+async def stop_classify_batcher():
+    if settings.CLASSIFY_BATCHING_ENABLED:
+        from app.services.classify_batcher import classify_batcher
+        await classify_batcher.stop()
+
+@app.on_event("shutdown")
+def save_vector_index():
+    from app.db.track_emails import embedding_store
+    embedding_store.save()
+
+@app.on_event("shutdown")
+def stop_attachment_pool():
+    from app.utils.extract_text_from_attachment import shutdown_pool
+    shutdown_pool()
+
 @app.get("/")
 def home():
     return {"message": "Welcome to the Email Processor API"}
+
+@app.get("/health")
+def health():
+    return {"status": "ok", "models": models_loaded()}
@@ -0,0 +1,161 @@
+"""Bulk ingestion of mbox archives and zip files of .eml messages.
+
+Messages are streamed from the archive, parsed and their attachments extracted in parallel, then
+deduplicated and stored a batch at a time in one transaction. Every stored batch is checkpointed,
+so re-running an interrupted ingestion of the same archive skips what was already stored.
+
+    python -m app.services.bulk_ingest_service archive.mbox --batch-size 32 --workers 4
+"""
+import argparse
+import hashlib
+import logging
+import mailbox
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Callable, Dict, Iterator, Optional, Tuple
+from app.core.config import settings
+from app.db.ingest_checkpoint_repo import IngestCheckpointRepo
+from app.db.migrations import migrate
+from app.utils.email_parser import extract_email_content
+from app.utils.store_email_to_db import store_emails
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_FORMATS = ("mbox", "zip")
+
+
+def detect_format(path: str) -> str:
+    return "zip" if zipfile.is_zipfile(path) else "mbox"
+
+
+def archive_key(path: str) -> str:
+    """Content hash of the archive, so a checkpoint survives renames and re-uploads of the same file."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(partial(f.read, 1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def iter_messages(path: str, archive_format: str) -> Iterator[Tuple[str, bytes]]:
+    """Yield (message key, raw message bytes) one message at a time."""
+    if archive_format == "zip":
+        with zipfile.ZipFile(path) as archive:
+            for info in archive.infolist():
+                if not info.is_dir() and info.filename.lower().endswith(".eml"):
+                    yield info.filename, archive.read(info)
+    else:
+        mbox = mailbox.mbox(path, create=False)
+        try:
+            for position, key in enumerate(mbox.iterkeys()):
+                yield str(position), mbox.get_bytes(key)
+        finally:
+            mbox.close()
+
+
+def parse_message(message_key: str, eml_content: bytes):
+    try:
+        return extract_email_content(eml_content)
+    except Exception as e:
+        logger.error("Could not parse message %s: %s", message_key, str(e))
+        return None
+
+
+def ingest_archive(path: str, archive_format: Optional[str] = None, batch_size: Optional[int] = None,
+                   workers: Optional[int] = None, progress: Optional[Callable[[Dict], None]] = None) -> Dict:
+    """Ingest every message of an archive and return counts and throughput.
+
+    progress, if given, receives the running report after each stored batch.
+    """
+    archive_format = archive_format or detect_format(path)
+    if archive_format not in ARCHIVE_FORMATS:
+        raise ValueError(f"archive_format must be one of {', '.join(ARCHIVE_FORMATS)}")
+    batch_size = max(1, batch_size or settings.BULK_BATCH_SIZE)
+    workers = max(1, workers or settings.BULK_WORKERS)
+
+    source_key = archive_key(path)
+    checkpointRepo = IngestCheckpointRepo()
+    done_keys = checkpointRepo.get_done_keys(source_key)
+    checkpointRepo.close()
+
+    report = {"source_key": source_key, "parsed": 0, "stored": 0, "duplicates": 0,
+              "skipped": 0, "failed": 0, "elapsed_seconds": 0.0, "emails_per_second": 0.0}
+    started = time.perf_counter()
+    messages = iter_messages(path, archive_format)
+
+    def next_batch():
+        batch = []
+        for message_key, eml_content in messages:
+            if message_key in done_keys:
+                report["skipped"] += 1
+                continue
+            batch.append((message_key, eml_content))
+            if len(batch) == batch_size:
+                break
+        return batch
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bulk-parse") as pool:
+        batch = next_batch()
+        pending = pool.map(lambda message: parse_message(*message), batch)
+        while batch:
+            parsed = list(pending)
+            # Parse the next batch while this one is deduplicated and stored
+            following = next_batch()
+            pending = pool.map(lambda message: parse_message(*message), following)
+            keys = [message_key for (message_key, _), email in zip(batch, parsed) if email is not None]
+            emails = [email for email in parsed if email is not None]
+            batch = following
+            report["failed"] += len(parsed) - len(emails)
+            report["parsed"] += len(emails)
+            if emails:
+                try:
+                    results = store_emails(emails, partial(store_checkpoint, source_key, keys))
+                    report["stored"] += sum(1 for result in results if result.get("email_id") is not None)
+                    report["duplicates"] += sum(1 for result in results if result.get("is_duplicate"))
+                except Exception as e:
+                    logger.error("Could not store a batch of %s emails: %s", len(emails), str(e), exc_info=True)
+                    report["failed"] += len(emails)
+            update_rate(report, started)
+            if progress is not None:
+                progress(dict(report))
+    return update_rate(report, started)
+
+
+def update_rate(report: Dict, started: float) -> Dict:
+    report["elapsed_seconds"] = round(time.perf_counter() - started, 3)
+    report["emails_per_second"] = round(report["parsed"] / report["elapsed_seconds"], 2) if report["elapsed_seconds"] else 0.0
+    return report
+
+
+def store_checkpoint(source_key, message_keys, db_config, results):
+    IngestCheckpointRepo.record(db_config, source_key, message_keys, results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingest an mbox archive or a zip of .eml files.")
+    parser.add_argument("path")
+    parser.add_argument("--format", choices=ARCHIVE_FORMATS, help="detected from the file when omitted")
+    parser.add_argument("--batch-size", type=int, default=settings.BULK_BATCH_SIZE)
+    parser.add_argument("--workers", type=int, default=settings.BULK_WORKERS)
+    parser.add_argument("--restart", action="store_true", help="ignore the checkpoint of an earlier run")
+    args = parser.parse_args()
+
+    # As at API start-up: the ingest needs the current schema
+    migrate()
+    if args.restart:
+        checkpointRepo = IngestCheckpointRepo()
+        checkpointRepo.clear(archive_key(args.path))
+        checkpointRepo.close()
+
+    def print_progress(report):
+        print(f"parsed {report['parsed']}  stored {report['stored']}  duplicates {report['duplicates']}  "
+              f"skipped {report['skipped']}  failed {report['failed']}  {report['emails_per_second']:.2f} emails/s")
+
+    report = ingest_archive(args.path, args.format, args.batch_size, args.workers, print_progress)
+    print(f"Done in {report['elapsed_seconds']:.1f}s: {report['emails_per_second']:.2f} emails/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""Request coalescer in front of email_classifier.
+
+Classification requests arriving within CLASSIFY_BATCH_MAX_WAIT_MS of each other (up to
+CLASSIFY_BATCH_MAX_SIZE) are collected into one batch. Fused requests share a single multi-email LLM
+call; chain requests have no multi-email prompt and are fanned out, with at most
+CLASSIFY_MAX_CONCURRENCY classifications in flight. Each caller gets back its own result.
+"""
+import asyncio
+import logging
+from typing import Dict, List, Optional, Tuple
+from app.core.config import settings
+from app.utils.email_classifier import CLASSIFICATION_FAILED, CLASSIFY_MODES, classify_email, classify_emails_fused, run_stage, validate_input
+
+logger = logging.getLogger(__name__)
+
+
+class ClassifyBatcher:
+
+    def __init__(self, max_batch: int, max_wait_seconds: float, max_concurrency: int):
+        self.max_batch = max(1, max_batch)
+        self.max_wait_seconds = max(0.0, max_wait_seconds)
+        self.max_concurrency = max(1, max_concurrency)
+        self.queue: Optional[asyncio.Queue] = None
+        self.semaphore: Optional[asyncio.Semaphore] = None
+        self.collector: Optional[asyncio.Task] = None
+        # Strong references to dispatched batches; the loop only keeps weak ones
+        self.tasks = set()
+        self.stats = {"requests": 0, "batches": 0, "fused_calls": 0, "fused_fallbacks": 0}
+
+    def start(self):
+        """Create the queue and collector on the running loop; called by the first submit."""
+        if self.collector is None or self.collector.done():
+            self.queue = asyncio.Queue()
+            self.semaphore = asyncio.Semaphore(self.max_concurrency)
+            self.collector = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self.collector is not None:
+            self.collector.cancel()
+            try:
+                await self.collector
+            except asyncio.CancelledError:
+                pass
+            self.collector = None
+
+    async def submit(self, selected_items: Dict) -> str:
+        """Queue one classification request and wait for its result."""
+        mode = selected_items.get("mode") or "chain"
+        if mode not in CLASSIFY_MODES:
+            raise ValueError(f"Unknown classification mode: {mode}")
+        if mode == "fused":
+            validate_input(selected_items.get("text"))  # Reject bad input here, not inside a shared batch
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((dict(selected_items, mode=mode), future))
+        return await future
+
+    async def collect(self) -> List[Tuple[Dict, asyncio.Future]]:
+        batch = [await self.queue.get()]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.max_wait_seconds
+        while len(batch) < self.max_batch:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def run(self):
+        while True:
+            batch = await self.collect()
+            self.stats["requests"] += len(batch)
+            self.stats["batches"] += 1
+            # Dispatch without waiting, so the next batch collects while this one is with the LLM
+            fused = [request for request in batch if request[0]["mode"] == "fused"]
+            if fused:
+                self.dispatch(self.run_fused(fused))
+            for request in batch:
+                if request[0]["mode"] != "fused":
+                    self.dispatch(self.run_single(request))
+
+    def dispatch(self, coroutine):
+        task = asyncio.create_task(coroutine)
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def run_single(self, request):
+        selected_items, future = request
+        async with self.semaphore:
+            try:
+                result = await classify_email(selected_items)
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+                return
+        if not future.done():
+            future.set_result(result)
+
+    async def run_fused(self, requests):
+        if len(requests) == 1:
+            await self.run_single(requests[0])
+            return
+        async with self.semaphore:
+            self.stats["fused_calls"] += 1
+            try:
+                categories = await run_stage("fused_batch", classify_emails_fused(
+                    [selected_items for selected_items, _ in requests]), [CLASSIFICATION_FAILED] * len(requests))
+            except Exception as e:
+                # Failed as a whole: one call per email would only multiply the load on a struggling API
+                logger.exception("Fused batch of %d emails failed", len(requests))
+                for _, future in requests:
+                    if not future.done():
+                        future.set_exception(e)
+                return
+        missing = []
+        for request, category in zip(requests, categories):
+            if category is None:
+                missing.append(request)
+            elif not request[1].done():
+                request[1].set_result(category)
+        if missing:
+            # Emails an otherwise good response left out are classified on their own; those of a call that
+            # failed outright already got CLASSIFICATION_FAILED, without further calls
+            self.stats["fused_fallbacks"] += len(missing)
+            await asyncio.gather(*(self.run_single(request) for request in missing))
+
+
+classify_batcher = ClassifyBatcher(settings.CLASSIFY_BATCH_MAX_SIZE, settings.CLASSIFY_BATCH_MAX_WAIT_MS / 1000,
+                                   settings.CLASSIFY_MAX_CONCURRENCY)
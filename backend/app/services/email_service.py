@@ -1,15 +1,23 @@
-import email
-import os
-from io import BytesIO
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from app.core.config import settings
 from app.utils.email_parser import parse_email
 from app.utils.email_classifier import classify_email
 
+# Parsing, OCR, embedding and the dedup lookup are blocking; keep them off the event loop
+PARSE_EXECUTOR = ThreadPoolExecutor(max_workers=settings.PARSE_WORKERS, thread_name_prefix="email-parse")
+
 async def process_email(file):
-    contents = await file.read()
-    parsed_data = parse_email(contents)
+    # Stream from the upload's spooled file (on disk beyond 1 MB) instead of reading it into memory
+    await file.seek(0)
+    loop = asyncio.get_running_loop()
+    parsed_data = await loop.run_in_executor(PARSE_EXECUTOR, parse_email, file.file)
     return parsed_data
 
 
 async def classify(selected_items: dict):
-    results = classify_email(selected_items)
+    if settings.CLASSIFY_BATCHING_ENABLED:
+        from app.services.classify_batcher import classify_batcher
+        return await classify_batcher.submit(selected_items)
+    results = await classify_email(selected_items)
     return results
\ No newline at end of file
@@ -0,0 +1,169 @@
+"""Shared embedding server: one sentence-transformer for all uvicorn workers.
+
+Concurrent encode requests from every worker are merged by a micro-batcher into a single forward pass
+of up to EMBEDDING_BATCH_MAX_TEXTS texts, waiting at most EMBEDDING_BATCH_MAX_WAIT_MS for a batch to
+fill. Started by uvicorn_config.py when EMBEDDING_SERVER_URL is set, or by hand:
+
+    python -m app.services.embedding_server --url unix:///tmp/email-embeddings.sock
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Callable, List
+from app.core.config import settings
+from app.utils.embedding_client import FRAME_HEADER, MAX_FRAME_BYTES, parse_address
+from app.utils.model_loader import encode_texts
+
+logger = logging.getLogger(__name__)
+
+
+class MicroBatcher:
+    """Coalesce concurrent encode requests into batched calls of encode (run in one worker thread)."""
+
+    def __init__(self, encode: Callable, max_texts: int, max_wait_seconds: float):
+        self.encode = encode
+        self.max_texts = max(1, max_texts)
+        self.max_wait_seconds = max(0.0, max_wait_seconds)
+        self.queue = asyncio.Queue()
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.stats = {"requests": 0, "texts": 0, "batches": 0}
+
+    async def submit(self, texts: List[str]):
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((texts, future))
+        return await future
+
+    async def collect(self):
+        """Wait for the first request, then take more until the batch is full or max_wait has passed."""
+        batch = [await self.queue.get()]
+        size = len(batch[0][0])
+        deadline = time.monotonic() + self.max_wait_seconds
+        while size < self.max_texts:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                request = await asyncio.wait_for(self.queue.get(), remaining)
+            except asyncio.TimeoutError:
+                break
+            batch.append(request)
+            size += len(request[0])
+        return batch
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self.collect()
+            # Requests arriving while this batch encodes queue up for the next one
+            texts = [text for request_texts, _ in batch for text in request_texts]
+            try:
+                vectors = await loop.run_in_executor(self.executor, self.encode, texts)
+            except Exception as e:
+                logger.exception("Embedding batch of %d texts failed", len(texts))
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            self.stats["requests"] += len(batch)
+            self.stats["texts"] += len(texts)
+            self.stats["batches"] += 1
+            start = 0
+            for request_texts, future in batch:
+                if not future.done():
+                    future.set_result(vectors[start:start + len(request_texts)])
+                start += len(request_texts)
+
+
+async def read_frame(reader) -> bytes:
+    (size,) = FRAME_HEADER.unpack(await reader.readexactly(FRAME_HEADER.size))
+    if size > MAX_FRAME_BYTES:
+        raise ValueError(f"Frame of {size} bytes exceeds the limit")
+    return await reader.readexactly(size)
+
+
+def write_frame(writer, payload: bytes):
+    writer.write(FRAME_HEADER.pack(len(payload)) + payload)
+
+
+async def handle_client(batcher: MicroBatcher, reader, writer):
+    try:
+        while True:
+            try:
+                request = json.loads(await read_frame(reader))
+            except asyncio.IncompleteReadError:
+                break  # Client disconnected
+            if request.get("op") == "stats":
+                write_frame(writer, json.dumps(batcher.stats).encode("utf-8"))
+            else:
+                try:
+                    vectors = await batcher.submit([text or "" for text in request["texts"]])
+                except Exception as e:
+                    write_frame(writer, json.dumps({"error": str(e)}).encode("utf-8"))
+                else:
+                    rows, dim = vectors.shape
+                    write_frame(writer, json.dumps({"rows": rows, "dim": dim}).encode("utf-8"))
+                    write_frame(writer, vectors.tobytes())
+            await writer.drain()
+    except (ConnectionError, ValueError, KeyError, TypeError) as e:
+        logger.warning("Dropping embedding client: %s", e)
+    finally:
+        writer.close()
+
+
+def address_in_use(family, address) -> bool:
+    with socket.socket(family, socket.SOCK_STREAM) as probe:
+        probe.settimeout(1)
+        return probe.connect_ex(address) == 0
+
+
+async def serve(url: str, max_texts: int, max_wait_ms: float):
+    family, address = parse_address(url)
+    if address_in_use(family, address):
+        logger.info("An embedding server is already listening on %s", url)
+        return
+    # Load before listening, so clients never wait on the model behind a connected socket
+    encode_texts([""])
+    batcher = MicroBatcher(encode_texts, max_texts, max_wait_ms / 1000)
+    handler = partial(handle_client, batcher)
+    if family == socket.AF_UNIX:
+        if os.path.exists(address):
+            os.unlink(address)  # Stale socket of a server that did not shut down cleanly
+        server = await asyncio.start_unix_server(handler, path=address)
+    else:
+        server = await asyncio.start_server(handler, host=address[0], port=address[1])
+    logger.info("Embedding server listening on %s (batches of up to %d texts, %.1f ms wait)",
+                url, max_texts, max_wait_ms)
+    batch_task = asyncio.create_task(batcher.run())
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        batch_task.cancel()
+        if family == socket.AF_UNIX and os.path.exists(address):
+            os.unlink(address)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve sentence embeddings to all API workers.")
+    parser.add_argument("--url", default=settings.EMBEDDING_SERVER_URL,
+                        help="unix:///path/to.sock or tcp://host:port (default EMBEDDING_SERVER_URL)")
+    parser.add_argument("--max-batch", type=int, default=settings.EMBEDDING_BATCH_MAX_TEXTS)
+    parser.add_argument("--max-wait-ms", type=float, default=settings.EMBEDDING_BATCH_MAX_WAIT_MS)
+    args = parser.parse_args()
+    if not args.url:
+        parser.error("--url is required when EMBEDDING_SERVER_URL is not set")
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    try:
+        asyncio.run(serve(args.url, args.max_batch, args.max_wait_ms))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
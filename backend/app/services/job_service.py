@@ -0,0 +1,245 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+from functools import partial
+from app.core.config import settings
+from app.db.job_repo import JobRepo
+from app.services.bulk_ingest_service import ingest_archive
+from app.services.email_service import PARSE_EXECUTOR
+from app.utils.email_parser import parse_email
+from app.utils.email_classifier import CLASSIFICATION_FAILED, classify_email
+
+logger = logging.getLogger(__name__)
+
+JOB_TYPES = ("process", "classify", "bulk")
+
+# Fraction of the work done when a job reaches each stage, reported by GET /email/jobs/{id}
+STAGE_PROGRESS = {
+    "QUEUED": 0.0,
+    "PARSING": 0.1,
+    "EXTRACTING_ATTACHMENTS": 0.3,
+    "CHECKING_DUPLICATES": 0.7,
+    "PARSED": 1.0,
+    "CLASSIFYING": 0.2,
+    "CLASSIFIED": 1.0,
+    "INGESTING": 0.1,
+    "INGESTED": 1.0,
+    "COMPLETED": 1.0,
+    "FAILED": 1.0
+}
+
+_workers = []
+_job_submitted = None
+_last_recovery = 0.0
+
+
+class QueueFullError(Exception):
+    pass
+
+
+class IngestStopped(Exception):
+    """Raised from the bulk progress callback to stop an ingest after its current batch."""
+
+
+def with_job_repo(method, *args):
+    jobRepo = JobRepo()
+    try:
+        return getattr(jobRepo, method)(*args)
+    finally:
+        jobRepo.close()
+
+
+def set_email_status(email_id, processing_status):
+    from app.db.email_repo import EmailRepo
+    emailRepo = EmailRepo()
+    emailRepo.update_processing_status(email_id, processing_status)
+    emailRepo.close()
+
+
+def advance(job_id, stage, email_id=None):
+    """Move a job to the next stage and mirror it into EMAIL.PROCESSING_STATUS once the email exists."""
+    with_job_repo("update_stage", job_id, stage, email_id)
+    if email_id is not None:
+        set_email_status(email_id, stage)
+
+
+def enqueue_job(job_type: str, payload: bytes = None, params: dict = None) -> int:
+    if job_type not in JOB_TYPES:
+        raise ValueError(f"Unknown job type: {job_type}")
+    jobRepo = JobRepo()
+    try:
+        if jobRepo.count_queued() >= settings.JOB_MAX_QUEUED:
+            raise QueueFullError(f"{settings.JOB_MAX_QUEUED} jobs already queued")
+        return jobRepo.create_job(job_type, payload, params)
+    finally:
+        jobRepo.close()
+
+
+async def submit_job(job_type: str, payload: bytes = None, params: dict = None) -> int:
+    """Persist a job and wake an idle worker in this process; returns the job id."""
+    job_id = await asyncio.to_thread(enqueue_job, job_type, payload, params)
+    if _job_submitted is not None:
+        _job_submitted.set()
+    return job_id
+
+
+async def get_job_status(job_id: int):
+    job = await asyncio.to_thread(with_job_repo, "get_job", job_id)
+    if job is not None:
+        job["progress"] = STAGE_PROGRESS.get(job["stage"], 0.0)
+    return job
+
+
+def discard_upload(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def parse_upload(path, progress):
+    with open(path, "rb") as f:
+        return parse_email(f, progress)
+
+
+async def run_process_job(job_id, payload, params):
+    """Parse and store an uploaded email, read from its spooled file (or, for older jobs, the payload)."""
+    loop = asyncio.get_running_loop()
+    progress = partial(advance, job_id)
+    path = params.get("path")
+    if path is None:
+        result = await loop.run_in_executor(PARSE_EXECUTOR, partial(parse_email, payload, progress))
+    else:
+        try:
+            result = await loop.run_in_executor(PARSE_EXECUTOR, partial(parse_upload, path, progress))
+        except asyncio.CancelledError:
+            # Keep the upload for the requeued job
+            raise
+        except Exception:
+            discard_upload(path)
+            raise
+        discard_upload(path)
+    await asyncio.to_thread(advance, job_id, "PARSED", result.get("email_id"))
+    return result
+
+
+async def run_classify_job(job_id, payload, params):
+    email_id = params.get("email_id")
+    await asyncio.to_thread(advance, job_id, "CLASSIFYING", email_id)
+    result = await classify_email(params)
+    if result == CLASSIFICATION_FAILED:
+        # The classifier reports exhausted retries as this value rather than raising
+        raise RuntimeError(CLASSIFICATION_FAILED)
+    await asyncio.to_thread(advance, job_id, "CLASSIFIED", email_id)
+    return result
+
+
+async def run_bulk_job(job_id, payload, params):
+    """Ingest an uploaded archive; a requeued job resumes from the archive's checkpoint."""
+    await asyncio.to_thread(advance, job_id, "INGESTING")
+    stop = threading.Event()
+
+    def progress(report):
+        if stop.is_set():
+            raise IngestStopped()
+        # Touch UPDATED_AT after every stored batch so a long ingest is not requeued as stale
+        advance(job_id, "INGESTING")
+
+    ingest = asyncio.ensure_future(asyncio.to_thread(ingest_archive, params["path"], params.get("format"),
+                                                     progress=progress))
+    try:
+        result = await asyncio.shield(ingest)
+    except asyncio.CancelledError:
+        # The thread cannot be cancelled: stop it after the batch in progress (whose checkpoint commits with
+        # it) before the job is requeued, so no other worker ingests the archive alongside it. Keep the
+        # upload: the requeued job resumes from it
+        stop.set()
+        await asyncio.wait([ingest])
+        if not ingest.cancelled():
+            ingest.exception()  # Retrieved: IngestStopped (or a failure) is expected here
+        raise
+    except Exception:
+        discard_upload(params["path"])
+        raise
+    discard_upload(params["path"])
+    await asyncio.to_thread(advance, job_id, "INGESTED")
+    return result
+
+
+JOB_HANDLERS = {
+    "process": run_process_job,
+    "classify": run_classify_job,
+    "bulk": run_bulk_job
+}
+
+
+async def run_job(job_id, job_type, payload, params):
+    try:
+        result = await JOB_HANDLERS[job_type](job_id, payload, params)
+        await asyncio.to_thread(with_job_repo, "finish_job", job_id, "COMPLETED", result)
+        logger.info("Job %s (%s) completed", job_id, job_type)
+    except asyncio.CancelledError:
+        # Shutting down: hand the job back to the queue for the next worker
+        await asyncio.shield(asyncio.to_thread(with_job_repo, "requeue_job", job_id))
+        raise
+    except Exception as e:
+        logger.error("Job %s (%s) failed: %s", job_id, job_type, str(e), exc_info=True)
+        await asyncio.to_thread(with_job_repo, "finish_job", job_id, "FAILED", None, str(e))
+        email_id = params.get("email_id")
+        if email_id is not None:
+            await asyncio.to_thread(set_email_status, email_id, "FAILED")
+
+
+async def worker_loop(worker_number: int):
+    logger.info("Job worker %s started", worker_number)
+    while True:
+        try:
+            job = await asyncio.to_thread(with_job_repo, "claim_next_job")
+        except Exception:
+            logger.error("Job worker %s could not claim a job", worker_number, exc_info=True)
+            job = None
+        if job is None:
+            # Wake early when this process queues a job; poll for jobs queued by other workers
+            _job_submitted.clear()
+            if time.monotonic() - _last_recovery >= settings.JOB_RECOVERY_INTERVAL_SECONDS:
+                # Leases of workers that died since start-up (in this or another process)
+                await asyncio.to_thread(recover_stale_jobs)
+            try:
+                await asyncio.wait_for(_job_submitted.wait(), settings.JOB_POLL_INTERVAL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            continue
+        await run_job(*job)
+
+
+def recover_stale_jobs():
+    """Requeue (or fail, after JOB_MAX_ATTEMPTS) RUNNING jobs that stopped reporting for JOB_STALE_SECONDS."""
+    global _last_recovery
+    _last_recovery = time.monotonic()
+    try:
+        requeued = with_job_repo("requeue_stale_jobs", settings.JOB_STALE_SECONDS, settings.JOB_MAX_ATTEMPTS)
+    except Exception:
+        logger.error("Could not recover stale jobs", exc_info=True)
+        return
+    if requeued:
+        logger.warning("Requeued %s stale jobs", requeued)
+
+
+def start_workers():
+    """Start JOB_WORKERS queue consumers on the running event loop (called at app startup)."""
+    global _job_submitted
+    if _workers or settings.JOB_WORKERS <= 0:
+        return
+    _job_submitted = asyncio.Event()
+    recover_stale_jobs()
+    for worker_number in range(settings.JOB_WORKERS):
+        _workers.append(asyncio.create_task(worker_loop(worker_number)))
+
+
+async def stop_workers():
+    for worker in _workers:
+        worker.cancel()
+    await asyncio.gather(*_workers, return_exceptions=True)
+    _workers.clear()
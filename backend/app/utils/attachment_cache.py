@@ -0,0 +1,124 @@
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+from typing import Optional, Union
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Rows beyond the size limit are evicted once every PRUNE_INTERVAL writes
+PRUNE_INTERVAL = 100
+
+
+def content_digest(content: Union[bytes, str]) -> str:
+    """SHA-256 of attachment content given as bytes or as the path of a spooled payload."""
+    digest = hashlib.sha256()
+    if isinstance(content, str):
+        with open(content, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+    else:
+        digest.update(content)
+    return digest.hexdigest()
+
+
+class AttachmentTextCache:
+    """Extracted attachment text in a SQLite file shared by workers, keyed by content hash and extractor version.
+
+    The same term sheet attached to many emails is OCR'd or parsed once; least recently used rows are
+    evicted beyond max_entries rows or max_bytes of text.
+    """
+
+    def __init__(self, path: str, max_entries: int, max_bytes: int):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.writes = 0
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    @staticmethod
+    def make_key(digest: str, extractor: str, version: int) -> str:
+        return f"{extractor}:{version}:{digest}"
+
+    def connection(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            from app.db.sqlite_db_config import configure_connection
+            conn = configure_connection(sqlite3.connect(self.path, timeout=5))
+            conn.execute("CREATE TABLE IF NOT EXISTS ATTACHMENT_TEXT "
+            "("
+            "CACHE_KEY TEXT PRIMARY KEY, "
+            "TEXT TEXT NOT NULL, "
+            "TEXT_BYTES INTEGER NOT NULL, "
+            "CREATED_AT REAL NOT NULL, "
+            "LAST_ACCESS REAL NOT NULL"
+            ")")
+            conn.execute("CREATE INDEX IF NOT EXISTS IDX_ATTACHMENT_TEXT_LAST_ACCESS ON ATTACHMENT_TEXT (LAST_ACCESS)")
+            conn.commit()
+            self.local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[str]:
+        try:
+            conn = self.connection()
+            row = conn.execute("SELECT TEXT FROM ATTACHMENT_TEXT WHERE CACHE_KEY = ?", (key,)).fetchone()
+            if row:
+                conn.execute("UPDATE ATTACHMENT_TEXT SET LAST_ACCESS = ? WHERE CACHE_KEY = ?", (time.time(), key))
+                conn.commit()
+                with self.lock:
+                    self.stats["hits"] += 1
+                return row[0]
+        except sqlite3.DatabaseError as e:
+            logger.warning("Attachment cache read failed: %s", str(e))
+        with self.lock:
+            self.stats["misses"] += 1
+        return None
+
+    def set(self, key: str, text: str):
+        now = time.time()
+        try:
+            conn = self.connection()
+            conn.execute("INSERT OR REPLACE INTO ATTACHMENT_TEXT (CACHE_KEY, TEXT, TEXT_BYTES, CREATED_AT, LAST_ACCESS) "
+                "VALUES (?, ?, ?, ?, ?)", (key, text, len(text.encode("utf-8")), now, now))
+            conn.commit()
+            with self.lock:
+                self.writes += 1
+                prune = self.writes % PRUNE_INTERVAL == 0
+            if prune:
+                self.prune(conn)
+        except sqlite3.DatabaseError as e:
+            logger.warning("Attachment cache write failed: %s", str(e))
+
+    def prune(self, conn):
+        """Drop the least recently used rows beyond the row limit, then beyond the text size limit."""
+        evicted = conn.execute("DELETE FROM ATTACHMENT_TEXT WHERE CACHE_KEY IN "
+            "(SELECT CACHE_KEY FROM ATTACHMENT_TEXT ORDER BY LAST_ACCESS DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,)).rowcount
+        total = conn.execute("SELECT COALESCE(SUM(TEXT_BYTES), 0) FROM ATTACHMENT_TEXT").fetchone()[0]
+        if self.max_bytes > 0 and total > self.max_bytes:
+            keys = []
+            for key, size in conn.execute("SELECT CACHE_KEY, TEXT_BYTES FROM ATTACHMENT_TEXT ORDER BY LAST_ACCESS"):
+                if total <= self.max_bytes:
+                    break
+                keys.append((key,))
+                total -= size
+            conn.executemany("DELETE FROM ATTACHMENT_TEXT WHERE CACHE_KEY = ?", keys)
+            evicted += len(keys)
+        conn.commit()
+        with self.lock:
+            self.stats["evictions"] += evicted
+
+    def get_stats(self) -> dict:
+        with self.lock:
+            stats = dict(self.stats)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
+
+
+attachment_cache = AttachmentTextCache(settings.ATTACHMENT_CACHE_PATH, settings.ATTACHMENT_CACHE_MAX_ENTRIES,
+                                       int(settings.ATTACHMENT_CACHE_MAX_MB * 1024 * 1024))
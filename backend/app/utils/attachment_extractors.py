@@ -0,0 +1,470 @@
+"""Registry of attachment text extractors, chosen by magic bytes, then MIME type, then file extension.
+
+Every extractor takes the content (bytes, or the path of a spooled payload) and returns plain text. Heavy
+libraries (pdfplumber, Pillow, pytesseract) are imported inside the extractor that needs them, which runs
+in the extraction pool, so neither app start-up nor a request without such attachments pays for them.
+Office documents, HTML, CSV, nested emails and zip archives are read with the standard library only.
+PDF pages without a usable text layer are rendered and OCR'd, and every image goes to tesseract
+downscaled and binarized, within OCR_MAX_PAGES pages per document.
+
+To support another type, register an extractor:
+    register_extractor("rtf", extract_rtf_text, version=1, mime_types=("application/rtf",), extensions=(".rtf",))
+Bump an extractor's version whenever its output changes, so texts cached from the old version are not reused.
+"""
+import io
+import logging
+import os
+import re
+from dataclasses import dataclass
+from typing import Callable, Dict, Optional, Tuple, Union
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Bytes read from the start of the content to recognise its format (a BMP's file and DIB header sizes)
+MAGIC_BYTES = 18
+# Sizes of the BMP DIB header versions (BITMAPCOREHEADER to BITMAPV5HEADER)
+BMP_DIB_HEADER_SIZES = (12, 40, 52, 56, 64, 108, 124)
+# pdfplumber's rendering of glyphs that have no Unicode mapping
+CID_PATTERN = re.compile(r"\(cid:\d+\)")
+
+
+@dataclass(frozen=True)
+class Extractor:
+    name: str
+    function: Callable
+    version: int
+    mime_types: Tuple[str, ...] = ()
+    extensions: Tuple[str, ...] = ()
+    # Byte prefixes, or predicates on the head for formats whose prefix alone is too weak
+    magic: Tuple[Union[bytes, Callable[[bytes], bool]], ...] = ()
+
+
+EXTRACTORS: Dict[str, Extractor] = {}
+
+
+def register_extractor(name: str, function: Callable, version: int, mime_types=(), extensions=(), magic=()):
+    EXTRACTORS[name] = Extractor(name, function, version, tuple(mime_types), tuple(extensions), tuple(magic))
+
+
+def open_content(content):
+    """Attachment content is bytes, or the path of a file it was spooled to while parsing a large email."""
+    return content if isinstance(content, str) else io.BytesIO(content)
+
+
+def read_head(content) -> bytes:
+    if isinstance(content, str):
+        with open(content, "rb") as f:
+            return f.read(MAGIC_BYTES)
+    return bytes(content[:MAGIC_BYTES])
+
+
+def matches_magic(head: bytes, magic) -> bool:
+    return magic(head) if callable(magic) else head.startswith(magic)
+
+
+def is_bmp(head: bytes) -> bool:
+    """A BMP file header, not just text that happens to start with "BM".
+
+    The reserved fields must be zero, the DIB header size a known one and the pixel data must start after
+    both headers.
+    """
+    if len(head) < 18 or not head.startswith(b"BM") or head[6:10] != b"\0\0\0\0":
+        return False
+    dib_size = int.from_bytes(head[14:18], "little")
+    return dib_size in BMP_DIB_HEADER_SIZES and int.from_bytes(head[10:14], "little") >= 14 + dib_size
+
+
+def zip_flavour(content) -> str:
+    """Office Open XML documents are zip files too; tell them apart by their parts."""
+    import zipfile
+    try:
+        with zipfile.ZipFile(open_content(content)) as archive:
+            names = set(archive.namelist())
+    except (zipfile.BadZipFile, OSError):
+        return "zip"
+    if "word/document.xml" in names:
+        return "docx"
+    if "xl/workbook.xml" in names:
+        return "xlsx"
+    return "zip"
+
+
+def detect_extractor(filename: Optional[str], content_type: Optional[str], content) -> Optional[str]:
+    """Name of the extractor for an attachment, None when no extractor handles it."""
+    head = read_head(content)
+    for extractor in EXTRACTORS.values():
+        if any(matches_magic(head, magic) for magic in extractor.magic):
+            return zip_flavour(content) if extractor.name == "zip" else extractor.name
+    content_type = (content_type or "").lower()
+    # Generic types say nothing about the content
+    if content_type and content_type not in ("application/octet-stream", "text/plain"):
+        for extractor in EXTRACTORS.values():
+            if content_type in extractor.mime_types:
+                return extractor.name
+    extension = os.path.splitext(filename or "")[1].lower()
+    for extractor in EXTRACTORS.values():
+        if extension and extension in extractor.extensions:
+            return extractor.name
+    return None
+
+
+def extractor_version(name: Optional[str]) -> Optional[int]:
+    return EXTRACTORS[name].version if name in EXTRACTORS else None
+
+
+def run_extractor(name: str, content, depth: int = 0) -> str:
+    """Extract text with the named extractor; runs in the extraction pool."""
+    return (EXTRACTORS[name].function(content, depth=depth) or "").strip()
+
+
+def extract_nested(filename: Optional[str], content_type: Optional[str], content, depth: int) -> str:
+    """Text of a file found inside another (zip member, attachment of an attached email)."""
+    if depth > settings.ATTACHMENT_MAX_DEPTH:
+        logger.warning("Skipping %s: nested more than %s levels deep", filename, settings.ATTACHMENT_MAX_DEPTH)
+        return ""
+    name = detect_extractor(filename, content_type, content)
+    if name is None:
+        return ""
+    try:
+        return run_extractor(name, content, depth)
+    except Exception as e:
+        logger.error("Failed to extract text from nested %s: %s", filename, str(e))
+        return ""
+
+
+def usable_text_layer(text: Optional[str]) -> bool:
+    """Whether a page's text layer is real text, not missing, a few stray glyphs or unmapped "(cid:N)" codes."""
+    if not text:
+        return False
+    readable = sum(1 for char in CID_PATTERN.sub("", text) if char.isalnum())
+    return readable >= settings.PDF_TEXT_MIN_CHARS and readable >= 0.5 * len("".join(text.split()))
+
+
+def otsu_threshold(histogram) -> int:
+    """Grey level that best separates ink from background in a 256-bin histogram (Otsu's method)."""
+    total = sum(histogram)
+    weighted_total = sum(level * count for level, count in enumerate(histogram))
+    background, weighted_background = 0, 0
+    best_level, best_variance = 127, -1.0
+    for level, count in enumerate(histogram):
+        background += count
+        weighted_background += level * count
+        foreground = total - background
+        if background == 0 or foreground == 0:
+            continue
+        mean_background = weighted_background / background
+        mean_foreground = (weighted_total - weighted_background) / foreground
+        variance = background * foreground * (mean_background - mean_foreground) ** 2
+        if variance > best_variance:
+            best_level, best_variance = level, variance
+    return best_level
+
+
+def prepare_for_ocr(image):
+    """Grayscale, downscaled to OCR_MAX_DIMENSION pixels on the long side and binarized.
+
+    Tesseract's time grows with pixel count while text at more than ~300 DPI reads no better, and a clean
+    black-on-white image spares it its own thresholding of shaded or coloured scans.
+    """
+    from PIL import Image
+    if image.mode in ("RGBA", "LA", "P"):
+        # Transparent areas would turn black
+        image = image.convert("RGBA")
+        background = Image.new("RGBA", image.size, "white")
+        image = Image.alpha_composite(background, image)
+    image = image.convert("L")
+    longest = max(image.size)
+    if 0 < settings.OCR_MAX_DIMENSION < longest:
+        scale = settings.OCR_MAX_DIMENSION / longest
+        image = image.resize((max(1, round(image.width * scale)), max(1, round(image.height * scale))), Image.LANCZOS)
+    threshold = otsu_threshold(image.histogram())
+    return image.point([255 if level > threshold else 0 for level in range(256)])
+
+
+def ocr_image(image, page_segmentation: int) -> str:
+    import pytesseract
+    return pytesseract.image_to_string(prepare_for_ocr(image), config=f"--psm {page_segmentation}").strip()
+
+
+def ocr_pdf_page(page) -> str:
+    """OCR a PDF page rendered at OCR_PDF_DPI; empty when OCR is not available."""
+    try:
+        image = page.to_image(resolution=settings.OCR_PDF_DPI).original
+        # "3": automatic layout analysis, as full pages often have columns, headers and tables
+        return ocr_image(image, 3)
+    except Exception as e:
+        logger.warning("OCR of PDF page %s failed: %s", page.page_number, str(e))
+        return ""
+
+
+def read_pdf_pages(pdf, start, stop, ocr_limit):
+    """Text of pages [start, stop): the text layer where usable, else OCR of the rendered page.
+
+    At most ocr_limit pages are OCR'd (None = no limit); pages beyond it keep whatever text layer they have.
+    Returns (text, pages OCR'd).
+    """
+    texts, ocr_pages = [], 0
+    for page in pdf.pages[start:stop]:
+        page_text = page.extract_text()
+        if not usable_text_layer(page_text) and (ocr_limit is None or ocr_pages < ocr_limit):
+            ocr_pages += 1
+            page_text = ocr_pdf_page(page) or page_text
+        if page_text:
+            texts.append(page_text)
+    return "\n".join(texts), ocr_pages
+
+
+def ocr_page_limit() -> Optional[int]:
+    return settings.OCR_MAX_PAGES if settings.OCR_MAX_PAGES > 0 else None
+
+
+def extract_pdf_text(content, start=0, stop=None, ocr_limit=None):
+    """Return (text, pages OCR'd) for pages [start, stop) of a PDF, see read_pdf_pages."""
+    import pdfplumber  # Imported in the pool workers only, keeping app start-up light
+    with pdfplumber.open(open_content(content)) as pdf:
+        return read_pdf_pages(pdf, start, stop, ocr_limit)
+
+
+def extract_pdf_head(content, stop, ocr_limit=None):
+    """Return (page count, text of the first `stop` pages, pages OCR'd) so short PDFs need a single task."""
+    import pdfplumber
+    with pdfplumber.open(open_content(content)) as pdf:
+        return (len(pdf.pages),) + read_pdf_pages(pdf, 0, stop, ocr_limit)
+
+
+def extract_pdf_document(content, depth=0):
+    """Whole-document PDF text, OCRing up to OCR_MAX_PAGES pages without a usable text layer."""
+    return extract_pdf_text(content, ocr_limit=ocr_page_limit())[0]
+
+
+def extract_image_text(content, depth=0):
+    """OCR every frame of an image (multi-page TIFFs and GIFs have several), up to OCR_MAX_PAGES frames."""
+    from itertools import islice
+    from PIL import Image, ImageSequence
+    texts = []
+    with Image.open(open_content(content)) as image:
+        for frame in islice(ImageSequence.Iterator(image), ocr_page_limit()):
+            frame_text = ocr_image(frame, 6)  # "6" improves block text recognition
+            if frame_text:
+                texts.append(frame_text)
+    return "\n".join(texts)
+
+
+def read_bytes(content) -> bytes:
+    if isinstance(content, str):
+        with open(content, "rb") as f:
+            return f.read()
+    return bytes(content)
+
+
+def decode_text(data: bytes) -> str:
+    for encoding in ("utf-8-sig", "cp1252"):
+        try:
+            return data.decode(encoding)
+        except UnicodeDecodeError:
+            continue
+    return data.decode("latin-1")
+
+
+def extract_csv_text(content, depth=0):
+    """Rows as tab-separated lines, whatever the file's delimiter."""
+    import csv
+    text = decode_text(read_bytes(content))
+    try:
+        dialect = csv.Sniffer().sniff(text[:4096], delimiters=",;\t|")
+    except csv.Error:
+        dialect = csv.excel
+    return "\n".join("\t".join(cell.strip() for cell in row) for row in csv.reader(io.StringIO(text), dialect) if any(row))
+
+
+def extract_html_text(content, depth=0):
+    from html.parser import HTMLParser
+
+    class TextParser(HTMLParser):
+        BLOCKS = {"p", "div", "br", "tr", "li", "h1", "h2", "h3", "h4", "h5", "h6", "table", "section", "article"}
+
+        def __init__(self):
+            super().__init__()
+            self.parts = []
+            self.skip = 0
+
+        def handle_starttag(self, tag, attrs):
+            if tag in ("script", "style"):
+                self.skip += 1
+            elif tag in self.BLOCKS:
+                self.parts.append("\n")
+            elif tag in ("td", "th"):
+                self.parts.append("\t")
+
+        def handle_endtag(self, tag):
+            if tag in ("script", "style"):
+                self.skip = max(0, self.skip - 1)
+            elif tag in self.BLOCKS:
+                self.parts.append("\n")
+
+        def handle_data(self, data):
+            if not self.skip:
+                self.parts.append(data)
+
+    parser = TextParser()
+    parser.feed(decode_text(read_bytes(content)))
+    parser.close()
+    lines = (" ".join(line.split()) for line in "".join(parser.parts).splitlines())
+    return "\n".join(line for line in lines if line)
+
+
+WORD_NS = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+SHEET_NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+REL_NS = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+
+
+def extract_docx_text(content, depth=0):
+    """Paragraph text of word/document.xml, streamed with iterparse; table rows become tab-separated lines."""
+    import zipfile
+    from xml.etree.ElementTree import iterparse
+    paragraphs, runs = [], []
+    # Paragraphs of the open table cells, and cell texts of the open table rows (tables can nest)
+    cells, rows = [], []
+    with zipfile.ZipFile(open_content(content)) as archive, archive.open("word/document.xml") as document:
+        for event, element in iterparse(document, events=("start", "end")):
+            if event == "start":
+                if element.tag == WORD_NS + "tr":
+                    rows.append([])
+                elif element.tag == WORD_NS + "tc":
+                    cells.append([])
+                continue
+            if element.tag == WORD_NS + "t":
+                runs.append(element.text or "")
+            elif element.tag == WORD_NS + "tab":
+                runs.append("\t")
+            elif element.tag in (WORD_NS + "br", WORD_NS + "cr"):
+                runs.append("\n")
+            elif element.tag == WORD_NS + "p":
+                (cells[-1] if cells else paragraphs).append("".join(runs))
+                runs = []
+                element.clear()
+            elif element.tag == WORD_NS + "tc" and cells:
+                cell = " ".join(text for text in cells.pop() if text)
+                if rows:
+                    rows[-1].append(cell)
+            elif element.tag == WORD_NS + "tr" and rows:
+                row = "\t".join(rows.pop())
+                (cells[-1] if cells else paragraphs).append(row)
+                element.clear()
+    return "\n".join(paragraphs)
+
+
+def extract_xlsx_text(content, depth=0):
+    """Each sheet's rows as tab-separated lines, resolving shared strings; streamed with iterparse."""
+    import posixpath
+    import zipfile
+    from xml.etree.ElementTree import fromstring, iterparse
+    texts = []
+    with zipfile.ZipFile(open_content(content)) as archive:
+        names = set(archive.namelist())
+        shared = []
+        if "xl/sharedStrings.xml" in names:
+            with archive.open("xl/sharedStrings.xml") as strings:
+                for _, element in iterparse(strings):
+                    if element.tag == SHEET_NS + "si":
+                        shared.append("".join(text.text or "" for text in element.iter(SHEET_NS + "t")))
+                        element.clear()
+        workbook = fromstring(archive.read("xl/workbook.xml"))
+        relations = {}
+        if "xl/_rels/workbook.xml.rels" in names:
+            for relation in fromstring(archive.read("xl/_rels/workbook.xml.rels")):
+                relations[relation.get("Id")] = posixpath.normpath(posixpath.join("xl", relation.get("Target", "")))
+        for position, sheet in enumerate(workbook.iter(SHEET_NS + "sheet"), start=1):
+            path = relations.get(sheet.get(REL_NS + "id"), f"xl/worksheets/sheet{position}.xml")
+            if path not in names:
+                continue
+            rows = []
+            with archive.open(path) as worksheet:
+                for _, element in iterparse(worksheet):
+                    if element.tag != SHEET_NS + "row":
+                        continue
+                    cells = []
+                    for cell in element.iter(SHEET_NS + "c"):
+                        value = cell.find(SHEET_NS + "v")
+                        if cell.get("t") == "s" and value is not None:
+                            index = int(value.text)
+                            cells.append(shared[index] if index < len(shared) else "")
+                        elif cell.get("t") == "inlineStr":
+                            cells.append("".join(text.text or "" for text in cell.iter(SHEET_NS + "t")))
+                        else:
+                            cells.append(value.text if value is not None and value.text else "")
+                    if any(cells):
+                        rows.append("\t".join(cells))
+                    element.clear()
+            texts.append(f"Sheet: {sheet.get('name', position)}\n" + "\n".join(rows))
+    return "\n\n".join(texts)
+
+
+def extract_eml_text(content, depth=0):
+    """Headers and body of an attached email, followed by the text of its own attachments."""
+    import tempfile
+    from app.utils.mime_stream import MimeStreamParser
+    body, texts = None, []
+    with tempfile.TemporaryDirectory(prefix="eml-", dir=settings.EMAIL_SPOOL_DIR) as spool_dir, \
+            (open(content, "rb") if isinstance(content, str) else io.BytesIO(content)) as stream:
+        parser = MimeStreamParser(stream, 0, int(settings.EMAIL_SPOOL_MEMORY_MB * 1024 * 1024), spool_dir)
+        for part in parser.parts():
+            filename = part.get_filename()
+            if part.get_content_disposition() == "attachment" and filename:
+                text = extract_nested(filename, part.get_content_type(), part.payload.content(), depth + 1)
+                if text:
+                    texts.append(f"[{filename}]\n{text}")
+            elif body is None and (part.get_content_type() == "text/plain"
+                                   or parser.headers.get_content_maintype() != "multipart"):
+                body = part.text()
+            part.payload.discard()
+    headers = "\n".join(f"{name}: {parser.headers.get(name)}" for name in ("Subject", "From", "To", "Date")
+                        if parser.headers.get(name))
+    return "\n\n".join(section for section in [headers, (body or "").strip()] + texts if section)
+
+
+def extract_zip_text(content, depth=0):
+    """Text of every supported member, within ATTACHMENT_ZIP_MAX_MEMBERS and ATTACHMENT_ZIP_MAX_MB uncompressed."""
+    import zipfile
+    texts = []
+    budget = int(settings.ATTACHMENT_ZIP_MAX_MB * 1024 * 1024)
+    with zipfile.ZipFile(open_content(content)) as archive:
+        members = [info for info in archive.infolist() if not info.is_dir()]
+        if len(members) > settings.ATTACHMENT_ZIP_MAX_MEMBERS:
+            logger.warning("Zip archive has %s members; extracting the first %s", len(members), settings.ATTACHMENT_ZIP_MAX_MEMBERS)
+        for info in members[:settings.ATTACHMENT_ZIP_MAX_MEMBERS]:
+            # Declared sizes can lie; the read below is capped as well
+            if info.file_size > budget:
+                logger.warning("Skipping zip member %s: over the archive's size budget", info.filename)
+                continue
+            with archive.open(info) as member:
+                data = member.read(budget + 1)
+            if len(data) > budget:
+                logger.warning("Skipping zip member %s: over the archive's size budget", info.filename)
+                continue
+            budget -= len(data)
+            text = extract_nested(info.filename, None, data, depth + 1)
+            if text:
+                texts.append(f"[{info.filename}]\n{text}")
+    return "\n\n".join(texts)
+
+
+register_extractor("pdf", extract_pdf_document, version=2, mime_types=("application/pdf",), extensions=(".pdf",),
+                   magic=(b"%PDF-",))
+register_extractor("image", extract_image_text, version=2,
+                   mime_types=("image/png", "image/jpeg", "image/tiff", "image/gif", "image/bmp"),
+                   extensions=(".png", ".jpg", ".jpeg", ".tif", ".tiff", ".gif", ".bmp"),
+                   magic=(b"\x89PNG", b"\xff\xd8\xff", b"II*\x00", b"MM\x00*", b"GIF8", is_bmp))
+register_extractor("docx", extract_docx_text, version=1,
+                   mime_types=("application/vnd.openxmlformats-officedocument.wordprocessingml.document",),
+                   extensions=(".docx",))
+register_extractor("xlsx", extract_xlsx_text, version=1,
+                   mime_types=("application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",),
+                   extensions=(".xlsx",))
+register_extractor("zip", extract_zip_text, version=1,
+                   mime_types=("application/zip", "application/x-zip-compressed"), extensions=(".zip",),
+                   magic=(b"PK\x03\x04",))
+register_extractor("csv", extract_csv_text, version=1, mime_types=("text/csv",), extensions=(".csv",))
+register_extractor("html", extract_html_text, version=1, mime_types=("text/html",), extensions=(".html", ".htm"))
+register_extractor("eml", extract_eml_text, version=1, mime_types=("message/rfc822",), extensions=(".eml",))
@@ -1,11 +1,15 @@
 import logging
 import re
-import google.generativeai as genai
+from google.api_core.exceptions import GoogleAPIError
 from typing import List, Optional, Dict
 from dataclasses import dataclass
 import json
-import time
-from app.utils.get_api_key import api_key
+import asyncio
+from app.core.config import settings
+from app.utils.llm_cache import cached_generate_content_async
+from app.utils.llm_client import CircuitOpenError, backoff_delay
+from app.utils.model_loader import gemini_model
+from app.utils.prompt_budget import count_tokens, fit_prompt, pack_tokens, split_tokens
 
 
 # Configure Logging
@@ -15,23 +19,8 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Load API Key Securely
-
-
-try:
-    API_KEY = api_key()
-    logger.info("API Key loaded successfully")
-except Exception as e:
-    logger.critical("API key is missing. Set GEMINI_API_KEY as an environment variable.")
-    raise RuntimeError("API Key loading failed") from e
-
-# Configure Gemini API with Exception Handling
-try:
-    genai.configure(api_key=API_KEY)
-    MODEL = genai.GenerativeModel('gemini-2.0-flash-lite-001')
-except Exception as e:
-    logger.critical("Failed to configure Gemini API", exc_info=True)
-    raise RuntimeError("Gemini API configuration failed") from e
+# Gemini client, configured on the first call (see app.utils.model_loader)
+MODEL = gemini_model('gemini-2.0-flash-lite-001')
 
 @dataclass(frozen=True)
 class ExtractedEntity:
@@ -77,9 +66,9 @@ def parse_entities(response_text: str) -> List[ExtractedEntity]:
             logger.warning("Skipping unrecognized response format: %s", line)
     return entities
 
-def extract_named_entities(text: str, temperature: float = 0.2, retries: int = 3) -> List[ExtractedEntity]:
+async def extract_named_entities(text: str, temperature: float = 0.2, retries: int = 3) -> List[ExtractedEntity]:
     """Extract named entities using Gemini API with retries."""
-    text = validate_input(text)
+    text = fit_prompt("entities", validate_input(text))
     prompt = f"""
     Extract financial entities from the following text and label them.
     Return the entities in the format:
@@ -91,22 +80,23 @@ def extract_named_entities(text: str, temperature: float = 0.2, retries: int = 3
     """
     for attempt in range(retries):
         try:
-            response = MODEL.generate_content(prompt, generation_config={"temperature": temperature})
-            response_text = response.text.strip() if hasattr(response, 'text') and response.text else ""
+            response_text = await cached_generate_content_async(MODEL, prompt, generation_config={"temperature": temperature})
             if response_text:
                 logger.info("Gemini Response:\n%s", response_text)
                 return parse_entities(response_text)
             logger.warning("Received empty response from Gemini API")
-        except genai.GoogleGenerativeAIError as api_error:
+        except (GoogleAPIError, CircuitOpenError) as api_error:
+            # Transient API errors were already retried by the LLM client
             logger.error("Gemini API error: %s", str(api_error), exc_info=True)
+            break
         except Exception as e:
             logger.critical("Unexpected error in entity extraction: %s", str(e), exc_info=True)
 
-        time.sleep(2 ** attempt) 
+        await asyncio.sleep(backoff_delay(attempt))
 
     return []
 
-def extract_key_phrases(text: str, temperature: float = 0.2, retries: int = 3) -> List[str]:
+async def extract_key_phrases(text: str, temperature: float = 0.2, retries: int = 3) -> List[str]:
     """Extract key phrases using Gemini API with retries."""
     text = validate_input(text)
     
@@ -115,7 +105,7 @@ def extract_key_phrases(text: str, temperature: float = 0.2, retries: int = 3) -
     merged_key_phrases = merge_terms(words)
     
     # Step 2: Join the merged key phrases back into a single string
-    merged_text = ' '.join(merged_key_phrases)
+    merged_text = fit_prompt("key_phrases", ' '.join(merged_key_phrases))
 
     # Construct the prompt with the merged text
     prompt = f"""
@@ -129,29 +119,31 @@ def extract_key_phrases(text: str, temperature: float = 0.2, retries: int = 3) -
     # Retry logic for calling the Gemini API
     for attempt in range(retries):
         try:
-            response = MODEL.generate_content(prompt, generation_config={"temperature": temperature})
-            response_text = response.text.strip() if hasattr(response, 'text') and response.text else ""
+            response_text = await cached_generate_content_async(MODEL, prompt, generation_config={"temperature": temperature})
             if response_text:
                 logger.info("Gemini Key Phrases Response:\n%s", response_text)
                 
                 # Split the response into key phrases
                 key_phrases = response_text.split(',')
-                
-                # Filter out key phrases that contain numbers
-                filtered_key_phrases = [phrase.strip() for phrase in key_phrases if not re.search(r'\d', phrase)]
-                return filtered_key_phrases
+                return filter_key_phrases(key_phrases)
             
             logger.warning("Received empty response from Gemini API for key phrases")
         
-        except genai.GoogleGenerativeAIError as api_error:
+        except (GoogleAPIError, CircuitOpenError) as api_error:
+            # Transient API errors were already retried by the LLM client
             logger.error("Gemini API error: %s", str(api_error), exc_info=True)
+            break
         except Exception as e:
             logger.critical("Unexpected error in key phrase extraction: %s", str(e), exc_info=True)
 
-        time.sleep(2 ** attempt)
+        await asyncio.sleep(backoff_delay(attempt))
 
     return []
 
+def filter_key_phrases(key_phrases: List[str]) -> List[str]:
+    """Filter out key phrases that contain numbers."""
+    return [phrase.strip() for phrase in key_phrases if not re.search(r'\d', phrase)]
+
 # List of terms to merge
 MERGE_TERMS = [
     "NA", "N.A.", "INC", "LTD", "LLC", "PLC", "GMBH", "Ltd.", "Corp.", "S.A.", "S.p.A.", "B.V.",
@@ -182,11 +174,12 @@ def merge_terms(words: List[str]) -> List[str]:
     
     return merged_key_phrases
 
-def generate_summary(text: str, temperature: float = 0.2, retries: int = 3) -> str:
-    """Generate summary using Gemini API with retries."""
-    text = validate_input(text)
+SUMMARY_FAILED = "Summary generation failed."
+CLASSIFICATION_FAILED = "Final response generation failed."
+
+async def summarize(text: str, instruction: str, temperature: float, retries: int) -> str:
     prompt = f"""
-    Summarize the following financial document in 4-5 concise, professional sentences. 
+    {instruction}
     Focus on the key financial actions and requests made.
 
     Text:
@@ -194,34 +187,77 @@ def generate_summary(text: str, temperature: float = 0.2, retries: int = 3) -> s
     """
     for attempt in range(retries):
         try:
-            response = MODEL.generate_content(prompt, generation_config={"temperature": temperature})
-            response_text = response.text.strip() if hasattr(response, 'text') and response.text else ""
+            response_text = await cached_generate_content_async(MODEL, prompt, generation_config={"temperature": temperature})
             if response_text:
                 logger.info("Gemini Summary Response:\n%s", response_text)
                 return response_text
             logger.warning("Received empty response from Gemini API for summary")
-        except genai.GoogleGenerativeAIError as api_error:
+        except (GoogleAPIError, CircuitOpenError) as api_error:
+            # Transient API errors were already retried by the LLM client
             logger.error("Gemini API error: %s", str(api_error), exc_info=True)
+            break
         except Exception as e:
             logger.critical("Unexpected error in summary generation: %s", str(e), exc_info=True)
 
-        time.sleep(2 ** attempt)
+        await asyncio.sleep(backoff_delay(attempt))
 
-    return "Summary generation failed."
+    return SUMMARY_FAILED
 
-def extract_output(email_text: str, temperature: float = 0.2) -> str:
+async def generate_summary(text: str, temperature: float = 0.2, retries: int = 3) -> str:
+    """Generate summary using Gemini API with retries.
+
+    Text over LLM_STAGE_MAX_TOKENS is summarized map-reduce: each chunk on its own (concurrently), then
+    the partial summaries together.
+    """
+    text = validate_input(text)
+    chunks = split_tokens(text, settings.LLM_STAGE_MAX_TOKENS)
+    if len(chunks) <= 1:
+        return await summarize(fit_prompt("summary", text),
+            "Summarize the following financial document in 4-5 concise, professional sentences.", temperature, retries)
+    logger.info("LLM stage summary: %d input tokens, map-reduce over %d chunks", count_tokens(text), len(chunks))
+    partials = await asyncio.gather(*(summarize(fit_prompt("summary_map", chunk),
+        "Summarize the following part of a financial document in 2-3 concise sentences, keeping parties, "
+        "amounts, dates and requested actions.", temperature, retries) for chunk in chunks))
+    partials = [partial for partial in partials if partial != SUMMARY_FAILED]
+    if not partials:
+        return SUMMARY_FAILED
+    combined = "\n\n".join(partials)
+    if count_tokens(combined) > settings.LLM_STAGE_MAX_TOKENS and count_tokens(combined) < count_tokens(text):
+        # Still over budget: reduce again, as long as each round shrinks the input
+        return await generate_summary(combined, temperature, retries)
+    return await summarize(fit_prompt("summary_reduce", combined),
+        "Combine the following partial summaries of one financial document into 4-5 concise, professional sentences.",
+        temperature, retries)
+
+async def run_stage(stage: str, coroutine, fallback):
+    """Await one LLM stage for at most LLM_STAGE_TIMEOUT_SECONDS (0 = no limit), else return fallback."""
+    try:
+        return await asyncio.wait_for(coroutine, settings.LLM_STAGE_TIMEOUT_SECONDS or None)
+    except asyncio.TimeoutError:
+        logger.error("LLM stage %s timed out after %ss", stage, settings.LLM_STAGE_TIMEOUT_SECONDS)
+        return fallback
+
+def format_extraction(extracted_entities: List[ExtractedEntity], key_phrases: List[str], summary: str) -> str:
+    """Serialize entities, key phrases and summary into the JSON passed to the final categorisation."""
+    result = {
+        "named_entities": [{"Entity": entity.entity, "Type": entity.label} for entity in extracted_entities],
+        "key_phrases": key_phrases,
+        "summary": summary
+    }
+    return json.dumps(result, indent=2)
+
+async def extract_output(email_text: str, temperature: float = 0.2) -> str:
     """Extract financial entities, key phrases, and summary and return them as JSON."""
     try:
-        extracted_entities = extract_named_entities(email_text, temperature)
-        key_phrases = extract_key_phrases(email_text, temperature)
-        summary = generate_summary(email_text, temperature)
+        email_text = validate_input(email_text)
+        # Entities, key phrases and summary are independent calls; run them concurrently
+        extracted_entities, key_phrases, summary = await asyncio.gather(
+            run_stage("entities", extract_named_entities(email_text, temperature), []),
+            run_stage("key_phrases", extract_key_phrases(email_text, temperature), []),
+            run_stage("summary", generate_summary(email_text, temperature), SUMMARY_FAILED)
+        )
         
-        result = {
-            "named_entities": [{"Entity": entity.entity, "Type": entity.label} for entity in extracted_entities],
-            "key_phrases": key_phrases,
-            "summary": summary
-        }
-        return json.dumps(result, indent=2)
+        return format_extraction(extracted_entities, key_phrases, summary)
 
     except ValueError as ve:
         logger.error("Input validation error", exc_info=True)
@@ -231,6 +267,8 @@ def extract_output(email_text: str, temperature: float = 0.2) -> str:
         return json.dumps({"error": str(e)}, indent=2)
 
 def update_email(email_id: int, category_type: str, category: str):
+    if email_id is None:
+        return  # Text classified without a stored email
     from app.db import Email
     from app.db.email_repo import EmailRepo
     try:
@@ -244,9 +282,9 @@ def update_email(email_id: int, category_type: str, category: str):
     except Exception as e:
         logger.critical("Unexpected error while updating table: %s", str(e), exc_info=True)
 
-def generate_final_response(text: str, temperature: float = 0.2, retries: int = 3, email_id = None, category_type = None) -> str:
+async def generate_final_response(text: str, temperature: float = 0.2, retries: int = 3, email_id = None, category_type = None) -> str:
     """Generate summary using Gemini API with retries."""
-    text = validate_input(text)
+    text = fit_prompt("categorize", validate_input(text))
     prompt = f"""
     Categorize following financial result based on named entities, key phrases and summary 
     into request type, request sub type, deal name and confidence score. 
@@ -257,30 +295,219 @@ def generate_final_response(text: str, temperature: float = 0.2, retries: int =
     """
     for attempt in range(retries):
         try:
-            response = MODEL.generate_content(prompt, generation_config={"temperature": temperature})
-            response_text = response.text.strip() if hasattr(response, 'text') and response.text else ""
+            response_text = await cached_generate_content_async(MODEL, prompt, generation_config={"temperature": temperature})
             if response_text:
-                update_email(email_id, category_type, response_text)
+                await asyncio.to_thread(update_email, email_id, category_type, response_text)
                 logger.info("Gemini Final Response:\n%s", response_text)
                 return response_text
             logger.warning("Received empty response from Gemini API for summary")
-        except genai.GoogleGenerativeAIError as api_error:
+        except (GoogleAPIError, CircuitOpenError) as api_error:
+            # Transient API errors were already retried by the LLM client
             logger.error("Gemini API error: %s", str(api_error), exc_info=True)
+            break
         except Exception as e:
             logger.critical("Unexpected error in FInal Response generation: %s", str(e), exc_info=True)
 
-        time.sleep(2 ** attempt)
+        await asyncio.sleep(backoff_delay(attempt))
+
+    return CLASSIFICATION_FAILED
+
+# Schema for the single-call "fused" mode: extraction and categorisation in one JSON response
+FUSED_RESPONSE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "named_entities": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "entity": {"type": "string"},
+                    "type": {"type": "string"},
+                    "confidence_score": {"type": "number"}
+                },
+                "required": ["entity", "type", "confidence_score"]
+            }
+        },
+        "key_phrases": {"type": "array", "items": {"type": "string"}},
+        "summary": {"type": "string"},
+        "request_type": {"type": "string"},
+        "request_sub_type": {"type": "string"},
+        "deal_name": {"type": "string"},
+        "confidence_score": {"type": "number"}
+    },
+    "required": ["named_entities", "key_phrases", "summary", "request_type", "request_sub_type", "deal_name", "confidence_score"]
+}
+
+def parse_fused_response(response_text: str):
+    """Parse a fused JSON response into (entities, key phrases, summary, category text)."""
+    return parse_fused_data(json.loads(response_text))
+
+def parse_fused_data(data: Dict):
+    """Turn one decoded fused result into (entities, key phrases, summary, category text)."""
+    entities = []
+    for item in data.get("named_entities", []):
+        try:
+            confidence = float(item.get("confidence_score", 0))
+        except (TypeError, ValueError):
+            logger.warning("Skipping invalid confidence score in entity: %s", item)
+            continue
+        if confidence >= 0.8 and item.get("entity") and item.get("type"):
+            entities.append(ExtractedEntity(str(item["entity"]).strip(), str(item["type"]).strip(), confidence))
+    key_phrases = filter_key_phrases([str(phrase) for phrase in data.get("key_phrases", [])])
+    summary = str(data.get("summary", "")).strip() or SUMMARY_FAILED
+    category = (
+        f"Request Type: {data.get('request_type', '')}\n"
+        f"Request Sub Type: {data.get('request_sub_type', '')}\n"
+        f"Deal Name: {data.get('deal_name', '')}\n"
+        f"Confidence Score: {data.get('confidence_score', '')}"
+    )
+    return entities, key_phrases, summary, category
+
+async def classify_email_fused(text: str, temperature: float = 0.2, retries: int = 3, email_id = None, category_type = None) -> str:
+    """Extract entities, key phrases, summary and categorisation with a single schema-constrained call."""
+    text = fit_prompt("fused", validate_input(text))
+    prompt = f"""
+    Analyse the following financial email.
+    Extract the financial entities with their label and a confidence score (0-1 range),
+    the key phrases (without numbers), and a summary in 4-5 concise, professional sentences.
+    Then categorize the email into request type, request sub type, deal name and confidence score.
+    Focus on the key financial actions and requests made.
+
+    Text:
+    {text}
+    """
+    generation_config = {
+        "temperature": temperature,
+        "response_mime_type": "application/json",
+        "response_schema": FUSED_RESPONSE_SCHEMA
+    }
+    for attempt in range(retries):
+        try:
+            response_text = await cached_generate_content_async(MODEL, prompt, generation_config=generation_config, validate=json.loads)
+            if response_text:
+                logger.info("Gemini Fused Response:\n%s", response_text)
+                entities, key_phrases, summary, category = parse_fused_response(response_text)
+                logger.info("Fused extraction:\n%s", format_extraction(entities, key_phrases, summary))
+                await asyncio.to_thread(update_email, email_id, category_type, category)
+                return category
+            logger.warning("Received empty response from Gemini API for fused classification")
+        except (GoogleAPIError, CircuitOpenError) as api_error:
+            # Transient API errors were already retried by the LLM client
+            logger.error("Gemini API error: %s", str(api_error), exc_info=True)
+            break
+        except json.JSONDecodeError:
+            logger.error("Fused response is not valid JSON", exc_info=True)
+        except Exception as e:
+            logger.critical("Unexpected error in fused classification: %s", str(e), exc_info=True)
+
+        await asyncio.sleep(backoff_delay(attempt))
+
+    return CLASSIFICATION_FAILED
+
+# Several emails per call: the fused result of each, tagged with the email's number
+FUSED_BATCH_RESPONSE_SCHEMA = {
+    "type": "array",
+    "items": {
+        "type": "object",
+        "properties": dict(FUSED_RESPONSE_SCHEMA["properties"], email={"type": "integer"}),
+        "required": ["email"] + FUSED_RESPONSE_SCHEMA["required"]
+    }
+}
+
+async def classify_emails_fused(items: List[Dict], temperature: float = 0.2, retries: int = 3) -> List[Optional[str]]:
+    """Fused classification of several emails in as few calls as fit; items hold text, email_id and category_type.
+
+    Each email is fitted to LLM_STAGE_MAX_TOKENS as in single-email mode, then consecutive emails share a
+    call as long as their combined text stays within that budget too; the calls run concurrently. Returns
+    one category per item: None for an email missing from an otherwise good response, so the caller can
+    retry it alone, and CLASSIFICATION_FAILED for every email of a call that failed outright.
+    """
+    texts = [fit_prompt("fused_batch", validate_input(item.get("text"))) for item in items]
+    groups = pack_tokens([count_tokens(text) for text in texts], settings.LLM_STAGE_MAX_TOKENS)
+    if len(groups) > 1:
+        logger.info("LLM stage fused_batch: %d emails over the token budget together, split into %d calls",
+                    len(items), len(groups))
+    results = await asyncio.gather(*(
+        classify_fused_group([items[position] for position in group], [texts[position] for position in group],
+                             temperature, retries)
+        for group in groups
+    ))
+    categories = [None] * len(items)
+    for group, group_categories in zip(groups, results):
+        for position, category in zip(group, group_categories):
+            categories[position] = category
+    return categories
+
+async def classify_fused_group(items: List[Dict], texts: List[str], temperature: float, retries: int) -> List[Optional[str]]:
+    """One fused call for emails whose fitted texts fit the stage budget together."""
+    numbered = "\n\n".join(f"Email {number}:\n{text}" for number, text in enumerate(texts, start=1))
+    prompt = f"""
+    Analyse each of the following financial emails independently.
+    For every email, extract the financial entities with their label and a confidence score (0-1 range),
+    the key phrases (without numbers), and a summary in 4-5 concise, professional sentences.
+    Then categorize the email into request type, request sub type, deal name and confidence score.
+    Focus on the key financial actions and requests made.
+    Return one result per email, with the email's number in "email".
+
+    {numbered}
+    """
+    generation_config = {
+        "temperature": temperature,
+        "response_mime_type": "application/json",
+        "response_schema": FUSED_BATCH_RESPONSE_SCHEMA
+    }
+    for attempt in range(retries):
+        try:
+            response_text = await cached_generate_content_async(MODEL, prompt, generation_config=generation_config, validate=json.loads)
+            if response_text:
+                logger.info("Gemini Fused Batch Response:\n%s", response_text)
+                categories = [None] * len(items)
+                for data in json.loads(response_text):
+                    try:
+                        position = int(data.get("email")) - 1
+                    except (TypeError, ValueError):
+                        logger.warning("Skipping fused result without an email number: %s", data)
+                        continue
+                    if 0 <= position < len(items) and categories[position] is None:
+                        categories[position] = parse_fused_data(data)[3]
+                for item, category in zip(items, categories):
+                    if category is not None:
+                        await asyncio.to_thread(update_email, item.get("email_id"), item.get("category_type"), category)
+                return categories
+            logger.warning("Received empty response from Gemini API for fused batch classification")
+        except (GoogleAPIError, CircuitOpenError) as api_error:
+            # Transient API errors were already retried by the LLM client
+            logger.error("Gemini API error: %s", str(api_error), exc_info=True)
+            break
+        except json.JSONDecodeError:
+            logger.error("Fused batch response is not valid JSON", exc_info=True)
+        except Exception as e:
+            logger.critical("Unexpected error in fused batch classification: %s", str(e), exc_info=True)
+
+        await asyncio.sleep(backoff_delay(attempt))
+
+    return [CLASSIFICATION_FAILED] * len(items)
 
-    return "Final response generation failed."
+# "chain": entities, key phrases and summary, then a categorisation call (default)
+# "fused": one structured call producing everything
+CLASSIFY_MODES = ("chain", "fused")
 
-def classify_email(selectedItems: Dict) -> Dict:
+async def classify_email(selectedItems: Dict) -> Dict:
     text = selectedItems.get("text")
     email_id = selectedItems.get("email_id")
     category_type = selectedItems.get("category_type")
+    mode = selectedItems.get("mode") or "chain"
     print("Email ID:", email_id)
     print("Category Type:", category_type)
-    
-    result = extract_output(text, temperature=0.2)
-    final_output = generate_final_response(result, temperature=0.2, email_id=email_id, category_type=category_type)
+    if mode not in CLASSIFY_MODES:
+        raise ValueError(f"Unknown classification mode: {mode}")
+
+    if mode == "fused":
+        final_output = await run_stage("fused", classify_email_fused(text, temperature=0.2, email_id=email_id,
+                                                                   category_type=category_type), CLASSIFICATION_FAILED)
+    else:
+        result = await extract_output(text, temperature=0.2)
+        final_output = await run_stage("categorize", generate_final_response(result, temperature=0.2, email_id=email_id,
+                                                                             category_type=category_type), CLASSIFICATION_FAILED)
     print(final_output)
     return final_output
\ No newline at end of file
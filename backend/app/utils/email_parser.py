@@ -1,65 +1,86 @@
-import email
-import os
-from email import policy
-from email.parser import BytesParser
-from typing import Dict, List
+import tempfile
+from typing import BinaryIO, Callable, Dict, Optional, Union
 from io import BytesIO
-from .extract_text_from_attachment import extract_text_from_attachment
+from app.core.config import settings
+from .extract_text_from_attachment import AttachmentExtraction
+from .mime_stream import EmailTooLargeError, MimeStreamParser
 from .store_email_to_db import store_email
 
-def parse_email(eml_content: bytes) -> Dict:
+def parse_email(eml_content: Union[bytes, BinaryIO], progress: Optional[Callable[[str], None]] = None) -> Dict:
     """
-    Parses an EML file content and extracts key email components.
+    Parses an EML file content, extracts key email components and stores the email unless it is a duplicate.
     
-    :param eml_content: The raw bytes content of an EML file
+    :param eml_content: The raw bytes content of an EML file, or a binary file to stream it from
+    :param progress: Optional callback receiving the name of each stage as it starts
     :return: Dictionary containing email body, subject, sender, recipient(s), and attachment names.
     """
-    # Parse the email content
-    msg = BytesParser(policy=policy.default).parse(BytesIO(eml_content))
+    progress = progress or (lambda stage: None)
+    email_content = extract_email_content(eml_content, progress)
 
-    # Extract subject, sender, and recipients
-    subject = msg.get("Subject", "")
-    sender = msg.get("From", "")
-    recipients = msg.get("To", "")
-
-    # Extract the email body (handling plain text and HTML)
-    body = None
-    if msg.is_multipart():
-        for part in msg.walk():
-            content_type = part.get_content_type()
-            if content_type == "text/plain":  # Prefer plain text over HTML
-                body = part.get_payload(decode=True).decode(part.get_content_charset() or "utf-8", errors="ignore")
-                break
-    else:
-        body = msg.get_payload(decode=True).decode(msg.get_content_charset() or "utf-8", errors="ignore")
-
-    # Extract attachment names
-    email_data = {       
-        "attachments": []
-    }
-    for part in msg.walk():
-        if part.get_content_disposition() == "attachment":
-            filename = part.get_filename()
-            if filename:
-               email_data["attachments"].append({
-                    "filename": filename,
-                    "content": part.get_payload(decode=True)
-                })
-    
-    attachments = []
-    for attachment in email_data["attachments"]:
-        text = extract_text_from_attachment(attachment["filename"], attachment["content"])
-        attachments.append({"filename": attachment["filename"], "extracted_text": text})
-    
     # check if duplicate
     # store else
-    email_db_attribute = store_email({
-        "subject": subject,
-        "from": sender,
-        "to": recipients,
-        "body": body or "",
-        "attachments": attachments,
-    })
+    progress("CHECKING_DUPLICATES")
+    email_db_attribute = store_email(email_content)
+
+    return {
+        **email_content,
+        "email_id": email_db_attribute.get("email_id"),
+        "is_duplicate": email_db_attribute.get("is_duplicate")
+    }
+
+def email_limits():
+    """(max raw size in bytes, max attachments, largest payload kept in memory) from the settings; 0 = no limit."""
+    return (int(settings.EMAIL_MAX_SIZE_MB * 1024 * 1024), settings.EMAIL_MAX_ATTACHMENTS,
+            int(settings.EMAIL_SPOOL_MEMORY_MB * 1024 * 1024))
+
+def extract_email_content(eml_content: Union[bytes, BinaryIO], progress: Optional[Callable[[str], None]] = None) -> Dict:
+    """
+    Parses an EML file content and extracts subject, sender, recipient(s), body and attachment text,
+    without touching the database.
+
+    The message is parsed in a single streaming pass (eml_content may be bytes or a binary file, such
+    as a spooled upload). Each attachment is handed to the extraction pool as soon as it is decoded;
+    payloads over EMAIL_SPOOL_MEMORY_MB go to a temporary file instead of memory. Raises
+    EmailTooLargeError beyond EMAIL_MAX_SIZE_MB or EMAIL_MAX_ATTACHMENTS.
+    """
+    progress = progress or (lambda stage: None)
+    progress("PARSING")
+    stream = BytesIO(eml_content) if isinstance(eml_content, (bytes, bytearray)) else eml_content
+    max_bytes, max_attachments, spool_bytes = email_limits()
+
+    with tempfile.TemporaryDirectory(prefix="eml-", dir=settings.EMAIL_SPOOL_DIR) as spool_dir:
+        parser = MimeStreamParser(stream, max_bytes, spool_bytes, spool_dir)
+        extraction = AttachmentExtraction()
+        body = None
+        try:
+            for part in parser.parts():
+                filename = part.get_filename()
+                if part.get_content_disposition() == "attachment" and filename:
+                    if 0 < max_attachments <= len(extraction.attachments):
+                        raise EmailTooLargeError(f"Email has more than {max_attachments} attachments")
+                    # Spooled payloads are passed on by path; the parser does not keep any payload
+                    extraction.submit(filename, part.payload.content(), part.payload.sha256(), part.payload.size,
+                                      part.get_content_type())
+                elif body is None and (part.get_content_type() == "text/plain"  # Prefer plain text over HTML
+                                       or parser.headers.get_content_maintype() != "multipart"):
+                    body = part.text()
+                    part.payload.discard()
+                else:
+                    part.payload.discard()
+        except Exception:
+            extraction.cancel()
+            raise
+
+        # Extract subject, sender, and recipients
+        headers = parser.headers
+        subject = headers.get("Subject", "")
+        sender = headers.get("From", "")
+        recipients = headers.get("To", "")
+
+        # Wait for the text of all attachments (extracted in parallel in the process pool)
+        progress("EXTRACTING_ATTACHMENTS")
+        attachments = extraction.results()
+        attachment_metadata = extraction.metadata()
 
     return {
         "subject": subject,
@@ -67,6 +88,5 @@ def parse_email(eml_content: bytes) -> Dict:
         "to": recipients,
         "body": body or "",
         "attachments": attachments,
-        "email_id": email_db_attribute.get("email_id"),
-        "is_duplicate": email_db_attribute.get("is_duplicate")
+        "attachment_metadata": attachment_metadata
     }
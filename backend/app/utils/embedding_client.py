@@ -0,0 +1,147 @@
+"""Client of the shared embedding server (app.services.embedding_server).
+
+Every uvicorn worker otherwise loads its own copy of the sentence-transformer. With EMBEDDING_SERVER_URL
+set, encode calls go to one server process that batches requests from all workers into a single forward
+pass. Workers then never load the model themselves: a call the server cannot take is retried until it
+comes back (it may still be starting or restarting) or EMBEDDING_SERVER_RETRY_SECONDS pass, then fails.
+
+Wire format, both directions: frames of a 4-byte big-endian length and a payload. A request is one JSON
+frame {"texts": [...]}; the reply is a JSON frame {"rows": n, "dim": d} followed by a frame of n*d
+float32 values, or a JSON frame {"error": "..."}.
+"""
+import json
+import logging
+import socket
+import struct
+import threading
+import time
+from urllib.parse import urlparse
+import numpy as np
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+FRAME_HEADER = struct.Struct(">I")
+MAX_FRAME_BYTES = 256 * 1024 * 1024
+# Reconnect backoff while the server is unreachable, doubling up to the maximum
+RETRY_INITIAL_DELAY = 0.1
+RETRY_MAX_DELAY = 2.0
+
+
+def parse_address(url: str):
+    """Return (socket family, address) for unix:///path/to.sock or tcp://host:port."""
+    parsed = urlparse(url)
+    if parsed.scheme == "unix":
+        return socket.AF_UNIX, parsed.path
+    if parsed.scheme == "tcp" and parsed.hostname and parsed.port:
+        return socket.AF_INET, (parsed.hostname, parsed.port)
+    raise ValueError(f"EMBEDDING_SERVER_URL must be unix:///path or tcp://host:port, got {url!r}")
+
+
+def send_frame(sock, payload: bytes):
+    sock.sendall(FRAME_HEADER.pack(len(payload)) + payload)
+
+
+def recv_exactly(sock, size: int) -> bytearray:
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+    received = 0
+    while received < size:
+        count = sock.recv_into(view[received:])
+        if not count:
+            raise ConnectionError("Embedding server closed the connection")
+        received += count
+    return buffer
+
+
+def recv_frame(sock) -> bytearray:
+    (size,) = FRAME_HEADER.unpack(recv_exactly(sock, FRAME_HEADER.size))
+    if size > MAX_FRAME_BYTES:
+        raise ConnectionError(f"Embedding server frame of {size} bytes exceeds the limit")
+    return recv_exactly(sock, size)
+
+
+class EmbeddingServerUnavailable(ConnectionError):
+    """The embedding server could not be reached within the client's retry window."""
+
+
+class EmbeddingServerError(RuntimeError):
+    """The embedding server failed to encode a batch."""
+
+
+class EmbeddingClient:
+    """Blocking client with one connection per thread.
+
+    A call that cannot reach the server reconnects with backoff for up to retry_seconds, then raises
+    EmbeddingServerUnavailable. A request the server took but did not answer within timeout is not
+    re-sent: it raises EmbeddingServerError.
+    """
+
+    def __init__(self, url: str, timeout: float = 30.0, retry_seconds: float = 30.0):
+        self.family, self.address = parse_address(url)
+        self.timeout = timeout
+        self.retry_seconds = retry_seconds
+        self.connections = threading.local()
+
+    def connection(self):
+        sock = getattr(self.connections, "sock", None)
+        if sock is None:
+            sock = socket.socket(self.family, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            try:
+                sock.connect(self.address)
+            except OSError:
+                sock.close()
+                raise
+            self.connections.sock = sock
+        return sock
+
+    def disconnect(self):
+        sock = getattr(self.connections, "sock", None)
+        self.connections.sock = None
+        if sock is not None:
+            sock.close()
+
+    def encode(self, texts) -> np.ndarray:
+        """Normalized float32 embeddings from the server, waiting up to retry_seconds for it to answer."""
+        payload = json.dumps({"texts": list(texts)}).encode("utf-8")
+        deadline = time.monotonic() + self.retry_seconds
+        delay = RETRY_INITIAL_DELAY
+        while True:
+            try:
+                return self.request(payload)
+            except (OSError, ValueError, KeyError) as e:
+                self.disconnect()
+                if time.monotonic() + delay > deadline:
+                    raise EmbeddingServerUnavailable(f"Embedding server unreachable: {e}") from e
+                logger.warning("Embedding server unavailable, retrying in %.1fs: %s", delay, e)
+                time.sleep(delay)
+                delay = min(delay * 2, RETRY_MAX_DELAY)
+
+    def request(self, payload: bytes) -> np.ndarray:
+        sock = self.connection()
+        send_frame(sock, payload)
+        try:
+            header = json.loads(recv_frame(sock))
+            if "error" in header:
+                # The connection is still in sync; the server failed this batch only
+                raise EmbeddingServerError(f"Embedding server error: {header['error']}")
+            # A bytearray keeps the array writable without another copy
+            vectors = np.frombuffer(recv_frame(sock), dtype=np.float32)
+        except socket.timeout as e:
+            # The server has the batch and is slow, not down: sending it again would only add load
+            self.disconnect()
+            raise EmbeddingServerError(f"Embedding server did not answer within {self.timeout}s") from e
+        return vectors.reshape(header["rows"], header["dim"])
+
+    def stats(self) -> dict:
+        """Requests, texts and batches the server has encoded."""
+        sock = self.connection()
+        send_frame(sock, json.dumps({"op": "stats"}).encode("utf-8"))
+        return json.loads(recv_frame(sock))
+
+
+embedding_client = None
+if settings.EMBEDDING_SERVER_URL:
+    embedding_client = EmbeddingClient(settings.EMBEDDING_SERVER_URL, settings.EMBEDDING_SERVER_TIMEOUT_SECONDS,
+                                       settings.EMBEDDING_SERVER_RETRY_SECONDS)
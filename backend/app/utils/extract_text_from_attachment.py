@@ -1,19 +1,192 @@
-import io
-import pdfplumber
-from PIL import Image
-import pytesseract
-
-def extract_text_from_attachment(filename, content):
-    """Extract text from a PDF or image attachment."""
-    text = ""
-    
-    if filename.endswith(".pdf"):
-        with pdfplumber.open(io.BytesIO(content)) as pdf:
-            text = "\n".join(page.extract_text() for page in pdf.pages if page.extract_text())
-    
-    elif filename.endswith((".jpg", ".png", ".jpeg")):
-        image = Image.open(io.BytesIO(content))
-        # Apply OCR to extract text from image
-        text = pytesseract.image_to_string(image, config="--psm 6")  # "6" improves block text recognition
-
-    return text.strip()
\ No newline at end of file
+import logging
+import os
+import threading
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from app.core.config import settings
+from app.utils.attachment_cache import attachment_cache, content_digest
+from app.utils.attachment_extractors import (detect_extractor, extract_pdf_head, extract_pdf_text, extractor_version,
+                                              ocr_page_limit, run_extractor)
+from app.utils.extraction_pool import ExtractionPool, TaskTimeoutError
+
+logger = logging.getLogger(__name__)
+
+def extract_text_from_attachment(filename, content, content_type=None):
+    """Extract text from any attachment type in the extractor registry; empty for unsupported types."""
+    extractor = detect_extractor(filename, content_type, content)
+    return run_extractor(extractor, content) if extractor else ""
+
+# Shared process pool for parallel extraction, created on first use
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ExtractionPool(settings.ATTACHMENT_WORKERS, settings.ATTACHMENT_TIMEOUT_SECONDS,
+                                   settings.ATTACHMENT_MEMORY_LIMIT_MB)
+        return _pool
+
+def shutdown_pool():
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown()
+
+def wait_result(future):
+    """The task's result, waiting at most ATTACHMENT_WAIT_SECONDS in case the pool stalls."""
+    try:
+        return future.result(timeout=settings.ATTACHMENT_WAIT_SECONDS or None)
+    except FutureTimeoutError:
+        future.cancel()
+        raise
+
+def split_ocr_budget(used, tasks):
+    """OCR page limit of each later page range of a PDF: what the first range left of OCR_MAX_PAGES, earlier ranges first."""
+    limit = ocr_page_limit()
+    if limit is None:
+        return [None] * tasks
+    remaining = max(0, limit - used)
+    return [remaining // tasks + (1 if task < remaining % tasks else 0) for task in range(tasks)]
+
+class AttachmentExtraction:
+    """Text extraction of one email's attachments, each started on the pool as soon as it is submitted.
+
+    Each attachment goes to the extractor registered for its type (see attachment_extractors).
+    Texts are looked up in the attachment cache by content hash first, so a file seen before is never
+    parsed or OCR'd again. PDFs longer than PDF_PAGES_PER_TASK pages are split into page ranges extracted
+    in parallel, sharing the document's OCR_MAX_PAGES budget for pages without a text layer. An attachment
+    whose task fails, runs over ATTACHMENT_TIMEOUT_SECONDS or crashes its worker gets empty text (and is not
+    cached); the pool replaces that worker alone, so other requests' tasks carry on.
+    """
+
+    def __init__(self):
+        self.attachments = []
+        self.futures = []
+        self.texts = []
+        self.pages_per_task = max(1, settings.PDF_PAGES_PER_TASK)
+
+    def submit(self, filename, content, digest=None, size=None, content_type=None):
+        """Start extracting one attachment; content is bytes or the path of a spooled payload.
+
+        The extractor is chosen from the content's magic bytes, then content_type, then the filename's extension.
+        digest (SHA-256 hex of the content) and size are computed here unless the caller already has them.
+        """
+        position = len(self.attachments)
+        extractor = detect_extractor(filename, content_type, content)
+        metadata = {
+            "filename": filename,
+            "size": size if size is not None else (os.path.getsize(content) if isinstance(content, str) else len(content)),
+            "sha256": digest or content_digest(content),
+            "extractor": extractor,
+            "extractor_version": extractor_version(extractor),
+            "status": "unsupported"
+        }
+        self.attachments.append({"filename": filename, "content": content, "metadata": metadata})
+        self.texts.append("")
+        self.futures.append(None)
+        if extractor is None:
+            return  # Nothing to extract; no need for a pool round trip
+        if settings.ATTACHMENT_CACHE_ENABLED:
+            cached = attachment_cache.get(self.cache_key(metadata))
+            if cached is not None:
+                self.texts[position] = cached
+                metadata["status"] = "cached"
+                return
+        metadata["status"] = "failed"
+        try:
+            # Stage 1: first page range (and page count) of PDFs, whole-file extraction for everything else
+            if extractor == "pdf":
+                self.futures[position] = get_pool().submit(extract_pdf_head, content, self.pages_per_task, ocr_page_limit())
+            else:
+                self.futures[position] = get_pool().submit(run_extractor, extractor, content)
+        except RuntimeError as e:
+            logger.error("Attachment pool unavailable: %s", str(e))
+
+    @staticmethod
+    def cache_key(metadata):
+        return attachment_cache.make_key(metadata["sha256"], metadata["extractor"], metadata["extractor_version"])
+
+    def cancel(self):
+        """Drop attachments not started yet, e.g. when the email turns out to be over a limit."""
+        for future in self.futures:
+            if future is not None:
+                future.cancel()
+
+    def extracted(self, position, text):
+        """Record a successful extraction and cache its text."""
+        attachment = self.attachments[position]
+        self.texts[position] = text
+        attachment["metadata"]["status"] = "extracted"
+        if settings.ATTACHMENT_CACHE_ENABLED:
+            attachment_cache.set(self.cache_key(attachment["metadata"]), text)
+
+    def results(self):
+        """Wait for every submitted attachment and return [{"filename", "extracted_text"}] in submission order."""
+        attachments = self.attachments
+
+        # Stage 2: one task per remaining page range of long PDFs
+        page_tasks = {}
+        for position, (attachment, future) in enumerate(zip(attachments, self.futures)):
+            if future is None:
+                continue
+            try:
+                # The pool bounds each task's running time; the wait is a backstop
+                result = wait_result(future)
+            except (TaskTimeoutError, FutureTimeoutError, BrokenProcessPool) as e:
+                logger.error("Attachment %s timed out or crashed its worker: %s", attachment["filename"], repr(e))
+                attachment["metadata"]["status"] = "timeout"
+                continue
+            except Exception as e:
+                logger.error("Failed to extract text from %s: %s", attachment["filename"], str(e))
+                continue
+            if attachment["metadata"]["extractor"] != "pdf":
+                self.extracted(position, result)
+                continue
+            page_count, head_text, ocr_pages = result
+            attachment["metadata"]["ocr_pages"] = ocr_pages
+            if page_count <= self.pages_per_task:
+                self.extracted(position, head_text.strip())
+                continue
+            self.texts[position] = head_text.strip()
+            starts = range(self.pages_per_task, page_count, self.pages_per_task)
+            try:
+                page_tasks[position] = (head_text, [
+                    get_pool().submit(extract_pdf_text, attachment["content"], start, start + self.pages_per_task, limit)
+                    for start, limit in zip(starts, split_ocr_budget(ocr_pages, len(starts)))
+                ])
+            except RuntimeError as e:
+                logger.error("Attachment pool unavailable: %s", str(e))
+
+        for position, (head_text, futures) in page_tasks.items():
+            try:
+                results = [wait_result(future) for future in futures]
+                attachments[position]["metadata"]["ocr_pages"] += sum(ocr_pages for _, ocr_pages in results)
+                parts = [head_text] + [text for text, _ in results]
+                self.extracted(position, "\n".join(part for part in parts if part).strip())
+            except (TaskTimeoutError, FutureTimeoutError, BrokenProcessPool) as e:
+                logger.error("Attachment %s timed out or crashed its worker: %s", attachments[position]["filename"], repr(e))
+                attachments[position]["metadata"]["status"] = "timeout"
+            except Exception as e:
+                logger.error("Failed to extract text from %s: %s", attachments[position]["filename"], str(e))
+
+        return [{"filename": attachment["filename"], "extracted_text": text} for attachment, text in zip(attachments, self.texts)]
+
+    def metadata(self):
+        """Per attachment: filename, size, sha256, extractor and its version, status and extracted text length,
+        plus ocr_pages for PDFs extracted rather than served from the cache.
+
+        status is "extracted", "cached", "failed", "timeout" or "unsupported" (no extractor for the type).
+        """
+        return [dict(attachment["metadata"], text_length=len(text)) for attachment, text in zip(self.attachments, self.texts)]
+
+def extract_attachments(attachments):
+    """Extract text from every attachment in parallel, returning [{"filename", "extracted_text"}]."""
+    if not attachments:
+        return []
+    extraction = AttachmentExtraction()
+    for attachment in attachments:
+        extraction.submit(attachment["filename"], attachment["content"], content_type=attachment.get("content_type"))
+    return extraction.results()
@@ -0,0 +1,238 @@
+"""Process pool for attachment text extraction that isolates stuck and crashed tasks.
+
+concurrent.futures.ProcessPoolExecutor marks the whole pool broken when one of its workers dies, failing
+every other request's tasks with it. Here each worker has its own pipe: a dispatcher thread hands queued
+tasks to idle workers, and a task still running ATTACHMENT_TIMEOUT_SECONDS after a worker picked it up
+(time spent queued behind other tasks does not count) has only its own worker terminated and replaced.
+"""
+import collections
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing.connection import wait
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# Pause after an unexpected dispatcher error, so a persistent one does not spin the thread
+DISPATCH_ERROR_DELAY = 1.0
+
+
+class TaskTimeoutError(TimeoutError):
+    """A task ran longer than the pool's task timeout; its worker was terminated."""
+
+
+def limit_worker_resources(memory_limit_mb):
+    """One OCR thread per process and a cap on the worker's heap."""
+    os.environ["OMP_THREAD_LIMIT"] = "1"
+    if memory_limit_mb <= 0:
+        return
+    try:
+        import resource
+        limit = memory_limit_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_DATA, (limit, limit))
+    except (ImportError, ValueError, OSError):
+        pass  # Not supported on this platform
+
+
+def worker_main(conn, memory_limit_mb):
+    """Run (function, args) tasks from conn until it closes, replying (succeeded, result or exception)."""
+    limit_worker_resources(memory_limit_mb)
+    while True:
+        try:
+            task = conn.recv()
+        except EOFError:
+            return
+        if task is None:
+            return
+        function, args = task
+        try:
+            reply = (True, function(*args))
+        except Exception as e:
+            reply = (False, e)
+        try:
+            conn.send(reply)
+        except Exception as e:
+            # The result or exception could not be pickled
+            conn.send((False, RuntimeError(repr(e))))
+
+
+class Worker:
+    def __init__(self, context, memory_limit_mb: int):
+        self.conn, child = context.Pipe()
+        self.process = context.Process(target=worker_main, args=(child, memory_limit_mb), daemon=True)
+        self.process.start()
+        child.close()
+        self.future = None
+        self.started = None
+
+    def stop(self):
+        try:
+            self.conn.close()
+        except OSError:
+            pass
+        if self.process.is_alive():
+            self.process.terminate()
+        self.process.join(timeout=5)
+
+
+class ExtractionPool:
+    """Up to `workers` spawned processes running submitted tasks; submit() returns a concurrent Future.
+
+    A task over task_timeout seconds (0 = no limit) fails with TaskTimeoutError and a task whose worker
+    dies with BrokenProcessPool; other tasks are unaffected. Workers are started as tasks arrive.
+    """
+
+    def __init__(self, workers: int, task_timeout: float, memory_limit_mb: int):
+        # spawn: never fork a process that already holds model and event-loop threads
+        self.context = multiprocessing.get_context("spawn")
+        self.max_workers = max(1, workers)
+        self.task_timeout = task_timeout
+        self.memory_limit_mb = memory_limit_mb
+        self.workers = []
+        self.queue = collections.deque()
+        self.lock = threading.Lock()
+        self.closed = False
+        self.wakeup_reader, self.wakeup_writer = self.context.Pipe(duplex=False)
+        self.stats = {"tasks": 0, "timeouts": 0, "crashes": 0}
+        self.thread = threading.Thread(target=self.run, name="extraction-pool", daemon=True)
+        self.thread.start()
+
+    def submit(self, function, *args) -> Future:
+        future = Future()
+        with self.lock:
+            if self.closed:
+                raise RuntimeError("Extraction pool is shut down")
+            self.queue.append((function, args, future))
+            self.wakeup_writer.send_bytes(b"")
+        return future
+
+    def run(self):
+        while True:
+            with self.lock:
+                if self.closed:
+                    break
+            try:
+                self.step()
+            except Exception:
+                # Keep dispatching: a dead dispatcher would leave every pending future unresolved
+                logger.exception("Extraction pool dispatcher error")
+                time.sleep(DISPATCH_ERROR_DELAY)
+
+    def step(self):
+        self.dispatch()
+        connections = [self.wakeup_reader] + [worker.conn for worker in self.workers]
+        for conn in wait(connections, self.next_timeout()):
+            if conn is self.wakeup_reader:
+                while self.wakeup_reader.poll():
+                    self.wakeup_reader.recv_bytes()
+            else:
+                self.receive(next(worker for worker in self.workers if worker.conn is conn))
+        self.expire()
+
+    def idle_worker(self) -> Optional[Worker]:
+        for worker in self.workers:
+            if worker.future is None:
+                return worker
+        if len(self.workers) < self.max_workers:
+            worker = Worker(self.context, self.memory_limit_mb)
+            self.workers.append(worker)
+            return worker
+        return None
+
+    def dispatch(self):
+        while self.queue:
+            worker = self.idle_worker()
+            if worker is None:
+                return
+            with self.lock:
+                if not self.queue:
+                    return
+                function, args, future = self.queue.popleft()
+            if not future.set_running_or_notify_cancel():
+                continue  # Cancelled while queued
+            try:
+                worker.conn.send((function, args))
+            except OSError as e:
+                # The worker is gone; its replacement is started on demand
+                future.set_exception(BrokenProcessPool(f"Could not hand a task to an extraction worker: {e}"))
+                self.replace(worker, None)
+                continue
+            except Exception as e:
+                future.set_exception(e)  # Arguments could not be pickled; nothing was sent
+                continue
+            worker.future, worker.started = future, time.monotonic()
+            self.stats["tasks"] += 1
+
+    def receive(self, worker: Worker):
+        try:
+            succeeded, value = worker.conn.recv()
+        except (EOFError, OSError):
+            if worker.future is not None:
+                self.stats["crashes"] += 1
+                logger.error("Extraction worker %s died while running a task", worker.process.pid)
+            self.replace(worker, BrokenProcessPool("The extraction worker running this task died"))
+            return
+        except Exception as e:
+            # The reply arrived whole but could not be unpickled (e.g. an exception class that cannot be
+            # rebuilt from its args); the worker itself is fine
+            succeeded, value = False, RuntimeError(f"Unreadable reply from extraction worker: {e!r}")
+        future, worker.future, worker.started = worker.future, None, None
+        if future is None:
+            return
+        if succeeded:
+            future.set_result(value)
+        else:
+            future.set_exception(value)
+
+    def expire(self):
+        if self.task_timeout <= 0:
+            return
+        now = time.monotonic()
+        for worker in list(self.workers):
+            if worker.future is not None and now - worker.started >= self.task_timeout:
+                self.stats["timeouts"] += 1
+                logger.error("Extraction task exceeded %ss; terminating worker %s", self.task_timeout, worker.process.pid)
+                self.replace(worker, TaskTimeoutError(f"Extraction task exceeded {self.task_timeout}s"))
+
+    def next_timeout(self) -> Optional[float]:
+        if self.task_timeout <= 0:
+            return None
+        deadlines = [worker.started + self.task_timeout for worker in self.workers if worker.future is not None]
+        return max(0.0, min(deadlines) - time.monotonic()) if deadlines else None
+
+    def replace(self, worker: Worker, error: Optional[Exception]):
+        """Fail the worker's task with error and drop the worker; dispatch() starts a new one on demand."""
+        if worker.future is not None and not worker.future.done():
+            worker.future.set_exception(error)
+        worker.future = None
+        self.workers.remove(worker)
+        worker.stop()
+
+    def shutdown(self):
+        with self.lock:
+            self.closed = True
+            self.wakeup_writer.send_bytes(b"")
+            pending, self.queue = list(self.queue), collections.deque()
+        self.thread.join(timeout=5)
+        for _, _, future in pending:
+            future.cancel()
+        for worker in self.workers:
+            if worker.future is not None and not worker.future.done():
+                worker.future.set_exception(RuntimeError("Extraction pool is shut down"))
+            try:
+                worker.conn.send(None)
+            except OSError:
+                pass
+            worker.stop()
+        self.workers = []
+
+    def get_stats(self) -> dict:
+        stats = dict(self.stats)
+        stats["workers"] = len(self.workers)
+        stats["queued"] = len(self.queue)
+        return stats
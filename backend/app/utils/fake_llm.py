@@ -0,0 +1,144 @@
+"""Deterministic local stand-in for the Gemini API (LLM_PROVIDER=fake).
+
+Answers every prompt the app sends without a network or an API key, so the parse -> dedup -> classify
+path can be benchmarked and load-tested offline. The same prompt always gets the same answer; schema-
+constrained calls get JSON shaped by their response_schema. Each call takes LLM_FAKE_LATENCY_MS (plus
+LLM_FAKE_MS_PER_1K_TOKENS per thousand prompt tokens), and LLM_FAKE_ERROR_RATE of calls fail with
+ServiceUnavailable, drawn from a generator seeded with LLM_FAKE_SEED.
+"""
+import asyncio
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+import types
+from typing import Optional
+from google.api_core.exceptions import ServiceUnavailable
+from app.core.config import settings
+
+REQUEST_TYPES = [
+    ("Money Movement", "Outbound"),
+    ("Money Movement", "Inbound"),
+    ("Adjustment", "Reallocation Fees"),
+    ("Closing Notice", "Amendment Fees"),
+    ("Fee Payment", "Ongoing Fee"),
+    ("Commitment Change", "Cashless Roll")
+]
+ENTITY_TYPES = ("ORG", "MONEY", "DATE", "ACCOUNT")
+# Sections the app numbers in batched prompts ("Candidate 2:", "Email 3:"); one array item per section
+NUMBERED_SECTION = re.compile(r"^\s*(?:Candidate|Email) (\d+):", re.MULTILINE)
+WORD = re.compile(r"[A-Za-z][A-Za-z\-]{3,}")
+
+
+def prompt_text(prompt: str) -> str:
+    """The email text a prompt carries (everything after its 'Text:' or 'result:' marker)."""
+    match = re.search(r"^\s*(?:Text|result|New email):(.*)", prompt, flags=re.MULTILINE | re.DOTALL)
+    return (match.group(1) if match else prompt).strip()
+
+
+class FakeGenerativeModel:
+    """Same surface as LazyGenerativeModel: model_name, load(), generate_content and generate_content_async."""
+
+    def __init__(self, model_name: str, latency: Optional[float] = None, ms_per_1k_tokens: Optional[float] = None,
+                 error_rate: Optional[float] = None, seed: Optional[int] = None):
+        # Distinct from the real model's name, so fake answers never land in the real LLM cache entries
+        self.model_name = f"fake/{model_name.split('/')[-1]}"
+        self.latency = settings.LLM_FAKE_LATENCY_MS / 1000 if latency is None else latency
+        self.seconds_per_1k_tokens = (settings.LLM_FAKE_MS_PER_1K_TOKENS if ms_per_1k_tokens is None
+                                      else ms_per_1k_tokens) / 1000
+        self.error_rate = settings.LLM_FAKE_ERROR_RATE if error_rate is None else error_rate
+        self.random = random.Random(settings.LLM_FAKE_SEED if seed is None else seed)
+        self.lock = threading.Lock()
+        self.model = None
+        self.calls = 0
+
+    def load(self):
+        self.model = self
+        return self
+
+    def delay(self, prompt: str) -> float:
+        return self.latency + self.seconds_per_1k_tokens * len(prompt) / 4 / 1000
+
+    def next_call(self):
+        self.load()
+        with self.lock:
+            self.calls += 1
+            failed = self.random.random() < self.error_rate
+        if failed:
+            raise ServiceUnavailable("Fake LLM backend unavailable")
+
+    def generate_content(self, prompt, generation_config=None):
+        time.sleep(self.delay(prompt))
+        self.next_call()
+        return self.respond(prompt, generation_config)
+
+    async def generate_content_async(self, prompt, generation_config=None):
+        await asyncio.sleep(self.delay(prompt))
+        self.next_call()
+        return self.respond(prompt, generation_config)
+
+    def respond(self, prompt: str, generation_config=None):
+        seed = int.from_bytes(hashlib.sha256(prompt.encode("utf-8")).digest()[:8], "big")
+        schema = (generation_config or {}).get("response_schema")
+        if schema is not None:
+            text = json.dumps(self.from_schema(schema, prompt, random.Random(seed)))
+        else:
+            text = self.answer(prompt, random.Random(seed))
+        prompt_tokens = len(prompt) // 4 + 1
+        output_tokens = len(text) // 4 + 1
+        usage = types.SimpleNamespace(prompt_token_count=prompt_tokens, candidates_token_count=output_tokens,
+                                      total_token_count=prompt_tokens + output_tokens)
+        return types.SimpleNamespace(text=text, usage_metadata=usage)
+
+    def answer(self, prompt: str, rng: random.Random) -> str:
+        """Free-text answers in the formats the app's prompts ask for."""
+        words = WORD.findall(prompt_text(prompt)) or ["request"]
+        if "Compare the following two emails" in prompt:
+            return str(rng.randint(0, 100))
+        if "Extract financial entities" in prompt:
+            entities = sorted(set(rng.sample(words, min(3, len(words)))))
+            return "\n".join(f"Entity: {entity}, Type: {rng.choice(ENTITY_TYPES)}, "
+                             f"Confidence Score: {rng.uniform(0.8, 1.0):.2f}" for entity in entities)
+        if "Extract key phrases" in prompt:
+            return ", ".join(word.lower() for word in rng.sample(words, min(5, len(words))))
+        if "Categorize" in prompt:
+            request_type, sub_type = rng.choice(REQUEST_TYPES)
+            return (f"Request Type: {request_type}\nRequest Sub Type: {sub_type}\n"
+                    f"Deal Name: {rng.choice(words)}\nConfidence Score: {rng.uniform(0.6, 1.0):.2f}")
+        sentences = re.split(r"(?<=[.!?])\s+", prompt_text(prompt))
+        return " ".join(sentences[:4]) or "No content."
+
+    def from_schema(self, schema: dict, prompt: str, rng: random.Random, name: str = "", number: int = 1):
+        """A value matching a (Gemini subset of) JSON schema.
+
+        Arrays of objects with an integer field ("candidate", "email") get one item per numbered section.
+        """
+        kind = schema.get("type")
+        if kind == "object":
+            return {key: self.from_schema(value, prompt, rng, key, number)
+                    for key, value in schema.get("properties", {}).items()}
+        if kind == "array":
+            items = schema.get("items", {})
+            numbered = any(value.get("type") == "integer" for value in items.get("properties", {}).values())
+            numbers = [int(found) for found in NUMBERED_SECTION.findall(prompt)] if numbered else []
+            if not numbers:
+                numbers = range(1, rng.randint(1, 3) + 1)
+            return [self.from_schema(items, prompt, rng, name, found) for found in numbers]
+        if kind == "integer":
+            return number
+        if kind == "number":
+            return round(rng.uniform(0.5, 1.0), 2) if "confidence" in name else float(rng.randint(0, 100))
+        if kind == "boolean":
+            return rng.random() < 0.5
+        words = WORD.findall(prompt_text(prompt)) or ["request"]
+        if name == "type":
+            return rng.choice(ENTITY_TYPES)
+        if name == "request_type":
+            return rng.choice(REQUEST_TYPES)[0]
+        if name == "request_sub_type":
+            return rng.choice(REQUEST_TYPES)[1]
+        if name == "summary":
+            return " ".join(rng.sample(words, min(12, len(words)))) + "."
+        return rng.choice(words)
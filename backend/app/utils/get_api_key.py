@@ -1,8 +1,9 @@
 import os
+from typing import Optional
 from dotenv import load_dotenv
 
 load_dotenv()
 
-def api_key() -> str:
-    api_key = os.environ.get("GEMINI_API_KEY")    
-    return api_key
\ No newline at end of file
+def api_key() -> Optional[str]:
+    """The Gemini API key, or None when GEMINI_API_KEY is unset (only calls to the Gemini API need it)."""
+    return os.environ.get("GEMINI_API_KEY") or None
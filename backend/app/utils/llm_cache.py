@@ -0,0 +1,185 @@
+import asyncio
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+from app.core.config import settings
+from app.utils.llm_client import llm_client
+
+logger = logging.getLogger(__name__)
+
+# Expired and over-limit disk rows are pruned once every PRUNE_INTERVAL writes
+PRUNE_INTERVAL = 100
+
+
+class LLMCache:
+    """Two-tier LLM response cache: an in-memory LRU per process over a SQLite file shared by workers."""
+
+    def __init__(self, path: str, ttl_seconds: int, memory_entries: int, disk_entries: int):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.memory_entries = memory_entries
+        self.disk_entries = disk_entries
+        self.memory = OrderedDict()
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.writes = 0
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0}
+
+    @staticmethod
+    def make_key(model_name: str, prompt: str, generation_config: Optional[dict] = None) -> str:
+        """Content address of a call: the model, the prompt and every generation parameter."""
+        payload = json.dumps([model_name, prompt, generation_config or {}], sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def connection(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            from app.db.sqlite_db_config import configure_connection
+            conn = configure_connection(sqlite3.connect(self.path, timeout=5))
+            conn.execute("CREATE TABLE IF NOT EXISTS LLM_CACHE "
+            "("
+            "CACHE_KEY TEXT PRIMARY KEY, "
+            "RESPONSE TEXT NOT NULL, "
+            "CREATED_AT REAL NOT NULL, "
+            "LAST_ACCESS REAL NOT NULL"
+            ")")
+            conn.execute("CREATE INDEX IF NOT EXISTS IDX_LLM_CACHE_LAST_ACCESS ON LLM_CACHE (LAST_ACCESS)")
+            conn.commit()
+            self.local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self.lock:
+            entry = self.memory.get(key)
+            if entry is not None:
+                response, created_at = entry
+                if now - created_at < self.ttl_seconds:
+                    self.memory.move_to_end(key)
+                    self.stats["memory_hits"] += 1
+                    return response
+                del self.memory[key]
+        try:
+            conn = self.connection()
+            row = conn.execute("SELECT RESPONSE, CREATED_AT FROM LLM_CACHE WHERE CACHE_KEY = ? AND CREATED_AT > ?",
+                (key, now - self.ttl_seconds)).fetchone()
+            if row:
+                conn.execute("UPDATE LLM_CACHE SET LAST_ACCESS = ? WHERE CACHE_KEY = ?", (now, key))
+                conn.commit()
+                self.remember(key, row[0], row[1])
+                with self.lock:
+                    self.stats["disk_hits"] += 1
+                return row[0]
+        except sqlite3.DatabaseError as e:
+            logger.warning("LLM cache read failed: %s", str(e))
+        with self.lock:
+            self.stats["misses"] += 1
+        return None
+
+    def set(self, key: str, response: str):
+        now = time.time()
+        self.remember(key, response, now)
+        try:
+            conn = self.connection()
+            conn.execute("INSERT OR REPLACE INTO LLM_CACHE (CACHE_KEY, RESPONSE, CREATED_AT, LAST_ACCESS) VALUES (?, ?, ?, ?)",
+                (key, response, now, now))
+            conn.commit()
+            with self.lock:
+                self.writes += 1
+                prune = self.writes % PRUNE_INTERVAL == 0
+            if prune:
+                self.prune(conn, now)
+        except sqlite3.DatabaseError as e:
+            logger.warning("LLM cache write failed: %s", str(e))
+
+    def remember(self, key: str, response: str, created_at: float):
+        with self.lock:
+            self.memory[key] = (response, created_at)
+            self.memory.move_to_end(key)
+            while len(self.memory) > self.memory_entries:
+                self.memory.popitem(last=False)
+                self.stats["evictions"] += 1
+
+    def prune(self, conn, now: float):
+        """Drop expired rows, then the least recently used rows beyond the disk limit."""
+        expired = conn.execute("DELETE FROM LLM_CACHE WHERE CREATED_AT <= ?", (now - self.ttl_seconds,)).rowcount
+        evicted = conn.execute("DELETE FROM LLM_CACHE WHERE CACHE_KEY IN "
+            "(SELECT CACHE_KEY FROM LLM_CACHE ORDER BY LAST_ACCESS DESC LIMIT -1 OFFSET ?)", (self.disk_entries,)).rowcount
+        conn.commit()
+        with self.lock:
+            self.stats["evictions"] += expired + evicted
+
+    def get_stats(self) -> dict:
+        with self.lock:
+            stats = dict(self.stats)
+            stats["memory_entries"] = len(self.memory)
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["memory_hits"] + stats["disk_hits"]) / lookups if lookups else 0.0
+        return stats
+
+
+llm_cache = LLMCache(settings.LLM_CACHE_PATH, settings.LLM_CACHE_TTL_SECONDS,
+                     settings.LLM_CACHE_MEMORY_ENTRIES, settings.LLM_CACHE_DISK_ENTRIES)
+
+
+def is_cacheable(response_text: str, validate) -> bool:
+    if not response_text:
+        return False
+    if validate is None:
+        return True
+    try:
+        return validate(response_text) is not False
+    except ValueError:
+        return False
+
+
+def read_text(response) -> str:
+    """The response's stripped text; empty when it has none (Gemini raises ValueError for a blocked response)."""
+    try:
+        text = getattr(response, "text", None)
+    except ValueError as e:
+        logger.warning("LLM response has no text: %s", str(e))
+        return ""
+    return text.strip() if text else ""
+
+
+def cached_generate_content(model, prompt: str, generation_config: Optional[dict] = None, validate=None) -> str:
+    """Call model.generate_content through the response cache and the shared LLM client, returning the stripped text.
+
+    validate, if given, parses the text; responses it rejects (raises ValueError or returns False)
+    are returned but not cached, so a retry reaches the model again.
+    """
+    key = None
+    if settings.LLM_CACHE_ENABLED:
+        key = LLMCache.make_key(getattr(model, "model_name", type(model).__name__), prompt, generation_config)
+        cached = llm_cache.get(key)
+        if cached is not None:
+            return cached
+    response = llm_client.generate(model, prompt, generation_config)
+    response_text = read_text(response)
+    if key is not None and is_cacheable(response_text, validate):
+        llm_cache.set(key, response_text)
+    return response_text
+
+
+async def cached_generate_content_async(model, prompt: str, generation_config: Optional[dict] = None, validate=None) -> str:
+    """Async counterpart of cached_generate_content using model.generate_content_async.
+
+    Cache disk I/O runs in a worker thread so the event loop never waits on SQLite.
+    """
+    key = None
+    if settings.LLM_CACHE_ENABLED:
+        key = LLMCache.make_key(getattr(model, "model_name", type(model).__name__), prompt, generation_config)
+        cached = await asyncio.to_thread(llm_cache.get, key)
+        if cached is not None:
+            return cached
+    response = await llm_client.generate_async(model, prompt, generation_config)
+    response_text = read_text(response)
+    if key is not None and is_cacheable(response_text, validate):
+        await asyncio.to_thread(llm_cache.set, key, response_text)
+    return response_text
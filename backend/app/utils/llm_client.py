@@ -0,0 +1,372 @@
+"""Shared client layer for every LLM call: quotas, adaptive concurrency, retries and a circuit breaker.
+
+All Gemini calls go through cached_generate_content(_async), which calls the model through llm_client:
+
+- Token buckets on requests/min and tokens/min. With LLM_RATE_LIMIT_PATH their state lives in a SQLite
+  file, so all workers draw on one quota.
+- AIMD concurrency: the number of calls in flight grows by one per window of successes, and halves when
+  the API throttles.
+- Retries of transient errors, with full-jitter exponential backoff that honours retry-after.
+- A circuit breaker that fails fast after repeated server errors, then lets one probe call through.
+"""
+import asyncio
+import logging
+import random
+import sqlite3
+import threading
+import time
+from typing import Optional
+from app.core.config import settings
+from app.utils.prompt_budget import count_tokens
+
+logger = logging.getLogger(__name__)
+
+# HTTP statuses worth retrying; 429 and 503 also mean the API wants less concurrency
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+THROTTLE_STATUS = {429, 503}
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised without calling the API while the circuit breaker is open."""
+
+
+def error_status(error) -> Optional[int]:
+    """HTTP status of an API error (google.api_core exceptions carry it as .code)."""
+    code = getattr(error, "code", None)
+    return code if isinstance(code, int) else None
+
+
+def is_retryable(error) -> bool:
+    if isinstance(error, (TimeoutError, asyncio.TimeoutError, ConnectionError)):
+        return True
+    return error_status(error) in RETRYABLE_STATUS
+
+
+def retry_after_seconds(error) -> Optional[float]:
+    """Server-requested delay from a Retry-After header or a google.rpc.RetryInfo detail, if any."""
+    retry_after = getattr(error, "retry_after", None)
+    if retry_after is not None:
+        return float(retry_after)
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    value = headers.get("retry-after") or headers.get("Retry-After")
+    if value is not None:
+        try:
+            return float(value)
+        except ValueError:
+            pass  # An HTTP date; fall back to backoff
+    for detail in getattr(error, "details", None) or ():
+        delay = getattr(detail, "retry_delay", None)
+        if delay is not None:
+            return delay.seconds + delay.nanos / 1e9
+    return None
+
+
+def backoff_delay(attempt: int, retry_after: Optional[float] = None) -> float:
+    """Seconds to wait before retry number attempt (0-based): full jitter, or retry-after plus jitter."""
+    if retry_after is not None:
+        return retry_after + random.uniform(0, settings.LLM_BACKOFF_BASE_SECONDS)
+    ceiling = min(settings.LLM_BACKOFF_MAX_SECONDS, settings.LLM_BACKOFF_BASE_SECONDS * 2 ** attempt)
+    return random.uniform(0, ceiling)
+
+
+def estimate_tokens(prompt: str) -> int:
+    """Estimated prompt tokens plus the expected response."""
+    return count_tokens(prompt) + settings.LLM_OUTPUT_TOKENS_ESTIMATE
+
+
+class TokenBucket:
+    """Token bucket refilled at per_minute / 60 per second, holding at most burst (default a minute's worth).
+
+    reserve() takes tokens immediately, going into debt if needed, and returns how long the caller must
+    wait; callers queue up in reservation order. With a path, the bucket is a row of a SQLite file
+    shared by every process using it; otherwise it is per process. per_minute <= 0 disables it.
+    """
+
+    def __init__(self, name: str, per_minute: float, path: Optional[str] = None, burst: Optional[float] = None):
+        self.name = name
+        self.rate = per_minute / 60.0
+        self.capacity = float(per_minute if burst is None else burst)
+        self.path = path
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.tokens = self.capacity
+        self.updated = time.time()
+
+    def connection(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            from app.db.sqlite_db_config import configure_connection
+            conn = configure_connection(sqlite3.connect(self.path, timeout=5))
+            conn.execute("CREATE TABLE IF NOT EXISTS LLM_RATE_LIMIT "
+            "("
+            "BUCKET TEXT PRIMARY KEY, "
+            "TOKENS REAL NOT NULL, "
+            "UPDATED_AT REAL NOT NULL"
+            ")")
+            conn.commit()
+            self.local.conn = conn
+        return conn
+
+    def take(self, tokens: float, updated: float, amount: float, now: float):
+        tokens = min(self.capacity, min(self.capacity, tokens + (now - updated) * self.rate) - amount)
+        return tokens, max(0.0, -tokens / self.rate)
+
+    def reserve(self, amount: float) -> float:
+        """Take amount tokens and return the seconds to wait before using them."""
+        if self.rate <= 0 or amount == 0:
+            return 0.0
+        now = time.time()
+        if self.path:
+            try:
+                return self.reserve_shared(amount, now)
+            except sqlite3.DatabaseError as e:
+                logger.warning("Shared rate limit unavailable, using the per-process bucket: %s", str(e))
+        with self.lock:
+            self.tokens, wait = self.take(self.tokens, self.updated, amount, now)
+            self.updated = now
+        return wait
+
+    def reserve_shared(self, amount: float, now: float) -> float:
+        conn = self.connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT TOKENS, UPDATED_AT FROM LLM_RATE_LIMIT WHERE BUCKET = ?", (self.name,)).fetchone()
+            tokens, updated = row if row else (self.capacity, now)
+            tokens, wait = self.take(tokens, updated, amount, now)
+            conn.execute("INSERT OR REPLACE INTO LLM_RATE_LIMIT (BUCKET, TOKENS, UPDATED_AT) VALUES (?, ?, ?)",
+                (self.name, tokens, now))
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        return wait
+
+    def refund(self, amount: float):
+        """Give back over-reserved tokens (or, negative, take the shortfall) once the real cost is known."""
+        self.reserve(-amount)
+
+
+class AdaptiveLimiter:
+    """AIMD limit on calls in flight: +1/limit per success, halved on throttling, within [minimum, maximum]."""
+
+    def __init__(self, initial: int, minimum: int, maximum: int):
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.limit = float(min(max(initial, self.minimum), self.maximum))
+        self.in_flight = 0
+        self.condition = threading.Condition()
+
+    def try_acquire(self) -> bool:
+        with self.condition:
+            if self.in_flight < int(self.limit):
+                self.in_flight += 1
+                return True
+            return False
+
+    def acquire(self):
+        with self.condition:
+            while self.in_flight >= int(self.limit):
+                self.condition.wait()
+            self.in_flight += 1
+
+    async def acquire_async(self):
+        # Polling keeps waiting coroutines off the thread pool, which a blocking wait would exhaust
+        delay = 0.005
+        while not self.try_acquire():
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 0.1)
+
+    def release(self, throttled: bool = False, succeeded: bool = False):
+        with self.condition:
+            self.in_flight -= 1
+            if throttled:
+                self.limit = max(self.minimum, self.limit / 2)
+            elif succeeded:
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            self.condition.notify_all()
+
+
+class CircuitBreaker:
+    """Opens after failure_threshold consecutive failures; after reset_seconds one probe call may pass."""
+
+    def __init__(self, failure_threshold: int, reset_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+        self.lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "half-open" if time.monotonic() - self.opened_at >= self.reset_seconds else "open"
+
+    def check(self):
+        if self.failure_threshold <= 0:
+            return
+        with self.lock:
+            if self.opened_at is None:
+                return
+            if time.monotonic() - self.opened_at < self.reset_seconds or self.probing:
+                raise CircuitOpenError("LLM circuit breaker is open after repeated API failures")
+            self.probing = True
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.probing = False
+
+    def abandon_probe(self):
+        """A probe that ended without an answer from the API (cancelled) frees the slot for another."""
+        with self.lock:
+            self.probing = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.probing or (self.failure_threshold > 0 and self.failures >= self.failure_threshold):
+                if self.opened_at is None or self.probing:
+                    logger.error("LLM circuit breaker opened after %d failures", self.failures)
+                self.opened_at = time.monotonic()
+                self.probing = False
+
+
+class LLMClient:
+    """Calls model.generate_content(_async) under the shared quotas, concurrency limit and breaker."""
+
+    def __init__(self, requests_per_minute: float, tokens_per_minute: float, rate_limit_path: Optional[str],
+                 concurrency: int, min_concurrency: int, max_concurrency: int, max_retries: int,
+                 failure_threshold: int, reset_seconds: float):
+        self.requests = TokenBucket("requests", requests_per_minute, rate_limit_path)
+        self.tokens = TokenBucket("tokens", tokens_per_minute, rate_limit_path)
+        self.limiter = AdaptiveLimiter(concurrency, min_concurrency, max_concurrency)
+        self.breaker = CircuitBreaker(failure_threshold, reset_seconds)
+        self.max_retries = max_retries
+        self.lock = threading.Lock()
+        self.stats = {"calls": 0, "retries": 0, "throttled": 0, "failures": 0, "rejected": 0, "rate_limited_seconds": 0.0}
+
+    def count(self, name, amount=1):
+        with self.lock:
+            self.stats[name] += amount
+
+    def reserve(self, prompt: str):
+        """Reserve quota for one call; returns (estimated tokens, seconds to wait)."""
+        estimate = estimate_tokens(prompt)
+        wait = max(self.requests.reserve(1), self.tokens.reserve(estimate))
+        if wait:
+            self.count("rate_limited_seconds", wait)
+        return estimate, wait
+
+    def settle(self, response, estimate: int):
+        usage = getattr(response, "usage_metadata", None)
+        used = getattr(usage, "total_token_count", None)
+        if isinstance(used, int) and used != estimate:
+            self.tokens.refund(estimate - used)
+
+    def check_breaker(self):
+        try:
+            self.breaker.check()
+        except CircuitOpenError:
+            self.count("rejected")
+            raise
+
+    def on_error(self, error, attempt: int) -> float:
+        """Release bookkeeping for a failed call; return the retry delay, or re-raise if not retryable."""
+        status = error_status(error)
+        throttled = status in THROTTLE_STATUS
+        self.limiter.release(throttled=throttled)
+        if throttled:
+            self.count("throttled")
+        if not is_retryable(error):
+            # A client error (bad request, auth) still means the API answered
+            self.breaker.record_success()
+            raise error
+        if throttled:
+            # The API is up and asking for less load, which the limiter handles; not an outage
+            self.breaker.record_success()
+        else:
+            self.breaker.record_failure()
+        if attempt >= self.max_retries:
+            self.count("failures")
+            raise error
+        self.count("retries")
+        delay = backoff_delay(attempt, retry_after_seconds(error))
+        logger.warning("LLM call failed (%s), retry %d in %.1fs", status or type(error).__name__, attempt + 1, delay)
+        return delay
+
+    def on_success(self):
+        self.limiter.release(succeeded=True)
+        self.breaker.record_success()
+
+    def generate(self, model, prompt: str, generation_config: Optional[dict] = None):
+        for attempt in range(self.max_retries + 1):
+            self.check_breaker()
+            estimate, wait = self.reserve(prompt)
+            if wait:
+                time.sleep(wait)
+            self.limiter.acquire()
+            self.count("calls")
+            try:
+                if generation_config is None:
+                    response = model.generate_content(prompt)
+                else:
+                    response = model.generate_content(prompt, generation_config=generation_config)
+            except Exception as e:
+                time.sleep(self.on_error(e, attempt))
+                continue
+            self.on_success()
+            self.settle(response, estimate)
+            return response
+
+    async def generate_async(self, model, prompt: str, generation_config: Optional[dict] = None):
+        for attempt in range(self.max_retries + 1):
+            self.check_breaker()
+            if self.requests.path or self.tokens.path:
+                estimate, wait = await asyncio.to_thread(self.reserve, prompt)
+            else:
+                estimate, wait = self.reserve(prompt)
+            if wait:
+                await asyncio.sleep(wait)
+            await self.limiter.acquire_async()
+            self.count("calls")
+            try:
+                if generation_config is None:
+                    response = await model.generate_content_async(prompt)
+                else:
+                    response = await model.generate_content_async(prompt, generation_config=generation_config)
+            except asyncio.CancelledError:
+                self.limiter.release()
+                self.breaker.abandon_probe()
+                raise
+            except Exception as e:
+                await asyncio.sleep(self.on_error(e, attempt))
+                continue
+            self.on_success()
+            if self.tokens.path:
+                # The refund writes the shared bucket's database row
+                await asyncio.to_thread(self.settle, response, estimate)
+            else:
+                self.settle(response, estimate)
+            return response
+
+    def get_stats(self) -> dict:
+        with self.lock:
+            stats = dict(self.stats)
+        with self.limiter.condition:
+            stats["concurrency_limit"] = round(self.limiter.limit, 2)
+            stats["in_flight"] = self.limiter.in_flight
+        stats["circuit"] = self.breaker.state
+        return stats
+
+
+def create_client(rate_limit_path: Optional[str] = None) -> LLMClient:
+    return LLMClient(settings.LLM_REQUESTS_PER_MINUTE, settings.LLM_TOKENS_PER_MINUTE, rate_limit_path,
+                     settings.LLM_CONCURRENCY, settings.LLM_MIN_CONCURRENCY, settings.LLM_MAX_CONCURRENCY,
+                     settings.LLM_MAX_RETRIES, settings.LLM_CIRCUIT_FAILURE_THRESHOLD, settings.LLM_CIRCUIT_RESET_SECONDS)
+
+
+llm_client = create_client(settings.LLM_RATE_LIMIT_PATH)
@@ -0,0 +1,288 @@
+"""Single-pass streaming MIME parser for EML messages.
+
+The message is read line by line from a binary stream, never as a whole: headers are parsed per part,
+and each leaf part's body is decoded (base64 / quoted-printable) as it is read into a Payload that stays
+in memory up to a size threshold and spills to a temporary file beyond it. Parts are yielded one at a
+time, so callers can hand a payload on and drop it before the next part is read.
+"""
+import binascii
+import hashlib
+import os
+import tempfile
+from email import policy
+from email.parser import BytesParser
+from typing import Iterator, List, Optional, Tuple, Union
+
+# Longest chunk read at once; longer lines (e.g. unwrapped binary) are read in several chunks
+CHUNK_SIZE = 64 * 1024
+HEADER_PARSER = BytesParser(policy=policy.default)
+
+
+class EmailTooLargeError(ValueError):
+    """The message exceeds a configured size or attachment limit."""
+
+
+class LineReader:
+    """Reads a binary stream in lines of at most CHUNK_SIZE bytes, enforcing a total size limit."""
+
+    def __init__(self, stream, max_bytes: int):
+        self.stream = stream
+        self.max_bytes = max_bytes
+        self.read_bytes = 0
+        self.pushed_back = None
+        # Whether the next chunk starts a new line; only those can be boundary delimiters
+        self.at_line_start = True
+
+    def readline(self) -> Tuple[bytes, bool]:
+        """Return (chunk, chunk starts a line); the chunk is empty at the end of the stream."""
+        if self.pushed_back is not None:
+            chunk, self.pushed_back = self.pushed_back, None
+            return chunk
+        line_start = self.at_line_start
+        line = self.stream.readline(CHUNK_SIZE)
+        self.read_bytes += len(line)
+        if 0 < self.max_bytes < self.read_bytes:
+            raise EmailTooLargeError(f"Email is larger than {self.max_bytes} bytes")
+        self.at_line_start = line.endswith(b"\n")
+        return line, line_start
+
+    def push_back(self, chunk: Tuple[bytes, bool]):
+        self.pushed_back = chunk
+
+
+class Payload:
+    """Decoded body of one part: bytes in memory up to spool_bytes, a temporary file in spool_dir beyond.
+
+    The SHA-256 of the content is computed while it is written, so callers can key caches without rereading it.
+    """
+
+    def __init__(self, spool_bytes: int, spool_dir: Optional[str] = None):
+        self.spool_bytes = spool_bytes
+        self.spool_dir = spool_dir
+        self.buffer = bytearray()
+        self.file = None
+        self.path = None
+        self.size = 0
+        self.digest = hashlib.sha256()
+
+    def write(self, data: bytes):
+        if not data:
+            return
+        self.size += len(data)
+        self.digest.update(data)
+        if self.file is None and len(self.buffer) + len(data) > self.spool_bytes:
+            descriptor, self.path = tempfile.mkstemp(suffix=".part", dir=self.spool_dir)
+            self.file = os.fdopen(descriptor, "wb")
+            self.file.write(self.buffer)
+            self.buffer = bytearray()
+        if self.file is not None:
+            self.file.write(data)
+        else:
+            self.buffer += data
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+
+    def sha256(self) -> str:
+        """Hex SHA-256 of the decoded payload, computed as it was written."""
+        return self.digest.hexdigest()
+
+    def content(self) -> Union[bytes, str]:
+        """The payload as bytes, or as the path of its spool file when it was too large for memory."""
+        return self.path if self.path is not None else bytes(self.buffer)
+
+    def read(self) -> bytes:
+        if self.path is None:
+            return bytes(self.buffer)
+        with open(self.path, "rb") as f:
+            return f.read()
+
+    def discard(self):
+        self.buffer = bytearray()
+        if self.path is not None:
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+            self.path = None
+
+
+class Base64Decoder:
+    def __init__(self):
+        self.pending = b""
+
+    def decode(self, data: bytes) -> bytes:
+        data = self.pending + data.translate(None, b" \t\r\n")
+        usable = len(data) - len(data) % 4
+        self.pending = data[usable:]
+        try:
+            return binascii.a2b_base64(data[:usable]) if usable else b""
+        except binascii.Error:
+            return b""
+
+    def flush(self) -> bytes:
+        pending, self.pending = self.pending, b""
+        if not pending:
+            return b""
+        try:
+            return binascii.a2b_base64(pending + b"=" * (-len(pending) % 4))
+        except binascii.Error:
+            return b""
+
+
+class QuotedPrintableDecoder:
+    def decode(self, data: bytes) -> bytes:
+        # Line breaks come out as \n, as with email.message.get_payload(decode=True)
+        return binascii.a2b_qp(data.replace(b"\r\n", b"\n"))
+
+    def flush(self) -> bytes:
+        return b""
+
+
+class IdentityDecoder:
+    def decode(self, data: bytes) -> bytes:
+        return data
+
+    def flush(self) -> bytes:
+        return b""
+
+
+DECODERS = {"base64": Base64Decoder, "quoted-printable": QuotedPrintableDecoder}
+
+
+class Part:
+    """A leaf MIME part: its headers (an email.message.EmailMessage without body) and decoded payload."""
+
+    def __init__(self, headers, payload: Payload):
+        self.headers = headers
+        self.payload = payload
+
+    def get_content_type(self) -> str:
+        return self.headers.get_content_type()
+
+    def get_content_charset(self) -> Optional[str]:
+        return self.headers.get_content_charset()
+
+    def get_content_disposition(self) -> Optional[str]:
+        return self.headers.get_content_disposition()
+
+    def get_filename(self) -> Optional[str]:
+        return self.headers.get_filename()
+
+    def text(self) -> str:
+        """The payload decoded with the part's charset, line breaks normalized to \n."""
+        text = self.payload.read().decode(self.get_content_charset() or "utf-8", errors="ignore")
+        return text.replace("\r\n", "\n")
+
+
+def strip_eol(line: bytes) -> Tuple[bytes, bytes]:
+    if line.endswith(b"\r\n"):
+        return line[:-2], b"\r\n"
+    if line.endswith(b"\n"):
+        return line[:-1], b"\n"
+    return line, b""
+
+
+def match_delimiter(line: bytes, boundaries: List[bytes]) -> Optional[Tuple[bytes, bool]]:
+    """(boundary, is closing delimiter) if line delimits one of the open multiparts, innermost first."""
+    if not line.startswith(b"--"):
+        return None
+    stripped = line.rstrip()
+    for boundary in reversed(boundaries):
+        if stripped == b"--" + boundary:
+            return boundary, False
+        if stripped == b"--" + boundary + b"--":
+            return boundary, True
+    return None
+
+
+class MimeStreamParser:
+    """Walks a message from a binary stream and yields its leaf Parts in document order.
+
+    max_bytes caps the raw message size (0 = unlimited); payloads over spool_bytes go to files in spool_dir.
+    """
+
+    def __init__(self, stream, max_bytes: int = 0, spool_bytes: int = 1024 * 1024, spool_dir: Optional[str] = None):
+        self.reader = LineReader(stream, max_bytes)
+        self.spool_bytes = spool_bytes
+        self.spool_dir = spool_dir
+        self.headers = None
+
+    def parts(self) -> Iterator[Part]:
+        self.headers = self.read_headers([])
+        yield from self.walk(self.headers, [])
+
+    def read_headers(self, boundaries: List[bytes]):
+        lines = []
+        while True:
+            chunk = self.reader.readline()
+            line, line_start = chunk
+            if not line:
+                break
+            if line_start and match_delimiter(line, boundaries):
+                # A part without a blank line after its headers ends here
+                self.reader.push_back(chunk)
+                break
+            if line_start and line in (b"\r\n", b"\n"):
+                break
+            lines.append(line)
+        return HEADER_PARSER.parsebytes(b"".join(lines), headersonly=True)
+
+    def walk(self, headers, boundaries: List[bytes]):
+        """Yield the leaf parts under headers; return the delimiter that ended them (None at end of stream)."""
+        boundary = headers.get_boundary() if headers.get_content_maintype() == "multipart" else None
+        if not boundary:
+            return (yield from self.read_leaf(headers, boundaries))
+        inner = boundaries + [boundary.encode("latin-1", errors="replace")]
+        # Preamble up to the first delimiter
+        delimiter = self.skip_until_delimiter(inner)
+        while delimiter is not None and delimiter[0] == inner[-1] and not delimiter[1]:
+            delimiter = yield from self.walk(self.read_headers(inner), inner)
+        if delimiter is not None and delimiter[0] == inner[-1]:
+            # Closing delimiter: the epilogue runs to the enclosing multipart's next delimiter
+            delimiter = self.skip_until_delimiter(boundaries)
+        return delimiter
+
+    def skip_until_delimiter(self, boundaries: List[bytes]):
+        while True:
+            line, line_start = self.reader.readline()
+            if not line:
+                return None
+            if line_start:
+                delimiter = match_delimiter(line, boundaries)
+                if delimiter is not None:
+                    return delimiter
+
+    def read_leaf(self, headers, boundaries: List[bytes]):
+        payload = Payload(self.spool_bytes, self.spool_dir)
+        decoder = DECODERS.get(str(headers.get("Content-Transfer-Encoding", "")).strip().lower(), IdentityDecoder)()
+        # The line break before a delimiter belongs to the delimiter, so each line is held back until the next;
+        # lines are decoded and written in blocks of about CHUNK_SIZE
+        held = None
+        block, block_size = [], 0
+        delimiter = None
+        try:
+            while True:
+                line, line_start = self.reader.readline()
+                if not line:
+                    break
+                if line_start:
+                    delimiter = match_delimiter(line, boundaries)
+                    if delimiter is not None:
+                        break
+                if held is not None:
+                    block.append(held)
+                    block_size += len(held)
+                    if block_size >= CHUNK_SIZE:
+                        payload.write(decoder.decode(b"".join(block)))
+                        block, block_size = [], 0
+                held = line
+            if held is not None:
+                block.append(strip_eol(held)[0] if delimiter is not None else held)
+            payload.write(decoder.decode(b"".join(block)))
+            payload.write(decoder.flush())
+        finally:
+            payload.close()
+        yield Part(headers, payload)
+        return delimiter
@@ -0,0 +1,129 @@
+"""Process-wide models, loaded on first use.
+
+Importing the app must stay cheap: the sentence-transformer weights and the Gemini client library are
+only imported when a request first needs them (or by warm_up(), which the startup hook can run in the
+background with MODEL_WARMUP=true).
+
+LLM models come from the provider named by LLM_PROVIDER: "gemini", "fake" (the deterministic offline
+stand-in in app.utils.fake_llm) or a "package.module:Class" path. A provider class is built with the
+model name and offers model_name, load(), generate_content and generate_content_async.
+"""
+import importlib
+import logging
+import threading
+import numpy as np
+from app.core.config import settings
+from app.utils.get_api_key import api_key
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_MODEL_NAME = 'all-MiniLM-L6-v2'
+
+load_lock = threading.RLock()
+embedding_model = None
+gemini_configured = False
+gemini_models = {}
+
+
+def get_embedding_model():
+    """Return the shared SentenceTransformer, loading it on the first call."""
+    global embedding_model
+    if embedding_model is None:
+        with load_lock:
+            if embedding_model is None:
+                from sentence_transformers import SentenceTransformer
+                logger.info("Loading embedding model %s", EMBEDDING_MODEL_NAME)
+                embedding_model = SentenceTransformer(EMBEDDING_MODEL_NAME)
+    return embedding_model
+
+
+def encode_texts(texts):
+    """Normalized float32 embeddings of texts with the in-process model."""
+    vectors = get_embedding_model().encode(texts, convert_to_numpy=True, normalize_embeddings=True)
+    return np.asarray(vectors, dtype=np.float32)
+
+
+def configure_gemini():
+    global gemini_configured
+    if not gemini_configured:
+        with load_lock:
+            if not gemini_configured:
+                key = api_key()
+                if not key:
+                    raise RuntimeError("GEMINI_API_KEY is not set (use LLM_PROVIDER=fake to run without the Gemini API)")
+                try:
+                    import google.generativeai as genai
+                    genai.configure(api_key=key)
+                except Exception as e:
+                    logger.critical("Failed to configure Gemini API", exc_info=True)
+                    raise RuntimeError("Gemini API configuration failed") from e
+                gemini_configured = True
+
+
+class LazyGenerativeModel:
+    """Stand-in for genai.GenerativeModel that imports and configures the client on the first call."""
+
+    def __init__(self, model_name: str):
+        # Same name GenerativeModel reports, so LLM cache keys do not change
+        self.model_name = model_name if "/" in model_name else f"models/{model_name}"
+        self.model = None
+
+    def load(self):
+        if self.model is None:
+            with load_lock:
+                if self.model is None:
+                    configure_gemini()
+                    import google.generativeai as genai
+                    self.model = genai.GenerativeModel(self.model_name)
+        return self.model
+
+    def generate_content(self, *args, **kwargs):
+        return self.load().generate_content(*args, **kwargs)
+
+    async def generate_content_async(self, *args, **kwargs):
+        return await self.load().generate_content_async(*args, **kwargs)
+
+
+# Built-in LLM providers; LLM_PROVIDER may also name any other class as "package.module:Class"
+LLM_PROVIDERS = {
+    "gemini": "app.utils.model_loader:LazyGenerativeModel",
+    "fake": "app.utils.fake_llm:FakeGenerativeModel"
+}
+
+
+def provider_class(provider: str):
+    module_name, _, class_name = LLM_PROVIDERS.get(provider, provider).partition(":")
+    if not class_name:
+        raise ValueError(f"Unknown LLM provider: {provider}")
+    return getattr(importlib.import_module(module_name), class_name)
+
+
+def gemini_model(model_name: str, provider: str = None):
+    """Return the process's shared lazy client for model_name from LLM_PROVIDER (or the given provider)."""
+    provider = provider or settings.LLM_PROVIDER
+    with load_lock:
+        if (provider, model_name) not in gemini_models:
+            gemini_models[(provider, model_name)] = provider_class(provider)(model_name)
+        return gemini_models[(provider, model_name)]
+
+
+def models_loaded() -> dict:
+    return {
+        "embedding_model": embedding_model is not None,
+        "llm_provider": settings.LLM_PROVIDER,
+        "gemini": sorted(model.model_name for model in gemini_models.values() if model.model is not None)
+    }
+
+
+def warm_up():
+    """Load the embedding model and every registered LLM client ahead of the first request.
+
+    With EMBEDDING_SERVER_URL set the embedding server holds the model, so the worker does not load one.
+    """
+    if not settings.EMBEDDING_SERVER_URL:
+        get_embedding_model()
+    with load_lock:
+        models = list(gemini_models.values())
+    for model in models:
+        model.load()
+    logger.info("Models warmed up: %s", models_loaded())
@@ -0,0 +1,137 @@
+"""Token budgets for LLM prompts: counting, truncation, chunking and the prioritized classify input.
+
+Token counts are estimated offline (a word or symbol is one token per four characters, at least one),
+which tracks Gemini's tokenizer closely enough for budgeting without an API round trip per prompt.
+"""
+import logging
+import re
+from typing import Dict, List, Optional
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+TERM_PATTERN = re.compile(r"[a-z0-9]{3,}")
+# Attachment text is ranked in sections of about this many tokens
+SECTION_TOKENS = 256
+STOPWORDS = {"the", "and", "for", "are", "with", "this", "that", "from", "you", "your", "our", "has", "have",
+             "was", "were", "will", "shall", "any", "all", "not", "per", "its", "into", "please", "regards"}
+
+
+def token_length(piece: str) -> int:
+    return max(1, (len(piece) + 3) // 4)
+
+
+def count_tokens(text: Optional[str]) -> int:
+    if not text:
+        return 0
+    return sum(token_length(match.group()) for match in TOKEN_PATTERN.finditer(text))
+
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    """The longest prefix of text within max_tokens, cut before the first token that does not fit."""
+    if max_tokens <= 0:
+        return text
+    used = 0
+    for match in TOKEN_PATTERN.finditer(text):
+        used += token_length(match.group())
+        if used > max_tokens:
+            return text[:match.start()].rstrip()
+    return text
+
+
+def split_tokens(text: str, max_tokens: int) -> List[str]:
+    """Split text into chunks of at most max_tokens, at line breaks where possible."""
+    if max_tokens <= 0 or count_tokens(text) <= max_tokens:
+        return [text] if text.strip() else []
+    chunks, lines, used = [], [], 0
+    for line in text.splitlines():
+        tokens = count_tokens(line)
+        if lines and used + tokens > max_tokens:
+            chunks.append("\n".join(lines))
+            lines, used = [], 0
+        while tokens > max_tokens:
+            # A single line over the budget (e.g. unwrapped OCR output) is cut by tokens
+            head = truncate_tokens(line, max_tokens) or line[:max_tokens * 4]
+            chunks.append(head)
+            line = line[len(head):].lstrip()
+            tokens = count_tokens(line)
+        if line.strip():
+            lines.append(line)
+            used += tokens
+    if lines:
+        chunks.append("\n".join(lines))
+    return chunks
+
+
+def fit_prompt(stage: str, text: str, max_tokens: Optional[int] = None) -> str:
+    """Truncate one stage's input to its token budget (LLM_STAGE_MAX_TOKENS) and log the counts."""
+    max_tokens = settings.LLM_STAGE_MAX_TOKENS if max_tokens is None else max_tokens
+    tokens = count_tokens(text)
+    if 0 < max_tokens < tokens:
+        text = truncate_tokens(text, max_tokens)
+        logger.info("LLM stage %s: %d input tokens, truncated from %d", stage, count_tokens(text), tokens)
+    else:
+        logger.info("LLM stage %s: %d input tokens", stage, tokens)
+    return text
+
+
+def pack_tokens(token_counts: List[int], max_tokens: int) -> List[List[int]]:
+    """Group consecutive positions so each group's token counts sum to at most max_tokens (0 = one group).
+
+    A single count over the budget still gets a group of its own.
+    """
+    groups, used = [], 0
+    for position, tokens in enumerate(token_counts):
+        if not groups or (0 < max_tokens < used + tokens):
+            groups.append([])
+            used = 0
+        groups[-1].append(position)
+        used += tokens
+    return groups
+
+
+def terms(text: str) -> List[str]:
+    return [term for term in TERM_PATTERN.findall(text.lower()) if term not in STOPWORDS]
+
+
+def rank_sections(body: str, attachments: List[Dict]) -> List[Dict]:
+    """Attachment text in sections of about SECTION_TOKENS, most relevant to the body first.
+
+    A section scores one per distinct body term it contains, plus one if it mentions an amount; ties keep
+    document order, so without a body the attachments' opening sections come first.
+    """
+    body_terms = set(terms(body))
+    sections = []
+    for attachment_position, attachment in enumerate(attachments):
+        text = attachment.get("extracted_text") or ""
+        for position, chunk in enumerate(split_tokens(text, SECTION_TOKENS)):
+            score = len(body_terms.intersection(terms(chunk))) + (1 if re.search(r"\d[\d,.]*\d", chunk) else 0)
+            sections.append({"filename": attachment.get("filename") or "attachment", "text": chunk, "score": score,
+                             "order": (position, attachment_position)})
+    return sorted(sections, key=lambda section: (-section["score"], section["order"]))
+
+
+def merge_for_prompt(body: Optional[str], attachments: List[Dict], max_tokens: Optional[int] = None) -> str:
+    """Body, then the highest-ranked attachment sections, within max_tokens (LLM_INPUT_MAX_TOKENS).
+
+    Stages that cap their own prompt truncate this text from the end, so they drop the least relevant
+    attachment sections first and the body last.
+    """
+    max_tokens = settings.LLM_INPUT_MAX_TOKENS if max_tokens is None else max_tokens
+    body = (body or "").strip()
+    parts = [truncate_tokens(body, max_tokens)] if body else []
+    used = count_tokens(parts[0]) if parts else 0
+    sections = rank_sections(body, attachments)
+    kept = 0
+    for section in sections:
+        text = f"[{section['filename']}]\n{section['text'].strip()}"
+        tokens = count_tokens(text)
+        if 0 < max_tokens < used + tokens:
+            break
+        parts.append(text)
+        used += tokens
+        kept += 1
+    if sections:
+        logger.info("Classify input: %d tokens, body and %d of %d attachment sections", used, kept, len(sections))
+    return "\n\n".join(parts)
@@ -1,35 +1,113 @@
-from app.db import check_duplicate_email
+import json
+from app.db import encode_emails, find_duplicate, index_email
+from app.db.fingerprint import body_hash
 
 
-def store_email(email: dict):
+def build_email(email: dict, has_attachment: bool):
   from app.db import Email
-  from app.db.email_repo import EmailRepo 
-  subject = email.get("subject")
-  sender = email.get("from")
-  recipients = email.get("to")
+  return Email({
+        "sender": email.get("from"),
+        "recipient": email.get("to"),
+        "subject": email.get("subject"),
+        "body": email.get("body", ""),
+        "s3_message_path": None,
+        "request_type": None,
+        "sub_request_type": None,
+        "processing_status": None,
+        "has_attachment": has_attachment,
+        "attachment_metadata": json.dumps(email["attachment_metadata"]) if email.get("attachment_metadata") else None,
+        "category_type": None,
+        "category": None
+    }, allows_missing_keys=True)
+
+
+def store_email(email: dict):
+  from app.db.email_repo import EmailRepo
   body = email.get("body", "")
   attachments = email.get("attachments")
   has_attachment = len(attachments) > 0 if attachments else False
-  is_duplicate = check_duplicate_email(body, has_attachment)
-  print("is_duplicate", is_duplicate)
-  if not is_duplicate: 
-    # Store email in database
-    email = Email({
-          "sender": sender,
-          "recipient": recipients,
-          "subject": subject,
-          "body": body,
-          "s3_message_path": None,
-          "request_type": None,
-          "sub_request_type": None,
-          "processing_status": None,
-          "has_attachment": has_attachment,
-          "attachment_metadata": None,
-          "category_type": None,
-          "category": None
-      }, allows_missing_keys=True)    
-    emailRepo = EmailRepo()
-    email_id = emailRepo.insert_email(email)
+  emailRepo = EmailRepo()
+  try:
+    # Cheapest stages first; a unique email comes back with the embedding the cascade computed for it
+    is_duplicate, email_embedding, stage = find_duplicate(body, has_attachment, emailRepo=emailRepo)
+    print("is_duplicate", is_duplicate, stage)
+    if not is_duplicate:
+      # Store email in database
+      email_id = emailRepo.insert_email(build_email(email, has_attachment))
+      if email_id is None and is_exact_duplicate(emailRepo, body):
+        # A concurrent upload of the same body won the insert
+        return {"email_id": None, "is_duplicate": True}
+      if email_id is not None:
+        index_email(email_id, email_embedding, email_body=body)
+      return {"email_id": email_id, "is_duplicate": is_duplicate}
+    return {"email_id": None, "is_duplicate": is_duplicate}
+  finally:
+    emailRepo.close()
+
+
+def is_exact_duplicate(emailRepo, body):
+  return emailRepo.get_email_id_by_body_hash(body_hash(body)) is not None
+
+
+def store_emails(emails: list, before_commit=None):
+  """Store a batch of parsed emails in a single transaction, returning one store_email result per email.
+
+  Every email is checked for duplicates first, LLM adjudication included, with bodies encoded in one
+  forward pass and emails found unique earlier in the batch counting as candidates for later ones. Only
+  then are the unique emails inserted and committed, so the write lock is held for the inserts alone. A
+  failed insert rolls back and raises for the whole batch.
+  before_commit(db_config, results) runs inside the transaction so callers can record their own progress
+  atomically with the batch.
+  """
+  from app.db import EmailRecord
+  from app.db.email_repo import EmailRepo
+  from app.db.track_emails import find_batch_duplicate, unindex_email
+  emailRepo = EmailRepo()
+  indexed = []
+  try:
+    # Only bodies without an exact stored duplicate need embedding
+    exact = [is_exact_duplicate(emailRepo, email.get("body", "")) for email in emails]
+    bodies = [email.get("body", "") for email, duplicate in zip(emails, exact) if not duplicate]
+    embeddings = iter(encode_emails(bodies) if bodies else [])
+    # Check phase: (record, embedding) of each unique email, None for duplicates
+    checks = []
+    for email, duplicate in zip(emails, exact):
+      body = email.get("body", "")
+      has_attachment = bool(email.get("attachments"))
+      is_duplicate, email_embedding, _ = find_duplicate(body, has_attachment,
+        email_embedding=None if duplicate else next(embeddings), emailRepo=emailRepo)
+      if not is_duplicate:
+        is_duplicate = find_batch_duplicate(body, has_attachment, email_embedding,
+                                            [checked for checked in checks if checked is not None])
+      checks.append(None if is_duplicate else (EmailRecord(body=body, has_attachment=has_attachment), email_embedding))
+
+    # Write phase: inserts only, in one short transaction
+    results = []
+    for email, checked in zip(emails, checks):
+      if checked is None:
+        results.append({"email_id": None, "is_duplicate": True})
+        continue
+      record, email_embedding = checked
+      email_id = emailRepo.insert_email(build_email(email, record.has_attachment), commit=False)
+      if email_id is None and is_exact_duplicate(emailRepo, record.body):
+        # A concurrent upload of the same body won the insert
+        results.append({"email_id": None, "is_duplicate": True})
+        continue
+      if email_id is None:
+        # Never report (or let before_commit checkpoint) an email that was not stored
+        raise RuntimeError("Could not insert an email of the batch; nothing of the batch was stored")
+      index_email(email_id, email_embedding, emailRepo.db_config, record.body)
+      indexed.append(email_id)
+      results.append({"email_id": email_id, "is_duplicate": False})
+    if before_commit is not None:
+      before_commit(emailRepo.db_config, results)
+    emailRepo.db_config.conn.commit()
+    return results
+  except Exception:
+    # Nothing of the batch was stored: forget what was already added to the in-memory indexes
+    emailRepo.db_config.conn.rollback()
+    for email_id in indexed:
+      unindex_email(email_id)
+    raise
+  finally:
     emailRepo.close()
-    return {"email_id": email_id, "is_duplicate": is_duplicate}
-  return {"email_id": None, "is_duplicate": is_duplicate}
\ No newline at end of file
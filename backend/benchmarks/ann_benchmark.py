@@ -0,0 +1,90 @@
+"""Recall-versus-latency benchmark of the vector index backends against the exact scan.
+
+Run from the backend directory:
+    python -m benchmarks.ann_benchmark --size 100000 --queries 200
+"""
+import argparse
+import time
+import numpy as np
+from app.db.vector_index import create_index
+
+
+def synthetic_embeddings(size, dim, clusters, seed=0):
+    """Normalized vectors grouped around template-like centres, as templated emails are."""
+    rng = np.random.default_rng(seed)
+    centres = rng.standard_normal((clusters, dim)).astype(np.float32)
+    vectors = centres[rng.integers(0, clusters, size)] + 0.35 * rng.standard_normal((size, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def perturbed_queries(vectors, count, seed=1):
+    rng = np.random.default_rng(seed)
+    picks = vectors[rng.integers(0, len(vectors), count)]
+    queries = picks + 0.1 * rng.standard_normal(picks.shape).astype(np.float32)
+    return queries / np.linalg.norm(queries, axis=1, keepdims=True)
+
+
+def measure(index, queries, top_k):
+    results, latencies = [], []
+    for query in queries:
+        start = time.perf_counter()
+        results.append(index.search(query, top_k))
+        latencies.append(time.perf_counter() - start)
+    return results, np.array(latencies) * 1000
+
+
+def recall(truth, results):
+    hits = sum(len({i for i, _ in t} & {i for i, _ in r}) for t, r in zip(truth, results))
+    return hits / max(1, sum(len(t) for t in truth))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", type=int, default=100000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--clusters", type=int, default=500)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--nlist", type=int, default=1024)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--ef", type=int, nargs="+", default=[16, 64, 256])
+    args = parser.parse_args()
+
+    vectors = synthetic_embeddings(args.size, args.dim, args.clusters)
+    ids = np.arange(1, args.size + 1, dtype=np.int64)
+    queries = perturbed_queries(vectors, args.queries)
+
+    exact = create_index("exact")
+    exact.add(ids, vectors)
+    truth, latencies = measure(exact, queries, args.top_k)
+    print(f"{'backend':<22}{'build s':>10}{'recall@k':>10}{'mean ms':>10}{'p99 ms':>10}")
+    print(f"{'exact':<22}{0.0:>10.2f}{1.0:>10.3f}{latencies.mean():>10.3f}{np.percentile(latencies, 99):>10.3f}")
+
+    start = time.perf_counter()
+    ivf = create_index("ivf", nlist=args.nlist, min_train_size=args.size)
+    ivf.add(ids, vectors)
+    build = time.perf_counter() - start
+    for nprobe in args.nprobe:
+        ivf.nprobe = nprobe
+        results, latencies = measure(ivf, queries, args.top_k)
+        print(f"{'ivf nprobe=' + str(nprobe):<22}{build:>10.2f}{recall(truth, results):>10.3f}"
+              f"{latencies.mean():>10.3f}{np.percentile(latencies, 99):>10.3f}")
+
+    try:
+        import hnswlib  # noqa: F401
+    except ImportError:
+        print("hnsw skipped (pip install hnswlib)")
+        return
+    start = time.perf_counter()
+    hnsw = create_index("hnsw", capacity=args.size)
+    hnsw.add(ids, vectors)
+    build = time.perf_counter() - start
+    for ef in args.ef:
+        hnsw.index.set_ef(max(ef, args.top_k))
+        results, latencies = measure(hnsw, queries, args.top_k)
+        print(f"{'hnsw ef=' + str(ef):<22}{build:>10.2f}{recall(truth, results):>10.3f}"
+              f"{latencies.mean():>10.3f}{np.percentile(latencies, 99):>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
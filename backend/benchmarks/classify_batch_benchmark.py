@@ -0,0 +1,104 @@
+"""Throughput versus p99 latency of /email/classify with and without the request coalescer.
+
+Requests arrive at a fixed rate and are classified in fused mode against a simulated LLM endpoint
+that serves at most --llm-concurrency calls at a time, each taking --latency-ms plus --per-email-ms
+per email in the prompt. No API key or network is needed. From the backend directory:
+    python -m benchmarks.classify_batch_benchmark --rate 40 --duration 5 --waits 10 50 --batch-sizes 4 8
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import logging
+import re
+import time
+import types
+import numpy as np
+from app.core.config import settings
+from app.services.classify_batcher import ClassifyBatcher
+from app.utils import email_classifier
+
+TEXT = "Please transfer USD 250,000 from the ACME Corp facility to account 4411 under the term loan agreement."
+FUSED_RESULT = {"named_entities": [{"entity": "ACME Corp", "type": "ORG", "confidence_score": 0.95}],
+                "key_phrases": ["money movement", "term loan"], "summary": "Transfer request.",
+                "request_type": "Money Movement", "request_sub_type": "Outbound", "deal_name": "ACME Corp",
+                "confidence_score": 0.9}
+
+
+class SimulatedModel:
+    """Answers fused prompts after a delay, with a cap on concurrent calls like a rate-limited API."""
+    model_name = "simulated"
+
+    def __init__(self, latency, per_email, concurrency):
+        self.latency = latency
+        self.per_email = per_email
+        self.slots = asyncio.Semaphore(concurrency)
+        self.calls = 0
+
+    async def generate_content_async(self, prompt, generation_config=None):
+        emails = len(re.findall(r"^\s*Email \d+:", prompt, flags=re.MULTILINE))
+        async with self.slots:
+            self.calls += 1
+            await asyncio.sleep(self.latency + self.per_email * max(1, emails))
+        if emails:
+            text = json.dumps([dict(FUSED_RESULT, email=number) for number in range(1, emails + 1)])
+        else:
+            text = json.dumps(FUSED_RESULT)
+        return types.SimpleNamespace(text=text)
+
+
+async def run_level(classify, rate, duration):
+    latencies = []
+
+    async def one(i):
+        start = time.perf_counter()
+        await classify({"text": f"{TEXT} Reference {i}.", "mode": "fused"})
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    tasks = []
+    # classify_email prints every request; keep the report readable
+    with contextlib.redirect_stdout(io.StringIO()):
+        for i in range(int(rate * duration)):
+            tasks.append(asyncio.create_task(one(i)))
+            await asyncio.sleep(max(0.0, start + (i + 1) / rate - time.perf_counter()))
+        await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - start
+    p50, p99 = np.percentile(np.array(latencies) * 1000, [50, 99])
+    return len(latencies) / elapsed, p50, p99
+
+
+async def benchmark(args):
+    settings.LLM_CACHE_ENABLED = False
+    logging.getLogger(email_classifier.__name__).setLevel(logging.WARNING)
+    print(f"{'coalescer':<22}{'req/s':>8}{'p50 ms':>10}{'p99 ms':>10}{'LLM calls':>11}")
+    model = email_classifier.MODEL = SimulatedModel(args.latency_ms / 1000, args.per_email_ms / 1000,
+                                                    args.llm_concurrency)
+    rate, p50, p99 = await run_level(email_classifier.classify_email, args.rate, args.duration)
+    print(f"{'off':<22}{rate:>8.1f}{p50:>10.1f}{p99:>10.1f}{model.calls:>11}")
+    for wait_ms in args.waits:
+        for batch_size in args.batch_sizes:
+            model = email_classifier.MODEL = SimulatedModel(args.latency_ms / 1000, args.per_email_ms / 1000,
+                                                            args.llm_concurrency)
+            batcher = ClassifyBatcher(batch_size, wait_ms / 1000, args.llm_concurrency)
+            rate, p50, p99 = await run_level(batcher.submit, args.rate, args.duration)
+            await batcher.stop()
+            label = f"wait {wait_ms:g}ms x{batch_size}"
+            print(f"{label:<22}{rate:>8.1f}{p50:>10.1f}{p99:>10.1f}{model.calls:>11}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rate", type=float, default=40, help="requests per second")
+    parser.add_argument("--duration", type=float, default=5, help="seconds of arrivals per level")
+    parser.add_argument("--waits", type=float, nargs="+", default=[10, 50], help="CLASSIFY_BATCH_MAX_WAIT_MS values")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[4, 8], help="CLASSIFY_BATCH_MAX_SIZE values")
+    parser.add_argument("--latency-ms", type=float, default=400, help="simulated latency of one LLM call")
+    parser.add_argument("--per-email-ms", type=float, default=40, help="extra latency per email in a prompt")
+    parser.add_argument("--llm-concurrency", type=int, default=8, help="simulated concurrent call limit")
+    asyncio.run(benchmark(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
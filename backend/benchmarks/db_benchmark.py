@@ -0,0 +1,103 @@
+"""SQLite benchmark: concurrent EMAIL insert and update throughput, per-call connections vs the WAL pool.
+
+Each worker is a separate process, like the uvicorn workers, running the EmailRepo insert and update
+statements. From the backend directory:
+    python -m benchmarks.db_benchmark --workers 1 2 4 8 --operations 500
+"""
+import argparse
+import os
+import sqlite3
+import tempfile
+import time
+from multiprocessing import Pool
+from app.db.migrations import migrate
+from app.db.sqlite_db_config import SQLiteConnectionPool
+
+INSERT_SQL = ("INSERT INTO EMAIL (SENDER, RECIEPIENT, SUBJECT, BODY, PROCESSING_STATUS, HAS_ATTACHMENTS, CREATED_AT) "
+              "VALUES (?, ?, ?, ?, ?, ?, strftime('%s','now')) RETURNING EMAIL_ID")
+UPDATE_SQL = "UPDATE EMAIL SET PROCESSING_STATUS = ?, CATEGORY = ?, UPDATED_AT = strftime('%s','now') WHERE EMAIL_ID = ?"
+BODY = "Please process the attached loan transfer request. " * 40
+
+
+class PerCallConnection:
+    """The previous behaviour: a fresh default-journal connection for every repository call."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def acquire(self):
+        return sqlite3.connect(self.path)
+
+    def release(self, conn):
+        conn.close()
+
+
+def run_worker(args):
+    mode, path, worker, operations = args
+    pool = SQLiteConnectionPool(path, 4) if mode == "pooled" else PerCallConnection(path)
+    email_ids, errors = [], 0
+    start = time.perf_counter()
+    for i in range(operations):
+        conn = pool.acquire()
+        try:
+            row = conn.execute(INSERT_SQL, (f"sender{worker}@example.com", "ops@example.com", f"subject {i}", BODY,
+                                            "PARSED", False)).fetchone()
+            conn.commit()
+            email_ids.append(row[0])
+        except sqlite3.OperationalError:
+            errors += 1
+        finally:
+            pool.release(conn)
+    insert_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    for email_id in email_ids:
+        conn = pool.acquire()
+        try:
+            conn.execute(UPDATE_SQL, ("CLASSIFIED", "Money Movement", email_id))
+            conn.commit()
+        except sqlite3.OperationalError:
+            errors += 1
+        finally:
+            pool.release(conn)
+    return len(email_ids), insert_seconds, time.perf_counter() - start, errors
+
+
+def create_database(path):
+    pool = SQLiteConnectionPool(path, 1)
+    migrate(pool)
+    pool.close_all()
+
+
+def run_level(mode, workers, operations):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        create_database(path)
+        if mode == "per-call":
+            sqlite3.connect(path).execute("PRAGMA journal_mode = DELETE").close()
+        start = time.perf_counter()
+        with Pool(workers) as pool:
+            results = pool.map(run_worker, [(mode, path, worker, operations) for worker in range(workers)])
+        wall = time.perf_counter() - start
+    inserted = sum(result[0] for result in results)
+    insert_seconds = max(result[1] for result in results)
+    update_seconds = max(result[2] for result in results)
+    errors = sum(result[3] for result in results)
+    return inserted / insert_seconds, inserted / update_seconds if update_seconds else 0.0, errors, wall
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--operations", type=int, default=500, help="inserts (then updates) per worker")
+    parser.add_argument("--modes", nargs="+", choices=["per-call", "pooled"], default=["per-call", "pooled"])
+    args = parser.parse_args()
+
+    print(f"{'mode':>10}{'workers':>9}{'insert/s':>11}{'update/s':>11}{'errors':>8}{'wall s':>9}")
+    for mode in args.modes:
+        for workers in args.workers:
+            inserts, updates, errors, wall = run_level(mode, workers, args.operations)
+            print(f"{mode:>10}{workers:>9}{inserts:>11.0f}{updates:>11.0f}{errors:>8}{wall:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
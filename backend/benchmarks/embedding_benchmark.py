@@ -0,0 +1,84 @@
+"""Embedding throughput: in-process encode calls against the shared, micro-batching embedding server.
+
+Concurrent clients each encode one email body per call, as the duplicate check does. The server runs
+in a subprocess on a temporary Unix socket. From the backend directory:
+    python -m benchmarks.embedding_benchmark --concurrency 1 4 16 --texts 512
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from app.utils.embedding_client import EmbeddingClient
+from app.utils.model_loader import encode_texts
+
+BODY = "Please process the attached loan transfer request for account {} before the end of the week."
+
+
+def run_level(encode, concurrency, texts):
+    latencies = []
+
+    def encode_one(text):
+        start = time.perf_counter()
+        encode([text])
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(encode_one, texts))
+    elapsed = time.perf_counter() - start
+    p50, p99 = np.percentile(np.array(latencies) * 1000, [50, 99])
+    return len(texts) / elapsed, p50, p99
+
+
+def wait_for_server(client, server, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError("Embedding server exited")
+        try:
+            return client.stats()
+        except OSError:
+            client.disconnect()
+            time.sleep(0.1)
+    raise RuntimeError("Embedding server did not start")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--texts", type=int, default=512, help="encode calls per level")
+    parser.add_argument("--max-batch", type=int, default=64)
+    parser.add_argument("--max-wait-ms", type=float, default=5)
+    args = parser.parse_args()
+    texts = [BODY.format(i) for i in range(args.texts)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        url = "unix://" + os.path.join(tmp, "embeddings.sock")
+        server = subprocess.Popen([sys.executable, "-m", "app.services.embedding_server", "--url", url,
+                                   "--max-batch", str(args.max_batch), "--max-wait-ms", str(args.max_wait_ms)],
+                                  stderr=subprocess.DEVNULL)
+        client = EmbeddingClient(url, retry_seconds=0)
+        try:
+            wait_for_server(client, server, timeout=120)
+            encode_texts(texts[:1])  # Load the in-process model outside the timings
+            print(f"{'mode':<12}{'clients':>8}{'texts/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'avg batch':>11}")
+            for concurrency in args.concurrency:
+                rate, p50, p99 = run_level(encode_texts, concurrency, texts)
+                print(f"{'in-process':<12}{concurrency:>8}{rate:>10.1f}{p50:>10.2f}{p99:>10.2f}{1:>11.1f}")
+                before = client.stats()
+                rate, p50, p99 = run_level(client.encode, concurrency, texts)
+                after = client.stats()
+                batch = (after["texts"] - before["texts"]) / max(1, after["batches"] - before["batches"])
+                print(f"{'server':<12}{concurrency:>8}{rate:>10.1f}{p50:>10.2f}{p99:>10.2f}{batch:>11.1f}")
+        finally:
+            client.disconnect()
+            server.terminate()
+            server.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""Peak memory and time of parsing a large EML: full email.message tree versus the streaming parser.
+
+"tree" is what parse_email did before: read the upload, parse it into an email.message tree, walk it for
+the body and keep every decoded attachment. "stream" is app.utils.mime_stream reading the same message
+from a file, spooling payloads over --spool-mb to disk. Attachment text extraction is not included.
+From the backend directory:
+    python -m benchmarks.eml_parse_benchmark --attachments 4 --attachment-mb 12
+"""
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+from email import policy
+from email.message import EmailMessage
+from email.parser import BytesParser
+from io import BytesIO
+from app.utils.mime_stream import MimeStreamParser
+
+
+def make_message(path, attachments, attachment_mb):
+    message = EmailMessage()
+    message["Subject"] = "Facility documents"
+    message["From"] = "agent@example.com"
+    message["To"] = "loan-ops@example.com"
+    message.set_content("Please find the signed facility documents attached.")
+    for position in range(attachments):
+        message.add_attachment(os.urandom(int(attachment_mb * 1024 * 1024)), maintype="application",
+                               subtype="pdf", filename=f"document_{position}.pdf")
+    with open(path, "wb") as f:
+        f.write(message.as_bytes())
+
+
+def parse_tree(path, spool_dir, spool_bytes):
+    with open(path, "rb") as f:
+        contents = f.read()
+    msg = BytesParser(policy=policy.default).parse(BytesIO(contents))
+    body = None
+    for part in msg.walk():
+        if part.get_content_type() == "text/plain":
+            body = part.get_payload(decode=True).decode(part.get_content_charset() or "utf-8", errors="ignore")
+            break
+    attachments = [{"filename": part.get_filename(), "content": part.get_payload(decode=True)}
+                   for part in msg.walk() if part.get_content_disposition() == "attachment" and part.get_filename()]
+    return body, len(attachments)
+
+
+def parse_stream(path, spool_dir, spool_bytes):
+    body, attachments = None, 0
+    with open(path, "rb") as f:
+        parser = MimeStreamParser(f, 0, spool_bytes, spool_dir)
+        for part in parser.parts():
+            if part.get_content_disposition() == "attachment" and part.get_filename():
+                attachments += 1
+            elif body is None and part.get_content_type() == "text/plain":
+                body = part.text()
+            part.payload.discard()
+    return body, attachments
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--attachments", type=int, default=4)
+    parser.add_argument("--attachment-mb", type=float, default=12, help="size of each attachment before encoding")
+    parser.add_argument("--spool-mb", type=float, default=1, help="EMAIL_SPOOL_MEMORY_MB")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "large.eml")
+        make_message(path, args.attachments, args.attachment_mb)
+        print(f"message: {os.path.getsize(path) / 1024 / 1024:.1f} MiB, {args.attachments} attachments")
+        print(f"{'parser':<8}{'seconds':>10}{'peak MiB':>12}")
+        for name, parse in (("tree", parse_tree), ("stream", parse_stream)):
+            tracemalloc.start()
+            start = time.perf_counter()
+            body, attachments = parse(path, tmp, int(args.spool_mb * 1024 * 1024))
+            elapsed = time.perf_counter() - start
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            assert body and attachments == args.attachments
+            print(f"{name:<8}{elapsed:>10.3f}{peak / 1024 / 1024:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
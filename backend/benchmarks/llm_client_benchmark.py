@@ -0,0 +1,170 @@
+"""Bursts of LLM calls against a local fake LLM server: naive retries versus the shared LLM client.
+
+The fake server answers over HTTP after --latency-ms, allows --server-rpm requests per minute and
+--server-concurrency at a time (429 with Retry-After beyond either), and fails --error-rate of calls with
+503. "naive" is the per-call-site loop the app used before (retry after 2 ** attempt seconds, three tries);
+"client" is app.utils.llm_client with the quota configured. From the backend directory:
+    python -m benchmarks.llm_client_benchmark --calls 200 --concurrency 50 --server-rpm 1200
+"""
+import argparse
+import asyncio
+import json
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+from google.api_core import exceptions as google_exceptions
+from app.core.config import settings
+from app.utils.llm_client import LLMClient, TokenBucket
+
+
+class FakeLLMServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, latency, per_minute, concurrency, error_rate, seed=0):
+        super().__init__(("127.0.0.1", 0), FakeLLMHandler)
+        self.latency = latency
+        # Enforced per second, as APIs do, rather than allowing a minute's burst
+        self.quota = TokenBucket("fake-server", per_minute, burst=max(1.0, per_minute / 60))
+        self.slots = threading.BoundedSemaphore(concurrency)
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.counts = {"ok": 0, "429": 0, "503": 0}
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/generate"
+
+    def count(self, name):
+        with self.lock:
+            self.counts[name] += 1
+
+
+class FakeLLMHandler(BaseHTTPRequestHandler):
+
+    def do_POST(self):
+        server = self.server
+        prompt = json.loads(self.rfile.read(int(self.headers["Content-Length"])))["prompt"]
+        wait = server.quota.reserve(1)
+        if wait > 0:
+            server.quota.refund(1)  # Rejected calls do not use quota
+            return self.reply(429, {"error": "quota exceeded"}, retry_after=wait)
+        if not server.slots.acquire(blocking=False):
+            return self.reply(429, {"error": "too many concurrent requests"}, retry_after=server.latency)
+        try:
+            with server.lock:
+                failed = server.random.random() < server.error_rate
+            time.sleep(server.latency)
+        finally:
+            server.slots.release()
+        if failed:
+            return self.reply(503, {"error": "backend unavailable"})
+        self.reply(200, {"text": "50", "total_tokens": len(prompt) // 4 + 1})
+
+    def reply(self, status, body, retry_after=None):
+        self.server.count("ok" if status == 200 else str(status))
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        if retry_after is not None:
+            self.send_header("Retry-After", f"{retry_after:.3f}")
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+class HTTPModel:
+    """generate_content over the fake server, raising google.api_core exceptions like the Gemini SDK."""
+    model_name = "fake-http"
+
+    def __init__(self, url):
+        self.url = url
+
+    def generate_content(self, prompt, generation_config=None):
+        request = urllib.request.Request(self.url, data=json.dumps({"prompt": prompt}).encode("utf-8"),
+                                         headers={"Content-Type": "application/json"})
+        try:
+            with urllib.request.urlopen(request, timeout=30) as response:
+                body = json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            raise google_exceptions.from_http_status(e.code, e.read().decode("utf-8", "replace"), response=e)
+        usage = type("Usage", (), {"total_token_count": body["total_tokens"]})()
+        return type("Response", (), {"text": body["text"], "usage_metadata": usage})()
+
+    async def generate_content_async(self, prompt, generation_config=None):
+        return await asyncio.to_thread(self.generate_content, prompt, generation_config)
+
+
+async def naive_call(model, prompt, retries=3):
+    for attempt in range(retries):
+        try:
+            return await model.generate_content_async(prompt)
+        except google_exceptions.GoogleAPIError:
+            await asyncio.sleep(2 ** attempt)
+    raise RuntimeError("gave up")
+
+
+async def run(call, calls, concurrency):
+    latencies, failures = [], 0
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i):
+        nonlocal failures
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                await call(f"Compare email {i} with its candidates. " * 20)
+                latencies.append(time.perf_counter() - start)
+            except Exception:
+                failures += 1
+
+    # One thread per caller, so the thread pool does not cap concurrency below the server's limit
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=concurrency))
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(calls)))
+    elapsed = time.perf_counter() - start
+    p50, p99 = np.percentile(np.array(latencies) * 1000, [50, 99]) if latencies else (float("nan"),) * 2
+    return len(latencies), failures, elapsed, p50, p99
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50, help="callers issuing requests at once")
+    parser.add_argument("--latency-ms", type=float, default=100)
+    parser.add_argument("--server-rpm", type=float, default=1200, help="fake server quota, requests per minute")
+    parser.add_argument("--server-concurrency", type=int, default=8)
+    parser.add_argument("--error-rate", type=float, default=0.05, help="share of calls answered with 503")
+    parser.add_argument("--backoff-base", type=float, default=0.1, help="LLM_BACKOFF_BASE_SECONDS for the client")
+    args = parser.parse_args()
+    settings.LLM_BACKOFF_BASE_SECONDS = args.backoff_base
+
+    print(f"{'mode':<8}{'ok':>6}{'failed':>8}{'seconds':>9}{'p50 ms':>10}{'p99 ms':>10}{'429s':>7}{'503s':>7}")
+    for mode in ("naive", "client"):
+        server = FakeLLMServer(args.latency_ms / 1000, args.server_rpm, args.server_concurrency, args.error_rate)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        model = HTTPModel(server.url)
+        if mode == "naive":
+            call = lambda prompt: naive_call(model, prompt)
+        else:
+            client = LLMClient(args.server_rpm, 0, None, concurrency=4, min_concurrency=1,
+                               max_concurrency=args.concurrency, max_retries=5, failure_threshold=20, reset_seconds=5)
+            call = lambda prompt: client.generate_async(model, prompt)
+        ok, failed, elapsed, p50, p99 = asyncio.run(run(call, args.calls, args.concurrency))
+        server.shutdown()
+        print(f"{mode:<8}{ok:>6}{failed:>8}{elapsed:>9.2f}{p50:>10.1f}{p99:>10.1f}"
+              f"{server.counts['429']:>7}{server.counts['503']:>7}")
+        if mode == "client":
+            print(f"client stats: {client.get_stats()}")
+
+
+if __name__ == "__main__":
+    main()
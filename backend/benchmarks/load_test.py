@@ -0,0 +1,83 @@
+"""Load test: throughput and latency of a running API at increasing client concurrency.
+
+Start the server (python uvicorn_config.py), then from the backend directory:
+    python -m benchmarks.load_test --endpoint classify --concurrency 1 2 4 8 16 --requests 64
+"""
+import argparse
+import json
+import os
+import time
+import uuid
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "..", "app", "data")
+
+
+def multipart_body(filename, content):
+    boundary = uuid.uuid4().hex
+    body = (f"--{boundary}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"{filename}\"\r\n"
+            "Content-Type: message/rfc822\r\n\r\n").encode() + content + f"\r\n--{boundary}--\r\n".encode()
+    return body, f"multipart/form-data; boundary={boundary}"
+
+
+def build_requests(base_url, endpoint):
+    """Return a list of (url, body, content type) request templates cycled through by the clients."""
+    if endpoint == "home":
+        return [(base_url + "/", None, None)]
+    samples = []
+    for filename in sorted(os.listdir(DATA_DIR)):
+        with open(os.path.join(DATA_DIR, filename), "rb") as f:
+            samples.append((filename, f.read()))
+    if endpoint == "process":
+        return [(base_url + "/email/process",) + multipart_body(filename, content) for filename, content in samples]
+    return [(base_url + "/email/classify", json.dumps({"body": content.decode("utf-8", errors="ignore"),
+             "category_type": "load-test", "mode": "fused" if endpoint == "classify-fused" else "chain"}).encode(),
+             "application/json") for _, content in samples]
+
+
+def send(template, timeout):
+    url, body, content_type = template
+    request = urllib.request.Request(url, data=body, method="POST" if body is not None else "GET")
+    if content_type:
+        request.add_header("Content-Type", content_type)
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            response.read()
+            ok = response.status == 200
+    except Exception:
+        ok = False
+    return ok, time.perf_counter() - start
+
+
+def run_level(templates, concurrency, total, timeout):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(lambda i: send(templates[i % len(templates)], timeout), range(total)))
+    elapsed = time.perf_counter() - start
+    latencies = sorted(latency for _, latency in results)
+    errors = sum(1 for ok, _ in results if not ok)
+    p50 = latencies[len(latencies) // 2]
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    return total / elapsed, p50, p99, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--endpoint", choices=["home", "process", "classify", "classify-fused"], default="classify")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    parser.add_argument("--requests", type=int, default=64, help="requests per concurrency level")
+    parser.add_argument("--timeout", type=float, default=120)
+    args = parser.parse_args()
+
+    templates = build_requests(args.base_url.rstrip("/"), args.endpoint)
+    print(f"{'clients':>8}{'req/s':>10}{'p50 s':>10}{'p99 s':>10}{'errors':>8}")
+    for concurrency in args.concurrency:
+        throughput, p50, p99, errors = run_level(templates, concurrency, args.requests, args.timeout)
+        print(f"{concurrency:>8}{throughput:>10.2f}{p50:>10.3f}{p99:>10.3f}{errors:>8}")
+
+
+if __name__ == "__main__":
+    main()
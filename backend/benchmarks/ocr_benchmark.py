@@ -0,0 +1,142 @@
+"""Seconds per page and text recall of PDF extraction on a synthetic corpus of digital and scanned PDFs.
+
+Digital PDFs carry a text layer; scanned ones are page images (grey, noisy background) of the same kind
+of text, without one. "text-layer" is what PDF extraction did before: the text layer only, so scans come
+back empty. "smart" is app.utils.attachment_extractors.read_pdf_pages: the text layer where usable,
+otherwise the page rendered at each --dpi, downscaled, binarized and OCR'd. Recall is the share of the
+words printed on the pages that appear in the extracted text. Needs the tesseract binary.
+From the backend directory:
+    python -m benchmarks.ocr_benchmark --documents 5 --pages 3 --dpi 150 200 300
+"""
+import argparse
+import logging
+import os
+import random
+import re
+import tempfile
+import time
+from collections import Counter
+from app.core.config import settings
+from app.utils.attachment_extractors import read_pdf_pages
+
+WORDS = ["facility", "borrower", "lender", "agent", "commitment", "drawdown", "repayment", "interest", "margin",
+         "tranche", "notice", "schedule", "amount", "settlement", "account", "payment", "principal", "fee",
+         "revolving", "term", "loan", "maturity", "covenant", "utilisation", "rate", "period", "transfer"]
+LINES_PER_PAGE = 30
+WORDS_PER_LINE = 9
+
+
+def make_pages(rng, pages):
+    return [[" ".join(rng.choice(WORDS) if rng.random() < 0.8 else str(rng.randint(1000, 999999))
+                      for _ in range(WORDS_PER_LINE)) for _ in range(LINES_PER_PAGE)] for _ in range(pages)]
+
+
+def write_digital_pdf(path, pages):
+    """A minimal PDF with one Helvetica text line per row, letter-sized pages."""
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None, "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for lines in pages:
+        stream = "BT /F1 11 Tf 14 TL 60 740 Td " + " ".join(f"({line}) Tj T*" for line in lines) + " ET"
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Resources << /Font << /F1 3 0 R >> >> "
+                       f"/Contents {len(objects)} 0 R >>")
+        kids.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(kids)} >>"
+    data, offsets = b"%PDF-1.4\n", []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(data))
+        data += f"{number} 0 obj\n{body}\nendobj\n".encode("latin-1")
+    xref = len(data)
+    data += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode("latin-1")
+    data += "".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode("latin-1")
+    data += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode("latin-1")
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+def write_scanned_pdf(path, pages, scan_dpi):
+    """Page images as a scanner would produce them: text on a grey, noisy background, no text layer."""
+    from PIL import Image, ImageChops, ImageDraw, ImageFont
+    font = ImageFont.load_default(size=round(11 * scan_dpi / 72))
+    size = (round(8.5 * scan_dpi), round(11 * scan_dpi))
+    images = []
+    for lines in pages:
+        image = Image.new("L", size, 225)
+        draw = ImageDraw.Draw(image)
+        for row, line in enumerate(lines):
+            draw.text((round(60 * scan_dpi / 72), round((52 + 14 * row) * scan_dpi / 72)), line, fill=30, font=font)
+        noise = Image.effect_noise(size, 24)
+        images.append(ImageChops.add(image, noise, scale=2.0, offset=-64))
+    images[0].save(path, save_all=True, append_images=images[1:], resolution=scan_dpi)
+
+
+def recall(expected, text):
+    words = Counter(re.findall(r"[a-z0-9]+", " ".join(expected).lower()))
+    found = Counter(re.findall(r"[a-z0-9]+", text.lower()))
+    return sum((words & found).values()) / sum(words.values())
+
+
+def text_layer_only(pdf):
+    return "\n".join(page.extract_text() or "" for page in pdf.pages)
+
+
+def smart(dpi):
+    def extract(pdf):
+        settings.OCR_PDF_DPI = dpi
+        return read_pdf_pages(pdf, 0, None, None)[0]
+    return extract
+
+
+def measure(documents, extract):
+    import pdfplumber
+    seconds, pages, recalls = 0.0, 0, []
+    for path, expected in documents:
+        start = time.perf_counter()
+        with pdfplumber.open(path) as pdf:
+            text = extract(pdf)
+            pages += len(pdf.pages)
+        seconds += time.perf_counter() - start
+        recalls.append(recall([line for page in expected for line in page], text))
+    return seconds / pages, sum(recalls) / len(recalls)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--documents", type=int, default=5, help="documents of each kind")
+    parser.add_argument("--pages", type=int, default=3, help="pages per document")
+    parser.add_argument("--dpi", type=int, nargs="+", default=[150, 200, 300], help="OCR_PDF_DPI values to compare")
+    parser.add_argument("--scan-dpi", type=int, default=300, help="resolution the scans are produced at")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    import pytesseract
+    try:
+        pytesseract.get_tesseract_version()
+    except pytesseract.TesseractNotFoundError:
+        raise SystemExit("tesseract is not installed or not on PATH")
+    logging.disable(logging.WARNING)
+    # The benchmark measures the per-page cost, not the per-document cap
+    settings.OCR_MAX_PAGES = 0
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        corpus = {"digital": [], "scanned": []}
+        for position in range(args.documents):
+            for kind in corpus:
+                pages = make_pages(rng, args.pages)
+                path = os.path.join(tmp, f"{kind}_{position}.pdf")
+                if kind == "digital":
+                    write_digital_pdf(path, pages)
+                else:
+                    write_scanned_pdf(path, pages, args.scan_dpi)
+                corpus[kind].append((path, pages))
+
+        print(f"{'mode':<18}{'kind':<10}{'s/page':>10}{'recall':>10}")
+        modes = [("text-layer", text_layer_only)] + [(f"smart @{dpi} dpi", smart(dpi)) for dpi in args.dpi]
+        for name, extract in modes:
+            for kind, documents in corpus.items():
+                per_page, mean_recall = measure(documents, extract)
+                print(f"{name:<18}{kind:<10}{per_page:>10.3f}{mean_recall:>10.1%}")
+
+
+if __name__ == "__main__":
+    main()
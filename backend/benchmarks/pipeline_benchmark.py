@@ -0,0 +1,214 @@
+"""End-to-end pipeline benchmark on synthetic email corpora of increasing size, fully offline.
+
+For each corpus size a fresh interpreter with an empty temporary database and LLM_PROVIDER=fake runs the
+stages in order and reports per-email p50/p99 latency, emails/sec and the process's peak RSS after the stage:
+    parse                  extract_email_content (MIME parsing and attachment extraction)
+    parse_email            parse, duplicate check and store, filling the repository with the corpus
+    check_duplicate_email  the cascade for a sample of bodies against the full repository
+    extract_output         entities, key phrases and summary through the fake LLM, --llm-concurrency at a time
+    repo                   EmailRepo.get_emails of every stored email in batches of 500 (latency per batch)
+The corpus mixes unique emails, exact resends, lightly edited copies and small CSV attachments.
+From the backend directory:
+    python -m benchmarks.pipeline_benchmark --sizes 100 1000 5000 --llm-latency-ms 200
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.join(os.path.dirname(__file__), "..")
+STAGES = ("parse", "parse_email", "check_duplicate_email", "extract_output", "repo")
+COMPANIES = ["ACME Corp", "Globex", "Initech", "Umbrella Holdings", "Stark Industries", "Wayne Enterprises",
+             "Hooli", "Vandelay Imports", "Soylent Partners", "Tyrell Capital"]
+REQUESTS = [
+    "Please transfer USD {amount} from the {company} facility to account {account} by {date}.",
+    "We confirm receipt of USD {amount} from {company} into account {account} on {date}.",
+    "The commitment of {company} under the term loan is reduced by USD {amount} effective {date}.",
+    "Kindly pay the ongoing fee of USD {amount} for the {company} revolving facility before {date}.",
+    "Notice of closing: {company} has repaid the outstanding balance of USD {amount} as of {date}.",
+    "Please reallocate USD {amount} of the {company} tranche to account {account} on {date}."
+]
+FILLER = [
+    "The agent bank will confirm the settlement instructions separately.",
+    "Contact the loan operations team for questions about the schedule.",
+    "The applicable rate resets at the start of the next interest period.",
+    "Supporting documents were shared with the credit team last week.",
+    "Please treat this request as urgent given the cut-off time.",
+    "The borrower has acknowledged the revised repayment schedule.",
+    "Any fees due will be netted against the next drawdown.",
+    "Copies of the signed notices are held by the facility agent."
+]
+
+
+def make_body(rng, i):
+    requests = [request.format(amount=f"{rng.randint(1, 900) * 1000:,}", company=rng.choice(COMPANIES),
+                               account=rng.randint(100000, 999999), date=f"2025-{rng.randint(1, 12):02d}-"
+                               f"{rng.randint(1, 28):02d}") for request in rng.sample(REQUESTS, 2)]
+    filler = " ".join(rng.sample(FILLER, rng.randint(1, 3)))
+    return f"Dear team,\n\n{' '.join(requests)} Reference {i}.\n\n{filler}\n\nRegards,\nOperations"
+
+
+def make_corpus(size, seed, duplicate_rate, near_duplicate_rate, attachment_rate):
+    """Raw EML bytes: unique emails, exact resends and lightly edited copies of earlier ones."""
+    from email.message import EmailMessage
+    rng = random.Random(seed)
+    bodies, corpus = [], []
+    for i in range(size):
+        roll = rng.random()
+        if bodies and roll < duplicate_rate:
+            body = rng.choice(bodies)
+        elif bodies and roll < duplicate_rate + near_duplicate_rate:
+            body = rng.choice(bodies).replace("Regards", "Kind regards")
+        else:
+            body = make_body(rng, i)
+            bodies.append(body)
+        message = EmailMessage()
+        message["Subject"] = f"Request {i}"
+        message["From"] = f"{rng.choice(COMPANIES).split()[0].lower()}@example.com"
+        message["To"] = "loan-ops@example.com"
+        message.set_content(body)
+        if rng.random() < attachment_rate:
+            rows = "\n".join(f"{j},{rng.randint(1, 10 ** 6)}" for j in range(50))
+            message.add_attachment(f"line,amount\n{rows}\n".encode("utf-8"), maintype="text", subtype="csv",
+                                   filename=f"schedule_{i}.csv")
+        corpus.append(message.as_bytes())
+    return corpus
+
+
+def peak_rss_mb():
+    import resource
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return usage / 1024 / 1024 if sys.platform == "darwin" else usage / 1024
+
+
+def summarize(latencies, elapsed):
+    import numpy as np
+    p50, p99 = np.percentile(np.array(latencies) * 1000, [50, 99]) if latencies else (0.0, 0.0)
+    return {"emails": len(latencies), "seconds": elapsed, "per_second": len(latencies) / elapsed if elapsed else 0.0,
+            "p50_ms": p50, "p99_ms": p99, "peak_rss_mb": peak_rss_mb()}
+
+
+def timed(items, function):
+    latencies = []
+    start = time.perf_counter()
+    for item in items:
+        item_start = time.perf_counter()
+        function(item)
+        latencies.append(time.perf_counter() - item_start)
+    return summarize(latencies, time.perf_counter() - start)
+
+
+async def timed_async(items, function, concurrency):
+    import asyncio
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(item):
+        async with semaphore:
+            item_start = time.perf_counter()
+            await function(item)
+            latencies.append(time.perf_counter() - item_start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(item) for item in items))
+    return summarize(latencies, time.perf_counter() - start)
+
+
+def run_stages(args):
+    """One corpus size in this process; the environment already points at a temporary database."""
+    import asyncio
+    import contextlib
+    import io
+    import logging
+    from app.db.email_repo import EmailRepo
+    from app.db.migrations import migrate
+    from app.db.sqlite_db_config import get_pool
+    from app.db.track_emails import check_duplicate_email
+    from app.utils.email_classifier import extract_output
+    from app.utils.email_parser import extract_email_content, parse_email
+    from app.utils.model_loader import get_embedding_model
+
+    logging.disable(logging.WARNING)
+    migrate(get_pool())
+    get_embedding_model()  # Model load is start-up cost, not per-email cost
+    corpus = make_corpus(args.size, args.seed, args.duplicate_rate, args.near_duplicate_rate, args.attachment_rate)
+    rng = random.Random(args.seed)
+    results = {"baseline_rss_mb": peak_rss_mb()}
+    parsed = []
+    # The pipeline prints per email; keep the report readable
+    with contextlib.redirect_stdout(io.StringIO()):
+        results["parse"] = timed(corpus, lambda eml: parsed.append(extract_email_content(eml)))
+        results["parse_email"] = timed(corpus, parse_email)
+        sample = rng.sample(parsed, min(args.sample, len(parsed)))
+        results["check_duplicate_email"] = timed(
+            sample, lambda email: check_duplicate_email(email["body"], bool(email["attachments"])))
+        llm_sample = rng.sample(parsed, min(args.llm_sample, len(parsed)))
+        results["extract_output"] = asyncio.run(timed_async(
+            [email["body"] for email in llm_sample], extract_output, args.llm_concurrency))
+        emailRepo = EmailRepo()
+        ids = [email.email_id for email in emailRepo.iter_emails(columns=("has_attachment",))]
+        batches = [ids[start:start + 500] for start in range(0, len(ids), 500)]
+        stage = timed(batches, emailRepo.get_emails)
+        emailRepo.close()
+    # Per email rather than per batch of 500
+    stage.update(emails=len(ids), per_second=len(ids) / stage["seconds"] if stage["seconds"] else 0.0)
+    results["repo"] = stage
+    results["stored"] = len(ids)
+    return results
+
+
+def run_size(args, size):
+    """Run the stages for one corpus size in a fresh interpreter with its own database and caches."""
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, LLM_PROVIDER="fake", LLM_FAKE_LATENCY_MS=str(args.llm_latency_ms),
+                   LLM_FAKE_ERROR_RATE=str(args.llm_error_rate), LLM_FAKE_SEED=str(args.seed),
+                   DATABASE_URL=os.path.join(tmp, "pipeline.db"), LLM_CACHE_ENABLED="false",
+                   LLM_CACHE_PATH=os.path.join(tmp, "llm_cache.db"), LLM_RATE_LIMIT_PATH="",
+                   ATTACHMENT_CACHE_PATH=os.path.join(tmp, "attachment_cache.db"),
+                   EMBEDDING_SERVER_URL="", VECTOR_INDEX_PATH="")
+        command = [sys.executable, "-m", "benchmarks.pipeline_benchmark", "--run-size", str(size)]
+        for name in ("seed", "sample", "llm_sample", "llm_concurrency", "duplicate_rate", "near_duplicate_rate",
+                     "attachment_rate"):
+            command += [f"--{name.replace('_', '-')}", str(getattr(args, name))]
+        result = subprocess.run(command, cwd=BACKEND_DIR, env=env, capture_output=True, text=True)
+        if result.returncode != 0:
+            raise RuntimeError(f"Corpus of {size} failed:\n{result.stderr}")
+        return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 5000], help="emails per corpus")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--sample", type=int, default=200, help="bodies re-checked by check_duplicate_email")
+    parser.add_argument("--llm-sample", type=int, default=50, help="bodies sent through extract_output")
+    parser.add_argument("--llm-concurrency", type=int, default=8)
+    parser.add_argument("--llm-latency-ms", type=float, default=200, help="LLM_FAKE_LATENCY_MS")
+    parser.add_argument("--llm-error-rate", type=float, default=0.0, help="LLM_FAKE_ERROR_RATE")
+    parser.add_argument("--duplicate-rate", type=float, default=0.1, help="share of exact resends")
+    parser.add_argument("--near-duplicate-rate", type=float, default=0.1, help="share of lightly edited copies")
+    parser.add_argument("--attachment-rate", type=float, default=0.2, help="share of emails with a CSV attachment")
+    parser.add_argument("--run-size", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_size is not None:
+        args.size = args.run_size
+        print(json.dumps(run_stages(args)))
+        return
+
+    print(f"{'corpus':>7}  {'stage':<23}{'emails':>8}{'emails/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'peak RSS MiB':>14}")
+    for size in args.sizes:
+        results = run_size(args, size)
+        for stage in STAGES:
+            row = results[stage]
+            print(f"{size:>7}  {stage:<23}{row['emails']:>8}{row['per_second']:>10.1f}{row['p50_ms']:>10.2f}"
+                  f"{row['p99_ms']:>10.2f}{row['peak_rss_mb']:>14.1f}")
+        print(f"{size:>7}  stored {results['stored']} emails, baseline RSS {results['baseline_rss_mb']:.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
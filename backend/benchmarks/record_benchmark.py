@@ -0,0 +1,58 @@
+"""Micro-benchmark: construction and serialization of py_dto Email against EmailRecord rows.
+
+From the backend directory:
+    python -m benchmarks.record_benchmark --rows 50000
+"""
+import argparse
+import json
+import time
+import tracemalloc
+from app.db.email_dto import Email
+from app.db.email_record import EMAIL_FIELDS, EmailRecord
+
+
+def make_rows(count):
+    return [(i, f"sender{i}@example.com", "ops@example.com", f"Request {i}", "Please process the transfer. " * 20,
+             None, "2025-01-01 00:00:00", None, "Money Movement", "Inbound", "PARSED", i % 3, None, "finance", None)
+            for i in range(count)]
+
+
+def build_dto(row):
+    return Email({name: bool(value) if name == "has_attachment" else value for name, value in zip(EMAIL_FIELDS, row)})
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+def peak_memory(function, *args):
+    tracemalloc.start()
+    result = function(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=50000)
+    args = parser.parse_args()
+    rows = make_rows(args.rows)
+
+    print(f"{'':<14}{'build us/row':>14}{'json us/row':>14}{'bytes/row':>12}")
+    for label, build, serialize in (
+        ("py_dto Email", build_dto, lambda email: json.dumps(email.__dict__)),
+        ("EmailRecord", EmailRecord.from_row, EmailRecord.to_json)
+    ):
+        records, build_seconds = timed(lambda: [build(row) for row in rows])
+        _, json_seconds = timed(lambda: [serialize(record) for record in records])
+        del records
+        _, peak = peak_memory(lambda: [build(row) for row in rows])
+        print(f"{label:<14}{build_seconds / args.rows * 1e6:>14.2f}{json_seconds / args.rows * 1e6:>14.2f}"
+              f"{peak / args.rows:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""EmailRepo benchmark: batch and streaming APIs against the per-row and load-everything paths.
+
+Seeds a temporary database with --size emails and reports wall time and peak Python memory of each path.
+From the backend directory:
+    python -m benchmarks.repo_benchmark --size 20000
+"""
+import argparse
+import contextlib
+import io
+import os
+import tempfile
+import time
+import tracemalloc
+from app.db.email_dto import Email
+from app.db.email_repo import EmailRepo
+from app.db.migrations import migrate
+from app.db.sqlite_db_config import SQLiteConnectionPool
+
+BODY = "Please process the attached loan transfer request for the account listed below. " * 30
+
+
+def make_email(i):
+    return Email({
+        "sender": f"sender{i}@example.com",
+        "recipient": "ops@example.com",
+        "subject": f"Request {i}",
+        "body": BODY + str(i),
+        "s3_message_path": None,
+        "request_type": None,
+        "sub_request_type": None,
+        "processing_status": "PARSED",
+        "has_attachment": i % 3 == 0,
+        "attachment_metadata": None,
+        "category_type": None,
+        "category": None
+    }, allows_missing_keys=True)
+
+
+def measure(label, function):
+    tracemalloc.start()
+    start = time.perf_counter()
+    # The repository prints per row; keep the report readable
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = function()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<44}{elapsed:>10.3f}{peak / 1024 / 1024:>12.1f}")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", type=int, default=20000, help="emails in the table")
+    parser.add_argument("--lookups", type=int, default=1000, help="ids fetched by the lookup paths")
+    parser.add_argument("--writes", type=int, default=2000, help="emails inserted and updated by the write paths")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        pool = SQLiteConnectionPool(os.path.join(tmp, "bench.db"), 4)
+        migrate(pool)
+        emailRepo = EmailRepo(pool)
+
+        print(f"{'path':<44}{'seconds':>10}{'peak MiB':>12}")
+        measure(f"seed {args.size} (insert_many)", lambda: emailRepo.insert_many(make_email(i) for i in range(args.size)))
+
+        measure("get_all_email", lambda: len(emailRepo.get_all_email()))
+        measure("iter_emails (all columns)", lambda: sum(1 for _ in emailRepo.iter_emails()))
+        measure("iter_emails (email_id, has_attachment)",
+                lambda: sum(1 for _ in emailRepo.iter_emails(columns=("has_attachment",))))
+
+        ids = list(range(1, args.size + 1, max(1, args.size // args.lookups)))[:args.lookups]
+        measure(f"get_email x {len(ids)}", lambda: [emailRepo.get_email(email_id) for email_id in ids])
+        measure(f"get_emails ({len(ids)} ids)", lambda: emailRepo.get_emails(ids))
+        measure(f"get_emails ({len(ids)} ids, body only)", lambda: emailRepo.get_emails(ids, columns=("body",)))
+
+        # Bodies must be new: BODY_HASH rejects exact duplicates
+        batch = [make_email(args.size + i) for i in range(args.writes)]
+        inserted = measure(f"insert_email x {args.writes}", lambda: [emailRepo.insert_email(email) for email in batch])
+        batch = [make_email(args.size + args.writes + i) for i in range(args.writes)]
+        measure(f"insert_many ({args.writes})", lambda: emailRepo.insert_many(batch))
+
+        updates = emailRepo.get_emails(inserted)
+        for email in updates:
+            email.category = "Money Movement"
+        measure(f"update_email x {len(updates)}", lambda: [emailRepo.update_email(email) for email in updates])
+        measure(f"update_many ({len(updates)})", lambda: emailRepo.update_many(updates))
+        emailRepo.close()
+        pool.close_all()
+
+
+if __name__ == "__main__":
+    main()
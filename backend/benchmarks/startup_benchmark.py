@@ -0,0 +1,103 @@
+"""Start-up benchmark: import time of app.main and time until the API answers GET /health.
+
+Each run imports the app in a fresh interpreter. From the backend directory:
+    python -m benchmarks.startup_benchmark --runs 5 --serve
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+BACKEND_DIR = os.path.join(os.path.dirname(__file__), "..")
+# Libraries that must not be imported until a request needs them
+HEAVY_MODULES = ("torch", "sentence_transformers", "google.generativeai", "pdfplumber", "PIL", "pytesseract")
+IMPORT_SCRIPT = (
+    "import json, sys, time\n"
+    "start = time.perf_counter()\n"
+    "import app.main\n"
+    "elapsed = time.perf_counter() - start\n"
+    f"print(json.dumps({{'seconds': elapsed, 'heavy': [m for m in {HEAVY_MODULES!r} if m in sys.modules]}}))\n"
+)
+
+
+def import_once():
+    """Return (seconds, heavy modules loaded, -X importtime report) of one fresh import of app.main."""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", IMPORT_SCRIPT], cwd=BACKEND_DIR,
+                            capture_output=True, text=True, check=True)
+    report = json.loads(result.stdout.strip().splitlines()[-1])
+    return report["seconds"], report["heavy"], result.stderr
+
+
+def slowest_imports(importtime_report, top):
+    """Modules imported directly by app.main (and the interpreter's own start-up) by cumulative microseconds."""
+    totals = {}
+    for line in importtime_report.splitlines():
+        if not line.startswith("import time:") or "|" not in line[12:]:
+            continue
+        _, cumulative, name = line[12:].split("|")
+        if not cumulative.strip().isdigit():
+            continue
+        name = name.rstrip()
+        # Nesting is two spaces per level after the bar: depth 1 are the modules app.main imports
+        if len(name) - len(name.lstrip()) == 3:
+            totals[name.strip()] = int(cumulative)
+    return sorted(totals.items(), key=lambda item: item[1], reverse=True)[:top]
+
+
+def time_to_health(port, timeout):
+    """Start uvicorn with one worker on an empty database and return seconds until GET /health answers 200."""
+    url = f"http://127.0.0.1:{port}/health"
+    tmp = tempfile.TemporaryDirectory()
+    env = dict(os.environ, DATABASE_URL=os.path.join(tmp.name, "startup.db"),
+               LLM_CACHE_PATH=os.path.join(tmp.name, "llm_cache.db"))
+    start = time.perf_counter()
+    server = subprocess.Popen([sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port)],
+                              cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while time.perf_counter() - start < timeout:
+            try:
+                with urllib.request.urlopen(url, timeout=1) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - start
+            except OSError:
+                time.sleep(0.02)
+        return None
+    finally:
+        server.terminate()
+        server.wait()
+        tmp.cleanup()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters importing app.main")
+    parser.add_argument("--top", type=int, default=10, help="slowest imports listed")
+    parser.add_argument("--serve", action="store_true", help="also time the first GET /health of a uvicorn server")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--timeout", type=float, default=60.0, help="seconds to wait for /health")
+    args = parser.parse_args()
+
+    timings = []
+    for _ in range(args.runs):
+        seconds, heavy, importtime_report = import_once()
+        timings.append(seconds)
+    print(f"import app.main: median {statistics.median(timings):.3f}s, "
+          f"min {min(timings):.3f}s, max {max(timings):.3f}s over {args.runs} runs")
+    print(f"heavy modules loaded at import: {', '.join(heavy) or 'none'}")
+    print(f"\n{'module':<44}{'cumulative ms':>14}")
+    for name, microseconds in slowest_imports(importtime_report, args.top):
+        print(f"{name:<44}{microseconds / 1000:>14.1f}")
+
+    if args.serve:
+        seconds = time_to_health(args.port, args.timeout)
+        print("\nfirst GET /health: " + (f"{seconds:.3f}s after launch" if seconds is not None
+                                         else f"no answer within {args.timeout:.0f}s"))
+
+
+if __name__ == "__main__":
+    main()
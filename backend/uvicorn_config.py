@@ -1,11 +1,23 @@
+import subprocess
+import sys
 import uvicorn
+from app.core.config import settings
 
 if __name__ == "__main__":
-    uvicorn.run(
-        "app.main:app",  # Path to FastAPI instance
-        host="0.0.0.0",  # Allows access from any IP
-        port=8000,  # Change as needed
-        workers=4,  # Number of worker processes for handling requests
-        reload=False,  # Disable reload in production
-        log_level="info",  # Log level (debug, info, warning, error)
-    )
+    # One shared embedding model for all workers; they never load their own and wait for it while it starts
+    embedding_server = None
+    if settings.EMBEDDING_SERVER_URL:
+        embedding_server = subprocess.Popen([sys.executable, "-m", "app.services.embedding_server"])
+    try:
+        uvicorn.run(
+            "app.main:app",  # Path to FastAPI instance
+            host="0.0.0.0",  # Allows access from any IP
+            port=8000,  # Change as needed
+            workers=4,  # Number of worker processes for handling requests
+            reload=False,  # Disable reload in production
+            log_level="info",  # Log level (debug, info, warning, error)
+        )
+    finally:
+        if embedding_server is not None:
+            embedding_server.terminate()
+            embedding_server.wait()